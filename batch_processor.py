@@ -1,10 +1,34 @@
+import logging
 from pathlib import Path
-import win32com.client
-from typing import List, Tuple
+from typing import TYPE_CHECKING, List, Tuple
 from utils.logging_utils import setup_logger
 
+if TYPE_CHECKING:
+    from file_indexer import FileIndex
+
 BatchRequest = Tuple[str, str, str, str]  # (file_name, sheet_name, cell_ref, product_id)
 
+def validate_requests(requests: List[BatchRequest], file_index: "FileIndex") -> List[Tuple[BatchRequest, str]]:
+    """
+    Finds the requests whose file or tab does not exist, before any workbook is opened.
+
+    Files are looked up in the file index and tabs in its sheet catalogue, which
+    only reads xl/workbook.xml of each workbook (once, then again only when the
+    file changes), so a whole batch is checked in milliseconds.
+
+    Returns:
+        List of (request, error) with the error the extraction would report
+    """
+    logger = logging.getLogger("excel_processor")
+    invalid: List[Tuple[BatchRequest, str]] = []
+    for request in requests:
+        file_name, sheet_name, cell_ref, product_id = request
+        error = file_index.check(file_name, sheet_name)
+        if error is not None:
+            logger.warning(f"Invalid request for {product_id} ({file_name}, {sheet_name}, {cell_ref}): {error}")
+            invalid.append((request, error))
+    return invalid
+
 def get_batch_requests(file_path: Path) -> List[BatchRequest]:
     """
     Reads batch requests from an Excel file.
@@ -19,6 +43,7 @@ def get_batch_requests(file_path: Path) -> List[BatchRequest]:
     logger.info(f"Starting batch request processing for file: {file_path}")
 
     try:
+        import win32com.client  # Imported here so BatchRequest stays usable off Windows
         excel = win32com.client.Dispatch("Excel.Application")
         excel.Visible = False
         excel.DisplayAlerts = False
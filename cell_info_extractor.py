@@ -1,27 +1,47 @@
-from typing import Dict, List    
+import bisect
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing.util import Finalize
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
 from pathlib import Path
-from utils.excel_utils import ExcelHelper, ExcelUtils
+from utils.workbook_backend import WorkbookBackend, create_backend
 from utils.formula_parser import FormulaParser
 from utils.formula_cleaner import FormulaCleaner
 from utils.logging_utils import setup_logger
 from utils.recursive_resolver import RecursiveResolver
+from utils.dependency_graph import cell_key
+from utils.cache_manager import workbook_cache
+from utils.prefetcher import WorkbookPrefetcher
+from utils.formula_tokenizer import SheetNameTrie
+from utils.reference_extractor import range_bounds
+from utils.xlsx_reader import column_letter
 from Mappings.product_mapper import ProductMapper
 from schema.schema import FormulaResult, FormulaInfo
-from openpyxl.workbook.workbook import Workbook
-from openpyxl.worksheet.worksheet import Worksheet
+from schema.cell_node import FLAG_BASE_MATERIAL, FLAG_DIVISION, FLAG_ELEMENT, FLAG_MULTIPLICATION, CellNode
+from zipfile import BadZipFile
 from batch_processor import BatchRequest
+from file_indexer import FileIndex, normalize_filename
+
+
+class CellRecord(NamedTuple):
+    """What reading and parsing a cell produced, shared by every product that reaches the cell."""
+    result: CellNode
+    references: Optional[Tuple[CellNode, ...]]
 
 
 class CellInfoExtractor:
     """Handles extraction of cell information from Excel files."""
     
-    def __init__(self, file_index: Dict[str, Path], product_mapper: ProductMapper, max_recursion_depth: int = 10, stop_on_multiplication: bool = True, stop_on_division: bool = True):
+    def __init__(self, file_index: FileIndex, product_mapper: ProductMapper, max_recursion_depth: Optional[int] = None, stop_on_multiplication: bool = True, stop_on_division: bool = True, backend: WorkbookBackend | None = None, logger: logging.Logger | None = None, prefetcher: WorkbookPrefetcher | None = None):
         self.file_index = file_index
         self.max_recursion_depth = max_recursion_depth
-        self.excel_helper = ExcelHelper()
+        # Single engine for sheet existence checks and cell reads, so each workbook is opened once
+        self.backend = backend if backend is not None else create_backend("com")
+        # Loads the workbooks a formula refers to in the background, as soon as its references are parsed
+        self.prefetcher = prefetcher
         self.parser = FormulaParser()
         self.cleaner = FormulaCleaner()
-        self.logger = setup_logger()
+        self.logger = logger if logger is not None else setup_logger()
         self.resolver = RecursiveResolver(self, self.logger, stop_on_multiplication)
         self.BASE_MATERIAL_FILE = "calculatie cat 2022 .xlsx".replace(" ", "")
         self.product_mapper = product_mapper
@@ -34,62 +54,271 @@ class CellInfoExtractor:
         self.division_count = 0
         self.processed_products = 0  # New counter for progress tracking
 
-    def extract_batch(self, requests: List[BatchRequest]) -> List[FormulaResult]:
-        """Processes a batch of cell extraction requests."""
-        results: List[FormulaResult] = []
+        # Product-independent memo of cells already read and parsed, keyed by cell_key
+        self.cell_memo: Dict[str, CellRecord] = {}
+        self.memo_hits = 0
+        self.workbook_switches = 0  # Workbooks read by prefetch_cells, counted once per workbook and level
+        # Sheet names of each workbook read so far, for the tokenizer
+        self.sheet_tries: Dict[Path, SheetNameTrie] = {}
+        # Rows of the non-empty cells of each column, for the sheets that ranges point into
+        self.used_cells: Dict[Tuple[Path, str], Dict[int, List[int]]] = {}
+
+    def extract_batch(self, requests: List[BatchRequest], chunk_size: int = 50) -> Iterator[FormulaResult]:
+        """
+        Processes a batch of cell extraction requests, yielding each result as soon as it is resolved.
+
+        Requests are resolved chunk_size at a time, each chunk through one dependency
+        graph. The resolution cache is shared by every chunk, so a cell reached by
+        several products is still read, parsed and resolved once, while the caller can
+        write each result out instead of holding the whole batch. With a recursion
+        depth limit the depth of a cell depends on the other requests of its graph,
+        so the batch is then resolved as a single chunk.
+
+        Args:
+            requests (List[BatchRequest]): The requests
+            chunk_size (int): Number of requests resolved together
+
+        Yields:
+            FormulaResult: One result per request, in input order
+        """
         total_products = len(requests)
-        
-        for i, (file_name, sheet_name, cell_ref, product_id) in enumerate(requests, 1):
-            result = self.extract_cell_info(file_name, sheet_name, cell_ref, product_id, top_product=True)
-            results.append(result)
-            
-            # Log progress every 10 products
-            if i % 10 == 0 or i == total_products:
-                print(f"Processed {i}/{total_products} products...")
-                
-        return results
+        if self.max_recursion_depth is not None:
+            chunk_size = max(total_products, 1)
+
+        for start in range(0, total_products, chunk_size):
+            roots: List[Tuple[CellNode, bool]] = [
+                self.prepare_cell_info(file_name, sheet_name, cell_ref, product_id, top_product=True)
+                for file_name, sheet_name, cell_ref, product_id in requests[start:start + chunk_size]
+            ]
+            # Results only take the FormulaResult dict shape when they leave the extractor; cells shared
+            # by the roots of a chunk are converted once
+            converted: Dict[int, FormulaResult] = {}
+            for node in self.resolver.resolve_batch(roots, max_depth=self.max_recursion_depth):
+                yield node.to_result(converted)
+            print(f"Processed {min(start + chunk_size, total_products)}/{total_products} products...")
+
+        print(f"Resolved {len(self.resolver.resolution_cache)} cells for {total_products} products")
+
+    def _shard_requests(self, requests: List[BatchRequest], workers: int) -> List[List[int]]:
+        """
+        Splits requests into at most `workers` shards, keeping requests on the same root workbook together.
+
+        Groups are assigned largest first. A group goes to the shard whose root
+        formulas already point at the most of the same external workbooks, so those
+        workbooks are opened by one worker instead of several, as long as that shard
+        stays within an even share of the requests; otherwise (and on ties) to the
+        shard with the fewest requests. The root cells are read here with one bulk
+        read per root sheet, which is what the cost of sharding amounts to: the
+        workers find them again in the workbooks they open for their own roots.
+
+        Returns:
+            List[List[int]]: Request indexes of each shard, in input order
+        """
+        groups: Dict[str, List[int]] = {}
+        for index, (file_name, sheet_name, _, _) in enumerate(requests):
+            file_name, _ = self.file_index.resolve(file_name, sheet_name)
+            groups.setdefault(normalize_filename(file_name), []).append(index)
+
+        # External workbooks the root formulas of each group point at
+        self.prefetch_cells((file_name, sheet_name, cell_ref) for file_name, sheet_name, cell_ref, _ in requests)
+        externals: Dict[str, Set[str]] = {root: set() for root in groups}
+        for file_name, sheet_name, cell_ref, _ in requests:
+            file_name, sheet_name = self.file_index.resolve(file_name, sheet_name)
+            record = self.cell_memo.get(cell_key(file_name, sheet_name, cell_ref))
+            root = normalize_filename(file_name)
+            for ref in (record.references or ()) if record is not None else ():
+                if normalize_filename(ref.file) != root:
+                    externals[root].add(normalize_filename(ref.file))
+
+        shard_count = min(workers, len(groups))
+        capacity = -(-len(requests) // shard_count)
+        shards: List[List[int]] = [[] for _ in range(shard_count)]
+        shard_externals: List[Set[str]] = [set() for _ in range(shard_count)]
+        for root, group in sorted(groups.items(), key=lambda item: len(item[1]), reverse=True):
+            candidates = [i for i in range(shard_count) if len(shards[i]) + len(group) <= capacity] or range(shard_count)
+            best = max(candidates, key=lambda i: (len(externals[root] & shard_externals[i]), -len(shards[i])))
+            shards[best].extend(group)
+            shard_externals[best] |= externals[root]
+        return [sorted(shard) for shard in shards if shard]
+
+    def extract_batch_parallel(self, requests: List[BatchRequest], workers: int, backend_factory: Callable[[], WorkbookBackend]) -> Iterator[FormulaResult]:
+        """
+        Processes a batch of requests on several processes, one shard of root workbooks per process.
+
+        Each worker builds its own extractor (with its own memo and workbook caches)
+        from backend_factory, which must be picklable, e.g.
+        functools.partial(create_backend, "xml", cache_dir=...). Results are yielded
+        in input order as soon as every earlier request is done, and are identical
+        to extract_batch. With a recursion depth limit the depth of a cell depends on
+        the other requests of its batch, so the batch is then processed serially.
+
+        Args:
+            requests (List[BatchRequest]): The requests
+            workers (int): Number of worker processes
+            backend_factory (Callable[[], WorkbookBackend]): Creates the backend of a worker
+
+        Yields:
+            FormulaResult: One result per request, in input order
+        """
+        if workers <= 1 or self.max_recursion_depth is not None:
+            if workers > 1:
+                self.logger.warning("A recursion depth limit is set, processing the batch serially")
+            yield from self.extract_batch(requests)
+            return
+
+        shards = self._shard_requests(requests, workers)
+        options = {
+            "max_recursion_depth": self.max_recursion_depth,
+            "stop_on_multiplication": self.stop_on_multiplication,
+            "stop_on_division": self.stop_on_division,
+        }
+        # Every worker gets an equal share of the workbook memory budget
+        initargs = (self.file_index, self.product_mapper, options, backend_factory,
+                    workbook_cache.memory_budget // len(shards), workbook_cache.size_factor, tuple(workbook_cache.pinned_files))
+
+        # Finished results wait here until every earlier request is done
+        pending: Dict[int, FormulaResult] = {}
+        next_index = 0
+        done = 0
+        with ProcessPoolExecutor(max_workers=len(shards), initializer=_init_worker, initargs=initargs) as pool:
+            futures = {pool.submit(_extract_shard, [requests[index] for index in shard]): shard for shard in shards}
+            for future in as_completed(futures):
+                shard = futures[future]
+                pending.update(zip(shard, future.result()))
+                done += len(shard)
+                print(f"Processed {done}/{len(requests)} products...")
+                while next_index in pending:
+                    yield pending.pop(next_index)
+                    next_index += 1
 
     def extract_cell_info(self, filename: str, sheet_name: str, cell_ref: str, product_id: str | None = None, top_product: bool = False) -> FormulaResult:
+        """Extracts formula and value from a specific cell and resolves its references."""
+        result, follow = self.prepare_cell_info(filename, sheet_name, cell_ref, product_id, top_product)
+        if follow:
+            result = self.resolver.resolve_references(result, max_depth=self.max_recursion_depth)
+        return result.to_result()
+
+    def prefetch_cells(self, cells: Iterable[Tuple[str, str, str]]) -> None:
+        """
+        Reads many cells ahead of prepare_cell_info, one bulk read per workbook sheet.
+
+        Cells are grouped by workbook and sheet, and each group is fetched with a
+        single get_cells call, so a whole level of the dependency graph switches
+        workbooks once per workbook instead of once per cell. Every backend answers
+        get_cells from one read of the sheet (the snapshot, the sheet tables or the
+        used range). The reads land in the cell memo; cells that cannot be fetched in
+        bulk are left to prepare_cell_info. Only workbooks that were actually read
+        count as a workbook switch.
+
+        Args:
+            cells (Iterable[Tuple[str, str, str]]): (file, sheet, cell) of the references to read
+        """
+        groups: Dict[Path, Dict[str, Dict[str, Tuple[str, str, str]]]] = {}
+        for filename, sheet_name, cell_ref in cells:
+            filename, sheet_name = self.file_index.resolve(filename, sheet_name)
+            key = cell_key(filename, sheet_name, cell_ref)
+            file_path = self.file_index.get(filename)
+            if file_path is None or key in self.cell_memo:
+                continue
+            groups.setdefault(file_path, {}).setdefault(sheet_name, {})[key] = (filename, sheet_name, cell_ref)
+
+        for file_path, sheets in groups.items():
+            read = False
+            for sheet_name, group in sheets.items():
+                try:
+                    if sheet_name not in self._sheet_names(file_path):
+                        continue
+                    cell_infos = self.backend.get_cells(file_path, sheet_name, [cell_ref for _, _, cell_ref in group.values()])
+                except (FileNotFoundError, KeyError, BadZipFile) as e:
+                    self.logger.warning(f"Bulk read failed for {file_path.name} [{sheet_name}]: {str(e)}")
+                    continue
+                read = True
+                for key, (filename, sheet_name, cell_ref) in group.items():
+                    id = f"{filename}_{sheet_name}_{cell_ref}".replace(" ", "")
+                    self.cell_memo[key] = self._read_cell(id, filename, sheet_name, cell_ref, file_path, cell_infos[cell_ref])
+            if read:
+                self.workbook_switches += 1
+
+    def _sheet_names(self, file_path: Path) -> List[str]:
+        """Sheet names of a workbook from the sheet catalogue of the file index, opening the workbook only if needed."""
+        names = self.file_index.workbook_sheet_names(file_path)
+        return names if names is not None else self.backend.get_sheet_names(file_path)
+
+    def _range_cells(self, filename: str, sheet_name: str, first: str, last: str) -> Optional[List[str]]:
+        """
+        Lists the non-empty cells of a range such as A1:A10 or A:A, in row-major order.
+
+        The range is clipped to the cells the sheet actually uses, read once per sheet
+        with iter_cells (from the snapshot, with a SnapshotBackend), so a whole column
+        costs no more than the cells it holds. The members themselves are then read in
+        bulk by prefetch_cells, with the rest of their level.
+
+        Returns:
+            Optional[List[str]]: The member cells, None if the sheet cannot be read
+        """
+        filename, sheet_name = self.file_index.resolve(filename, sheet_name)
+        file_path = self.file_index.get(filename)
+        bounds = range_bounds(first, last)
+        if file_path is None or bounds is None:
+            return None
+        used = self.used_cells.get((file_path, sheet_name))
+        if used is None:
+            try:
+                if sheet_name not in self._sheet_names(file_path):
+                    return None
+                used = {}
+                for row, col, _, _ in self.backend.iter_cells(file_path, sheet_name):
+                    used.setdefault(col, []).append(row)
+            except (FileNotFoundError, KeyError, BadZipFile) as e:
+                self.logger.warning(f"Range {first}:{last} not expanded in {filename} [{sheet_name}]: {str(e)}")
+                return None
+            for rows in used.values():
+                rows.sort()
+            self.used_cells[(file_path, sheet_name)] = used
+
+        first_row, first_col, last_row, last_col = bounds
+        members: List[Tuple[int, int]] = []
+        for col, rows in used.items():
+            if first_col <= col <= last_col:
+                start = 0 if first_row is None else bisect.bisect_left(rows, first_row)
+                stop = len(rows) if last_row is None else bisect.bisect_right(rows, last_row)
+                members.extend((row, col) for row in rows[start:stop])
+        members.sort()
+        return [f"{column_letter(col)}{row}" for row, col in members]
+
+    def _prefetch_workbooks(self, filename: str, sheet_name: str, references: List[CellNode]) -> None:
+        """Queues the other sheets a formula refers to on the background prefetcher."""
+        if self.prefetcher is None:
+            return
+        for ref in references:
+            ref_file, ref_sheet = self.file_index.resolve(ref.file, ref.sheet)
+            if ref_file == filename and ref_sheet == sheet_name:
+                continue
+            file_path = self.file_index.get(ref_file)
+            if file_path is not None:
+                self.prefetcher.prefetch(file_path, ref_sheet)
+
+    def prepare_cell_info(self, filename: str, sheet_name: str, cell_ref: str, product_id: str | None = None, top_product: bool = False) -> Tuple[CellNode, bool]:
+        """
+        Extracts formula and value from a specific cell without resolving its references.
+
+        Returns:
+            Tuple[CellNode, bool]: The result, and whether its references must be resolved
+        """
         self.logger.debug(f"Extracting cell info: {product_id}")
-        """Extracts formula and value from a specific cell."""
         print(filename)
-        if filename == "calculatie cat 2022 .xlsx":
-            filename = "calculatie cat 2022.xlsx"
-            self.logger.debug(f"Updated filename: {filename}")
-        # The file Berekening Ladenkasten 794.xlsx was renamed to 2022 - P1 Berekening  Ladenkasten 794-KLEUR.xlsx, so we need to update the filename to the existing one
-        # Also, the sheet name is different
-        if filename == "Berekening Ladenkasten 794.xlsx":
-            filename = "2022 - P1 Berekening  Ladenkasten 794-KLEUR.xlsx"
-            sheet_name = "OVERZICHT COP"
-            self.logger.debug(f"Updated filename and sheet name: {filename} {sheet_name}")
+        filename, sheet_name = self.file_index.resolve(filename, sheet_name)
         id = f"{filename}_{sheet_name}_{cell_ref}".replace(" ", "")
         self.logger.debug(f"Extracting cell info: {id}")
         
         file_path = self.file_index.get(filename)
         if not file_path:
-            error_msg = f"File Error: File {filename} not found in index" if filename != "calculatie cat 2022.xlsx" and filename != "calculatie cat 2022 .xlsx".replace(" ", "") else None
+            error_msg = f"File Error: File {filename} not found in index" if normalize_filename(filename) != normalize_filename(self.BASE_MATERIAL_FILE) else None
             self.logger.error(error_msg)
-            return FormulaResult({
-                "id": id,
-                "file": filename,
-                "sheet": sheet_name,
-                "cell": cell_ref,
-                "formula": "File not found",
-                "cleaned_formula": None,
-                "updated_formula": None,
-                # "expanded_formula": None,
-                "value": None,
-                "path": None,
-                "isElement": False,
-                "isMultiplication": False,
-                "isDivision": False,
-                "hReferenceCount": 0,
-                "isBaseMaterial": filename.replace(" ", "") == self.BASE_MATERIAL_FILE,
-                "isProduct": False,
-                "productID": None,
-                "error": error_msg,
-                "references": [],
-            })
+            missing = CellNode(filename, sheet_name, cell_ref, error=error_msg)
+            missing.formula = "File not found"
+            missing.set_flag(FLAG_BASE_MATERIAL, filename.replace(" ", "") == self.BASE_MATERIAL_FILE)
+            return missing, False
         
         # Add product mapping immediately
         self.logger.debug(f"Product ID already exists: {product_id}")
@@ -100,77 +329,114 @@ class CellInfoExtractor:
                 self.logger.debug(f"Product ID found: {product_id}")
             else:
                 self.logger.debug(f"Product ID not found in reverse mapping: {id}")
-        isProduct: bool = product_id is not None
-
-        result: FormulaResult = {
-            "id": id,
-            "file": filename,
-            "sheet": sheet_name,
-            "cell": cell_ref,
-            "formula": None,
-            "cleaned_formula": None,
-            "updated_formula": None,
-            # "expanded_formula": None,
-            "value": None,
-            "path": str(file_path),
-            "isProduct": isProduct,
-            "productID": product_id,
-            "isElement": False,
-            "isBaseMaterial": filename == self.BASE_MATERIAL_FILE,
-            "isMultiplication": False,
-            "isDivision": False,
-            "hReferenceCount": 0,
-            "error": None,
-            "references": [],
-        }
+
+        # Reading and parsing a cell does not depend on the product that reached it, so it happens once per cell
+        key = cell_key(filename, sheet_name, cell_ref)
+        record = self.cell_memo.get(key)
+        if record is None:
+            record = self._read_cell(id, filename, sheet_name, cell_ref, file_path)
+            self.cell_memo[key] = record
+        else:
+            self.memo_hits += 1
+
+        result = record.result.visit(filename, sheet_name, cell_ref, str(file_path), product_id, filename == self.BASE_MATERIAL_FILE)
+
+        if record.references is not None and not result.has_flag(FLAG_ELEMENT) and not result.has_flag(FLAG_BASE_MATERIAL) and (not result.is_product or top_product):  # Only resolve references if it's not an element, not a base material, and not a product that is not the top product
+            if result is not record.result:  # The shared node already holds its references (see _read_cell)
+                result.references = record.references
+            return result, True
+
+        return result, False
+
+    def _read_cell(self, id: str, filename: str, sheet_name: str, cell_ref: str, file_path: Path, cell_info: Optional[Tuple[str, Any]] = None) -> CellRecord:
+        """
+        Reads, cleans and parses one cell, independently of any product.
+
+        Args:
+            cell_info (Optional[Tuple[str, Any]]): (formula, value) already read by prefetch_cells
+
+        Returns:
+            CellRecord: The product-independent result and the parsed references
+            (None when the references must not be followed: errors, stopped formulas)
+        """
+        result = CellNode(filename, sheet_name, cell_ref, str(file_path),
+                          flags=FLAG_BASE_MATERIAL if filename == self.BASE_MATERIAL_FILE else 0)
         
         try:
-            wb: Workbook = ExcelUtils.get_workbook(file_path)
-            if sheet_name not in wb.sheetnames:
+            sheet_names = self._sheet_names(file_path)
+            if sheet_name not in sheet_names:
                 self.logger.error(f"Sheet Error: Sheet {sheet_name} not found")
-                result['error'] = f"Sheet Error: Sheet {sheet_name} not found"
-                return result
-            ws: Worksheet = wb[sheet_name]
-            _ = ws[cell_ref]  # Verify cell exists
+                result.error = f"Sheet Error: Sheet {sheet_name} not found"
+                return CellRecord(result, None)
             
-            formula, value = self.excel_helper.get_cell_info(file_path, sheet_name, cell_ref)
-            result['formula'] = formula
-            result['value'] = value
+            formula, value = cell_info if cell_info is not None else self.backend.get_cell_info(file_path, sheet_name, cell_ref)
+            result.formula = formula
+            result.value = value
 
             # Clean the formula before storing and parsing
             cleaned_formula = self.cleaner.clean_formula(formula)
-            result['cleaned_formula'] = cleaned_formula
-
-            if cleaned_formula:
-                self.total_formulas += 1  # Increment total formulas counter
-                # Check for multiplication and division
-                result['isMultiplication'] = '*' in cleaned_formula
-                result['isDivision'] = '/' in cleaned_formula
-                if self.stop_on_multiplication and result['isMultiplication']:
-                    self.logger.warning(f"Multiplication found in: {result['id']}")
-                    return result
-                if self.stop_on_division and result['isDivision']:
-                    self.logger.warning(f"Division found in: {result['id']}")
-                    return result
-            
-                formula_info: FormulaInfo = self.parser.parse_formula(cleaned_formula, filename, sheet_name)
-                result['hReferenceCount'] = formula_info['hReferenceCount']
-                result['isElement'] = formula_info['isElement']
-                result['updated_formula'] = formula_info['updated_formula']
-                # result['expanded_formula'] = formula_info['expanded_formula']
+            result.cleaned_formula = cleaned_formula
+
+            if not cleaned_formula:
+                return CellRecord(result, None)
 
-                if not result['isElement'] and not result['isBaseMaterial'] and (not result['isProduct'] or top_product):  # Only resolve references if it's not an element, not a base material, and not a product that is not the top product
-                    result['references'] = formula_info['references']
-                    result = self.resolver.resolve_references(result, max_depth=self.max_recursion_depth)
+            self.total_formulas += 1  # Increment total formulas counter
+            # Check for multiplication and division
+            result.set_flag(FLAG_MULTIPLICATION, '*' in cleaned_formula)
+            result.set_flag(FLAG_DIVISION, '/' in cleaned_formula)
+            if self.stop_on_multiplication and result.has_flag(FLAG_MULTIPLICATION):
+                self.logger.warning(f"Multiplication found in: {id}")
+                return CellRecord(result, None)
+            if self.stop_on_division and result.has_flag(FLAG_DIVISION):
+                self.logger.warning(f"Division found in: {id}")
+                return CellRecord(result, None)
+        
+            sheet_trie = self.sheet_tries.get(file_path)
+            if sheet_trie is None:
+                sheet_trie = self.sheet_tries[file_path] = SheetNameTrie(sheet_names)
+            formula_info: FormulaInfo = self.parser.parse_formula(cleaned_formula, filename, sheet_name, cell_ref, sheet_trie, self._range_cells)
+            result.h_reference_count = formula_info['hReferenceCount']
+            result.set_flag(FLAG_ELEMENT, formula_info['isElement'])
+            result.updated_formula = formula_info['updated_formula']
+            result.template = formula_info['template']
+            result.quantities = formula_info['quantities']
+            # result['expanded_formula'] = formula_info['expanded_formula']
+            self._prefetch_workbooks(filename, sheet_name, formula_info['references'])
+            references = tuple(formula_info['references'])
+            if not result.has_flag(FLAG_ELEMENT) and not result.has_flag(FLAG_BASE_MATERIAL):
+                # Followed whenever the node itself is visited: the graph resolves them in place, once
+                result.references = references
+            return CellRecord(result, references)
 
         except FileNotFoundError as e:
             self.logger.error(f"File not found: {file_path}")
-            result['error'] = "File not found"
-            return result
+            result.error = "File not found"
         except KeyError as e:
             self.logger.error(f"Cell or sheet not found: {str(e)}")
-            result['error'] = "Cell or sheet not found"
-            return result
+            result.error = "Cell or sheet not found"
+        except BadZipFile:
+            self.logger.error(f"File is not an xlsx package: {file_path}")
+            result.error = "File Error: File is not an xlsx package"
         
-        return result
+        return CellRecord(result, None)
+
+
+# Extractor of the current worker process in extract_batch_parallel
+_worker_extractor: Optional[CellInfoExtractor] = None
+
+
+def _init_worker(file_index: FileIndex, product_mapper: ProductMapper, options: Dict[str, Any], backend_factory: Callable[[], WorkbookBackend],
+                 memory_budget: int, size_factor: int, pinned_files: Tuple[str, ...]) -> None:
+    """Builds the extractor of a worker process once, so its caches stay warm across its requests."""
+    global _worker_extractor
+    workbook_cache.configure(memory_budget, size_factor, pinned_files)
+    _worker_extractor = CellInfoExtractor(file_index, product_mapper, backend=backend_factory(), logger=logging.getLogger("excel_processor"), **options)
+    # Workbooks stay open across the shards of the worker and are released once, when the process exits.
+    # A multiprocessing finalizer rather than atexit: forked workers leave through os._exit, which skips atexit
+    Finalize(_worker_extractor, _worker_extractor.backend.cleanup, exitpriority=10)
+
 
+def _extract_shard(requests: List[BatchRequest]) -> List[FormulaResult]:
+    """Processes one shard of requests in a worker process."""
+    assert _worker_extractor is not None
+    return list(_worker_extractor.extract_batch(requests))
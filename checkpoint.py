@@ -0,0 +1,95 @@
+import logging
+import os
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Set
+from batch_processor import BatchRequest
+
+# Line written after the IDs of each block, giving the size of the result log that holds them
+OFFSET_PREFIX = "#log_offset="
+
+
+class Checkpoint:
+    """
+    Product IDs whose results are safely in the result log, so an interrupted run can be resumed.
+
+    IDs are appended one per line, only after the log lines of their products were
+    flushed to disk, so every ID in the checkpoint has its result in the log. Each
+    block of IDs ends with the size of the log at that point (log_offset): a resumed
+    run cuts the log back to it, so results written after the last checkpoint are
+    not kept twice.
+    Before the IDs are written, persist (e.g. SnapshotBackend.flush) saves the
+    on-disk parse cache, so a resumed run does not read the same workbooks again.
+    """
+
+    def __init__(self, path: Path, persist: Optional[Callable[[], None]] = None):
+        """
+        Args:
+            path (Path): The checkpoint file
+            persist (Optional[Callable[[], None]]): Called before each checkpoint write to save caches
+        """
+        self.path = path
+        self.persist = persist
+        self.logger = logging.getLogger("excel_processor")
+        self.completed: Set[str] = set()
+        self.log_offset: Optional[int] = None  # Size of the result log at the last checkpoint, when resuming
+        self.file = None
+
+    def start(self, resume: bool) -> None:
+        """
+        Opens the checkpoint, keeping the completed IDs when resuming and starting empty otherwise.
+
+        Args:
+            resume (bool): Continue the previous run
+        """
+        self.completed = set()
+        self.log_offset = None
+        if resume and self.path.exists():
+            with open(self.path, 'rb+') as f:
+                content = f.read()
+                # A last line without newline was cut off by a crash: its product is not completed
+                complete = content[:content.rfind(b"\n") + 1]
+                lines = complete.decode('utf-8').splitlines()
+                # IDs after the last offset (a block cut off by a crash) are not completed either
+                offsets = [index for index, line in enumerate(lines) if line.startswith(OFFSET_PREFIX)]
+                if offsets:
+                    lines = lines[:offsets[-1] + 1]
+                    self.log_offset = int(lines[-1][len(OFFSET_PREFIX):])
+                    complete = "".join(f"{line}\n" for line in lines).encode('utf-8')
+                self.completed = {line for line in lines if not line.startswith(OFFSET_PREFIX)}
+                f.truncate(len(complete))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.path, 'a' if resume else 'w', encoding='utf-8')
+        if resume:
+            self.logger.info(f"Resuming: {len(self.completed)} products already completed")
+
+    def pending(self, requests: Iterable[BatchRequest]) -> List[BatchRequest]:
+        """
+        Returns the requests whose product is not completed yet, in order.
+
+        IDs are compared as text: the checkpoint file holds text, while product IDs
+        read over COM are floats.
+        """
+        return [request for request in requests if str(request[3]) not in self.completed]
+
+    def mark(self, product_ids: Iterable[str], log_offset: Optional[int] = None) -> None:
+        """
+        Records products whose results were flushed to the log.
+
+        Args:
+            product_ids (Iterable[str]): The products
+            log_offset (Optional[int]): Size of the log once their results were flushed
+        """
+        product_ids = [str(product_id) for product_id in product_ids if product_id is not None]
+        if not product_ids or self.file is None:
+            return
+        if self.persist is not None:
+            self.persist()
+        offset = f"{OFFSET_PREFIX}{log_offset}\n" if log_offset is not None else ""
+        self.file.write("".join(f"{product_id}\n" for product_id in product_ids) + offset)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.completed.update(product_ids)
+
+    def close(self) -> None:
+        if self.file is not None and not self.file.closed:
+            self.file.close()
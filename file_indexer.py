@@ -1,25 +1,285 @@
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from xml.etree.ElementTree import ParseError
+from zipfile import BadZipFile
+import json
+import logging
 import os
+from utils.xlsx_reader import read_sheet_names
+
+EXCEL_EXTENSIONS = ('.xlsx', '.xls', '.xlsm')
+INDEX_VERSION = 2
+
+# Listing of one directory: {"mtime": st_mtime_ns, "files": [Excel file names], "subdirs": [directory names]}
+DirectoryEntry = Dict[str, Any]
+# Sheets of one workbook: {"mtime": st_mtime_ns, "size": st_size, "names": [sheet names] or None if unreadable}
+SheetEntry = Dict[str, Any]
+
+def normalize_filename(filename: str) -> str:
+    """Key under which a file is indexed: whitespace removed and case folded, like cell ids and Excel links."""
+    return "".join(filename.split()).casefold()
+
+
+class FileIndex:
+    """
+    Excel files by name, for the file names found in formulas.
+
+    Names are matched on their normalized form (see normalize_filename), so a link
+    to "calculatie cat 2022 .xlsx" finds "calculatie cat 2022.xlsx". Files with the
+    same normalized name in different folders are all kept; get prefers the one
+    whose name matches exactly, then the one os.walk reaches last. Files that were
+    renamed since the formulas were written are found through aliases (see
+    load_aliases), which can also give the sheet that replaced the old one.
+
+    The index also keeps a catalogue of the sheet names of each workbook (see
+    sheet_names), so missing tabs are found without opening workbooks.
+    """
+
+    def __init__(self, paths: Iterable[Path] = ()):
+        self.entries: Dict[str, List[Path]] = {}
+        self.aliases: Dict[str, Tuple[str, Optional[str]]] = {}  # Normalized old name -> (file name, sheet name or None)
+        self.sheet_catalogue: Dict[str, SheetEntry] = {}  # By str(path), saved with the index by FileIndexer.save
+        self.catalogue_changed = False
+        self._checked: Set[str] = set()  # Catalogue entries compared with their file during this run
+        for path in paths:
+            self.add(path)
+
+    def add(self, path: Path) -> None:
+        self.entries.setdefault(normalize_filename(path.name), []).append(path)
+
+    def load_aliases(self, aliases_path: Path) -> None:
+        """
+        Loads the renamed files from a JSON file.
+
+        Each key is an old file name; its value is the current file name, or
+        {"file": ..., "sheet": ...} when every sheet of the old file moved to one sheet.
+        """
+        with open(aliases_path, 'r', encoding='utf-8') as f:
+            aliases = json.load(f)
+        for old_name, target in aliases.items():
+            if isinstance(target, str):
+                target = {"file": target}
+            self.aliases[normalize_filename(old_name)] = (target["file"], target.get("sheet"))
+
+    def get(self, filename: str, default: Optional[Path] = None) -> Optional[Path]:
+        """Returns the path of a file name, or default when no file has that name."""
+        candidates = self.entries.get(normalize_filename(filename))
+        if not candidates:
+            return default
+        if len(candidates) > 1:
+            exact = [path for path in candidates if path.name == filename]
+            if exact:
+                return exact[-1]
+        return candidates[-1]
+
+    def paths(self, filename: str) -> List[Path]:
+        """Returns every indexed file with this name, in os.walk order."""
+        return list(self.entries.get(normalize_filename(filename), []))
+
+    def resolve(self, filename: str, sheet_name: str) -> Tuple[str, str]:
+        """
+        Maps a file and sheet name taken from a formula to the current file name on disk and sheet name.
+
+        Names that are not indexed are returned unchanged (after aliasing).
+        """
+        alias = self.aliases.get(normalize_filename(filename))
+        if alias is not None:
+            filename, sheet_name = alias[0], alias[1] or sheet_name
+            logging.getLogger("excel_processor").debug(f"Updated filename and sheet name: {filename} {sheet_name}")
+        path = self.get(filename)
+        return (path.name if path is not None else filename), sheet_name
+
+    def sheet_names(self, filename: str) -> Optional[List[str]]:
+        """
+        Returns the sheet names of a workbook, read from its xl/workbook.xml.
+
+        Names are kept in the sheet catalogue and read again only when the file's
+        mtime or size changed; each file is compared once per run.
+
+        Returns:
+            Optional[List[str]]: The sheet names in tab order, or None when the file is not
+            indexed or its sheets cannot be read without opening it (.xls, damaged file)
+        """
+        path = self.get(filename)
+        return self.workbook_sheet_names(path) if path is not None else None
+
+    def workbook_sheet_names(self, path: Path) -> Optional[List[str]]:
+        """Returns the sheet names of an indexed workbook file, like sheet_names."""
+        key = str(path)
+        if key not in self._checked:
+            self._checked.add(key)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                self.sheet_catalogue.pop(key, None)
+                return None
+            entry = self.sheet_catalogue.get(key)
+            if entry is None or entry["mtime"] != stat.st_mtime_ns or entry["size"] != stat.st_size:
+                try:
+                    names: Optional[List[str]] = read_sheet_names(path)
+                except (OSError, KeyError, BadZipFile, ParseError):
+                    names = None
+                self.sheet_catalogue[key] = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "names": names}
+                self.catalogue_changed = True
+        entry = self.sheet_catalogue.get(key)
+        return entry["names"] if entry is not None else None
+
+    def check(self, filename: str, sheet_name: str) -> Optional[str]:
+        """
+        Checks that a file and sheet taken from a formula exist, using the index only.
+
+        Returns:
+            Optional[str]: The error the extractor would report, or None if both exist or the sheets are unknown
+        """
+        filename, sheet_name = self.resolve(filename, sheet_name)
+        if filename not in self:
+            return f"File Error: File {filename} not found in index"
+        names = self.sheet_names(filename)
+        if names is not None and sheet_name not in names:
+            return f"Sheet Error: Sheet {sheet_name} not found"
+        return None
+
+    def collisions(self) -> Dict[str, List[Path]]:
+        """Returns the names shared by several files."""
+        return {name: paths for name, paths in self.entries.items() if len(paths) > 1}
+
+    def __contains__(self, filename: str) -> bool:
+        return normalize_filename(filename) in self.entries
+
+    def __iter__(self) -> Iterator[Path]:
+        for paths in self.entries.values():
+            yield from paths
+
+    def __len__(self) -> int:
+        return sum(len(paths) for paths in self.entries.values())
 
-FileIndex = Dict[str, Path]
 
 class FileIndexer:
-    """Handles indexing of Excel files in a directory structure."""
-    
-    def __init__(self, base_folder: Path):
+    """
+    Handles indexing of Excel files in a directory structure.
+
+    With an index_path, the listing of every directory is saved together with the
+    directory's mtime. The next run only stats the known directories and lists
+    again the ones whose mtime changed (a file or folder was added, removed or
+    renamed in them), so on a network or OneDrive folder a refresh costs one stat
+    per directory instead of a full walk. Directories are listed with os.scandir on
+    a thread pool, one level of the tree at a time. The sheet catalogue of the
+    FileIndex is saved in the same file (see save).
+    """
+
+    def __init__(self, base_folder: Path, index_path: Optional[Path] = None, workers: int = 8):
+        """
+        Args:
+            base_folder (Path): The folder to index
+            index_path (Optional[Path]): Where the directory listings are saved between runs (None to always walk)
+            workers (int): Number of threads listing directories
+        """
         self.base_folder = base_folder
-    
+        self.index_path = index_path
+        self.workers = max(1, workers)
+        self.logger = logging.getLogger("excel_processor")
+        self.rescanned = 0  # Directories listed during the last create_file_index
+        self.directories: Dict[str, DirectoryEntry] = {}
+
     def create_file_index(self) -> FileIndex:
         """
         Create an index of all Excel files in the base folder.
-        
+
         Returns:
-            Dict[str, Path]: Dictionary mapping filenames to their full paths
-        """
-        file_index: FileIndex = {}
-        for root, _, files in os.walk(self.base_folder):
-            for file in files:
-                if file.endswith(('.xlsx', '.xls', '.xlsm')):
-                    file_index[file] = Path(root) / file
-        return file_index 
\ No newline at end of file
+            FileIndex: Every Excel file, in os.walk order
+        """
+        saved = self._load()
+        known: Dict[str, DirectoryEntry] = saved.get("directories", {})
+        directories = self.directories = self._walk(known)
+        self.logger.info(f"File index: {len(directories)} directories, {self.rescanned} listed again")
+
+        # Same order as os.walk (top-down, in listing order), so duplicate names resolve the same way
+        file_index = FileIndex()
+        stack = [""]
+        while stack:
+            relative = stack.pop()
+            entry = directories.get(relative)
+            if entry is None:
+                continue
+            folder = Path(self.base_folder, relative)
+            for file in entry["files"]:
+                file_index.add(folder / file)
+            stack.extend(os.path.join(relative, subdir) for subdir in reversed(entry["subdirs"]))
+
+        for paths in file_index.collisions().values():
+            self.logger.warning(f"Several files named {paths[0].name}: {', '.join(str(path.parent) for path in paths)}")
+
+        # Sheet names are only kept for workbooks still in the index
+        saved_sheets: Dict[str, SheetEntry] = saved.get("sheets", {})
+        indexed = {str(path) for path in file_index}
+        file_index.sheet_catalogue = {key: entry for key, entry in saved_sheets.items() if key in indexed}
+        if self.rescanned or directories.keys() != known.keys() or len(file_index.sheet_catalogue) != len(saved_sheets):
+            self.save(file_index)
+        return file_index
+
+    def _walk(self, known: Dict[str, DirectoryEntry]) -> Dict[str, DirectoryEntry]:
+        """Returns the listing of every directory under the base folder, reusing the unchanged known ones."""
+        self.rescanned = 0
+        directories: Dict[str, DirectoryEntry] = {}
+        level = [""]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while level:
+                next_level: List[str] = []
+                for relative, entry in zip(level, pool.map(lambda relative: self._scan(relative, known.get(relative)), level)):
+                    if entry is None:
+                        continue
+                    if entry is not known.get(relative):
+                        self.rescanned += 1
+                    directories[relative] = entry
+                    next_level.extend(os.path.join(relative, subdir) for subdir in entry["subdirs"])
+                level = next_level
+        return directories
+
+    def _scan(self, relative: str, previous: Optional[DirectoryEntry]) -> Optional[DirectoryEntry]:
+        """Lists one directory, or returns its previous listing if its mtime did not change."""
+        path = os.path.join(self.base_folder, relative)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            if previous is not None and previous["mtime"] == mtime:
+                return previous
+            files: List[str] = []
+            subdirs: List[str] = []
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    # Like os.walk: symbolic links to directories are not followed
+                    if entry.is_dir():
+                        if not entry.is_symlink():
+                            subdirs.append(entry.name)
+                    elif entry.name.endswith(EXCEL_EXTENSIONS):
+                        files.append(entry.name)
+        except OSError:
+            # Removed or unreadable: skipped, like os.walk does, and tried again next run
+            return None
+        return {"mtime": mtime, "files": files, "subdirs": subdirs}
+
+    def _load(self) -> Dict[str, Any]:
+        """Loads the saved listings and sheet catalogue, or nothing if there are none for this base folder."""
+        if self.index_path is None or not self.index_path.exists():
+            return {}
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+        if saved.get("version") != INDEX_VERSION or saved.get("base_folder") != str(self.base_folder):
+            return {}
+        return saved
+
+    def save(self, file_index: FileIndex) -> None:
+        """Saves the directory listings of the last create_file_index and the sheet catalogue of file_index."""
+        file_index.catalogue_changed = False
+        if self.index_path is None:
+            return
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        # Written to a temporary file first, so an interrupted run never leaves half an index
+        temp_path = self.index_path.with_suffix('.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": INDEX_VERSION, "base_folder": str(self.base_folder), "directories": self.directories,
+                       "sheets": file_index.sheet_catalogue}, f)
+        temp_path.replace(self.index_path)
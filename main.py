@@ -1,18 +1,36 @@
+import argparse
 from pathlib import Path
-from batch_processor import BatchRequest, get_batch_requests
+from batch_processor import BatchRequest, get_batch_requests, validate_requests
 from Mappings.product_mapper import ProductMapper
 from result_manager import ResultManager
+from checkpoint import Checkpoint
 from utils.logging_utils import setup_logger
 from file_indexer import FileIndexer
 from cell_info_extractor import CellInfoExtractor
+from utils.workbook_backend import create_backend
+from utils.cache_manager import workbook_cache
+from utils.prefetcher import WorkbookPrefetcher
 from typing import List
+import time
+from functools import partial
 
 # Configuration
 USE_BATCH_FILE = True
 BATCH_FILE_PATH = Path(__file__).parent / "Batch File" / "File - Tab - Cell - (start of recursive resolver) - New.xlsx"
 BASE_PATH = Path(r"C:\Users\matth\OneDrive - Matthieu Mordrel\Work\Projects\Kovera\Project 2\Analysis of Files\New Product Files")
-LOG_PATH = Path("Logs/Current Logs/log.json")
+LOG_PATH = Path("Logs/Current Logs/log.dag.jsonl")  # One product per line, written as each product is resolved; each distinct cell is written once (".jsonl" for full trees)
+CHECKPOINT_PATH = Path("Logs/Current Logs/checkpoint.txt")  # Product IDs already in the log, for --resume
 PRODUCT_MAPPING_PATH = Path("Mappings/product_mapping.json")
+FILE_ALIASES_PATH = Path("Mappings/file_aliases.json")  # Old file names used in formulas -> current file (and sheet)
+WORKBOOK_BACKEND = "xml"  # "com" (Excel over COM), "openpyxl" or "xml" (streaming xlsx reader)
+USE_SNAPSHOTS = True  # Load each touched sheet once into memory and answer cell lookups from there
+FILE_INDEX_PATH = Path(".cache/file_index.json")  # Directory listings of BASE_PATH; only changed directories are listed again (None to always walk)
+CACHE_DIR = Path(".cache/workbooks")  # Parsed workbooks reused by later runs while the file is unchanged (None to disable)
+WORKBOOK_MEMORY_BUDGET_MB = 2048  # Memory budget shared by all open workbooks
+PINNED_WORKBOOKS = ["calculatie cat 2022.xlsx"]  # Never evicted from the workbook cache
+MAX_RECURSION_DEPTH = None  # Maximum depth of reference chains, None for unlimited
+PARALLEL_WORKERS = 1  # Worker processes for the batch (1 = serial); needs the "xml" or "openpyxl" backend
+PREFETCH_WORKERS = 4  # Threads loading referenced workbooks in the background (0 to disable, serial batches only)
 
 def get_test_batch() -> List[BatchRequest]:
     """Returns a predefined test batch of requests."""
@@ -54,7 +72,13 @@ def get_test_batch() -> List[BatchRequest]:
     ]
 
 
-def main():
+def main(resume: bool = False):
+    """
+    Extracts every product of the batch and writes the results to LOG_PATH.
+
+    Args:
+        resume (bool): Keep the results of the previous run and only process the products missing from its checkpoint
+    """
     # Initialize components
     setup_logger(Path("Logs/Current Logs/excel_processor.log"))
     product_mapper = ProductMapper(PRODUCT_MAPPING_PATH)
@@ -71,26 +95,66 @@ def main():
     print(f"\nStarting processing of {total_products} products...")
     
     # Create file index
-    indexer = FileIndexer(BASE_PATH)
+    indexer = FileIndexer(BASE_PATH, FILE_INDEX_PATH)
     file_index = indexer.create_file_index()
+    file_index.load_aliases(FILE_ALIASES_PATH)
     
     # Control parameter for recursion on multiplication
     STOP_ON_MULTIPLICATION = False  # Set this to False if you don't want to stop on multiplication
     STOP_ON_DIVISION = False
     
+    workbook_cache.configure(WORKBOOK_MEMORY_BUDGET_MB * 1024 ** 2, pinned_files=PINNED_WORKBOOKS)
+    
+    backend = create_backend(WORKBOOK_BACKEND, snapshots=USE_SNAPSHOTS, cache_dir=CACHE_DIR)
+
+    # Products already in the log are skipped when resuming; parsed workbooks are saved with every checkpoint
+    checkpoint = Checkpoint(CHECKPOINT_PATH, persist=getattr(backend, "flush", None))
+    checkpoint.start(resume)
+    pending_requests = checkpoint.pending(batch_requests)
+    if resume:
+        print(f"Resuming: {total_products - len(pending_requests)} products already done, {len(pending_requests)} left")
+
+    # Missing files and tabs are found from the file index and its sheet catalogue, before any workbook is opened
+    invalid_requests = validate_requests(pending_requests, file_index)
+    if invalid_requests:
+        print(f"{len(invalid_requests)} products point to a missing file or tab (details in the log)")
+    if file_index.catalogue_changed:
+        indexer.save(file_index)
+    # Only snapshots are loaded from other threads (Excel over COM cannot be); otherwise the prefetcher just warms the file caches
+    prefetcher = WorkbookPrefetcher(backend, PREFETCH_WORKERS, load_sheets=USE_SNAPSHOTS and WORKBOOK_BACKEND != "com") if PREFETCH_WORKERS > 0 else None
+
     # Process results directly with CellInfoExtractor
-    extractor = CellInfoExtractor(file_index, product_mapper, max_recursion_depth=10, 
+    extractor = CellInfoExtractor(file_index, product_mapper, max_recursion_depth=MAX_RECURSION_DEPTH, 
                                 stop_on_multiplication=STOP_ON_MULTIPLICATION, 
-                                stop_on_division=STOP_ON_DIVISION)
+                                stop_on_division=STOP_ON_DIVISION,
+                                backend=backend, prefetcher=prefetcher)
+    start_time = time.perf_counter()
     try:
-        results = extractor.extract_batch(batch_requests)
+        if PARALLEL_WORKERS > 1:
+            backend_factory = partial(create_backend, WORKBOOK_BACKEND, snapshots=USE_SNAPSHOTS, cache_dir=CACHE_DIR)
+            results = extractor.extract_batch_parallel(pending_requests, PARALLEL_WORKERS, backend_factory)
+        else:
+            results = extractor.extract_batch(pending_requests)
+        # Results are generated lazily: each product is written out as soon as it is resolved
+        result_manager.save_results(results, append=resume, checkpoint=checkpoint,
+                                    product_ids=[product_id for _, _, _, product_id in pending_requests])
     finally:
+        checkpoint.close()
+        # Stop the prefetch threads first, so nothing is reopened after the cleanup
+        if prefetcher is not None:
+            prefetcher.shutdown()
         # Ensure proper cleanup even if exceptions occur
         #Without this, a excel process is still running after the script is closed, and files keep opening
-        extractor.excel_helper.cleanup()
-
-    # Save results and log summary
-    result_manager.save_results(results)
+        extractor.backend.cleanup()
+        # Keep the sheet names read for the referenced workbooks for the next run
+        if file_index.catalogue_changed:
+            indexer.save(file_index)
+    print(f"Extraction took {time.perf_counter() - start_time:.1f}s with the '{WORKBOOK_BACKEND}' backend")
+    print(f"Workbook cache: {workbook_cache.stats()}")
+    if PARALLEL_WORKERS <= 1:  # The counters of worker processes are not collected
+        print(f"Formula templates: {extractor.parser.template_hits} hits, {extractor.parser.template_misses} misses")
+        print(f"Cell memo: {extractor.memo_hits} hits, {len(extractor.cell_memo)} cells read")
+        print(f"Bulk reads: {extractor.workbook_switches} workbook switches")
     
     # Print summary to console
     print("\nFinal Classification Summary:")
@@ -100,4 +164,6 @@ def main():
     print(f"Other/Intermediate: {result_manager.summary_logger.counts['other']}")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Resolve the formulas of the batch products into a result log.")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted run, skipping the products in its checkpoint")
+    main(resume=parser.parse_args().resume) 
\ No newline at end of file
@@ -1,16 +1,27 @@
 import json
+from collections import Counter
 from pathlib import Path
-from typing import List, Dict
+from typing import Iterable, List, Dict, Tuple
 import sys
 # Add parent directory to Python path
 sys.path.append(str(Path(__file__).parent.parent))
 # Import needed types from schema
 from schema.schema import LogEntry, Reference
+from result_manager import iter_results
+
+def error_type(error: str) -> str:
+    """Returns the stats key counting this kind of error"""
+    error_msg = error.lower()
+    if 'file error' in error_msg:
+        return "file_errors"
+    if 'sheet error' in error_msg:
+        return "sheet_errors"
+    return "other_errors"
 
 def analyze_operations(log_path: Path, output_path: Path) -> None:
     """Analyzes a log file and generates operation statistics"""
-    with open(log_path, 'r') as f:
-        results: List[LogEntry] = json.load(f)  # Use LogEntry type
+    # Entries are read one at a time, from a .json, .jsonl or .dag.jsonl log
+    results: Iterable[LogEntry] = iter_results(log_path)
 
     stats: Dict[str, int] = {
         "total_formulas": 0,
@@ -25,47 +36,48 @@ def analyze_operations(log_path: Path, output_path: Path) -> None:
         "other_errors": 0
     }
 
-    def check_references(refs: List[Reference], count_errors: bool = False) -> bool:  
+    # A cell shared by several references (one dict in a .dag.jsonl log) is scanned once per result
+    ScanResult = Tuple[bool, Counter]
+
+    def check_reference(ref: Reference, scanned: Dict[int, ScanResult]) -> ScanResult:
+        """Returns whether ref or a cell below it multiplies or divides, and the errors met until then"""
+        if id(ref) not in scanned:
+            errors: Counter = Counter()
+            if ref.get('error'):
+                errors["total_errors"] += 1
+                errors[error_type(ref['error'])] += 1
+            if ref.get('isMultiplication') or ref.get('isDivision'):
+                scanned[id(ref)] = (True, errors)
+            else:
+                found, nested_errors = check_references(ref.get('references', []), scanned)
+                scanned[id(ref)] = (found, errors + nested_errors)
+        return scanned[id(ref)]
+
+    def check_references(refs: List[Reference], scanned: Dict[int, ScanResult]) -> ScanResult:
+        errors: Counter = Counter()
         for ref in refs:
-            # Track errors in nested references only if count_errors is True
-            if count_errors and ref.get('error'):
-                stats["total_errors"] += 1
-                error_msg = ref.get('error', '').lower()
-                if 'file error' in error_msg:
-                    stats["file_errors"] += 1
-                elif 'sheet error' in error_msg:
-                    stats["sheet_errors"] += 1
-                else:
-                    stats["other_errors"] += 1
-                    
-            if ref.get('isMultiplication'):
-                return True
-            if ref.get('isDivision'):
-                return True
-            if check_references(ref.get('references', []), count_errors):
-                return True
-        return False
+            found, ref_errors = check_reference(ref, scanned)
+            errors += ref_errors
+            if found:
+                return True, errors
+        return False, errors
 
     for result in results:
         stats["total_formulas"] += 1
+        found, nested_errors = check_references(result.get('references', []), {})
         
         # Check for errors in the entire formula tree
         if result.get('error'):
             stats["total_errors"] += 1
-            error_msg = result.get('error', '').lower()
-            if 'file error' in error_msg:
-                stats["file_errors"] += 1
-            elif 'sheet error' in error_msg:
-                stats["sheet_errors"] += 1
-            else:
-                stats["other_errors"] += 1
+            stats[error_type(result['error'])] += 1
         else:
-            # Only check references for errors if the main formula doesn't have an error
-            check_references(result.get('references', []), count_errors=True)
+            # Only count errors in references if the main formula doesn't have an error
+            for key, count in nested_errors.items():
+                stats[key] += count
         
-        # Check for multiplication/division (without counting errors again)
-        has_mul = result.get('isMultiplication') or check_references(result.get('references', []), count_errors=False)
-        has_div = result.get('isDivision') or check_references(result.get('references', []), count_errors=False)
+        # Check for multiplication/division
+        has_mul = result.get('isMultiplication') or found
+        has_div = result.get('isDivision') or found
         
         if has_mul and has_div:
             stats["has_both"] += 1
@@ -83,7 +95,7 @@ def analyze_operations(log_path: Path, output_path: Path) -> None:
 def main():
     """Main entry point with simplified argument handling"""
     import sys
-    default_input = Path("Logs/Current Logs/log.json")
+    default_input = Path("Logs/Current Logs/log.dag.jsonl")
     default_output = Path("Logs/Current Logs/operation_stats.json")
     
     # Simple argument handling without argparse
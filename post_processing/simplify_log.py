@@ -1,18 +1,22 @@
 import json
+import sys
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
+# Add parent directory to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+from result_manager import iter_results
 
-def has_errors(entry: Dict[str, Any]) -> bool:
+# Entries read from a .dag.jsonl log share the dicts of common cells, so the recursive
+# helpers below remember what they computed per dict (by id()) and walk each cell once
+
+def has_errors(entry: Dict[str, Any], checked: Optional[Dict[int, bool]] = None) -> bool:
     """Check if entry or any of its references have errors"""
-    if entry.get('error'):
-        return True
-    
-    # Check nested references
-    for ref in entry.get('references', []):
-        if has_errors(ref):
-            return True
-    
-    return False
+    if checked is None:
+        checked = {}
+    if id(entry) not in checked:
+        # Check nested references
+        checked[id(entry)] = bool(entry.get('error')) or any(has_errors(ref, checked) for ref in entry.get('references', []))
+    return checked[id(entry)]
 
 def is_drawer_formula(formula: str) -> tuple[bool, str]:
     """
@@ -85,16 +89,25 @@ def get_drawer_size(references: List[Dict[str, Any]], formula_type: str, formula
     if not size_cell:
         size_cell = 'V36' if formula_type == 'binnenpottenlade' else 'Q36'
     
+    searched: Dict[int, float] = {}
+
+    def search_ref(ref: Dict[str, Any]) -> float:
+        if id(ref) not in searched:
+            if ref.get('cell') == size_cell:
+                # Ensure we return a float value
+                searched[id(ref)] = float(ref.get('value', 0.0))
+            else:
+                # Recursively search nested references
+                searched[id(ref)] = search_refs(ref.get('references') or [])
+        return searched[id(ref)]
+
     def search_refs(refs: List[Dict[str, Any]]) -> float:
         for ref in refs:
             if ref.get('cell') == size_cell:
-                # Ensure we return a float value
-                return float(ref.get('value', 0.0))
-            # Recursively search nested references
-            if ref.get('references'):
-                size = search_refs(ref['references'])
-                if size > 0:
-                    return size
+                return search_ref(ref)
+            size = search_ref(ref)
+            if size > 0:
+                return size
         # Return 0.0 instead of 0 to maintain float type
         return 0.0
     
@@ -102,8 +115,16 @@ def get_drawer_size(references: List[Dict[str, Any]], formula_type: str, formula
     # Ensure we return the size even if it's 0
     return size
 
-def process_entry(entry: Dict[str, Any], is_top: bool = True) -> Dict[str, Any]:
+def process_entry(entry: Dict[str, Any], is_top: bool = True,
+                  processed: Optional[Dict[Tuple[int, bool], Dict[str, Any]]] = None) -> Dict[str, Any]:
     """Process individual log entry to extract required properties"""
+    if processed is None:
+        processed = {}
+    if (id(entry), is_top) not in processed:
+        processed[(id(entry), is_top)] = _process_entry(entry, is_top, processed)
+    return processed[(id(entry), is_top)]
+
+def _process_entry(entry: Dict[str, Any], is_top: bool, processed: Dict[Tuple[int, bool], Dict[str, Any]]) -> Dict[str, Any]:
     # Check for drawer formula pattern
     is_drawer, drawer_type = is_drawer_formula(entry.get('cleaned_formula', ''))
     
@@ -146,7 +167,7 @@ def process_entry(entry: Dict[str, Any], is_top: bool = True) -> Dict[str, Any]:
         "cleaned_formula": entry.get("cleaned_formula"),
         "value": entry.get("value") if entry.get("cleaned_formula") == "Cellhasnoformulainfile" else None,
         "id": entry.get("productID") if entry.get("isProduct", False) else entry.get("cell") if entry.get("isBaseMaterial",False) else None,
-        "references": [process_entry(ref, False) for ref in entry.get("references", [])] if entry.get("references") and (not entry.get("isProduct", False) or is_top) else None
+        "references": [process_entry(ref, False, processed) for ref in entry.get("references", [])] if entry.get("references") and (not entry.get("isProduct", False) or is_top) else None
     }
     
     # Remove null values
@@ -154,14 +175,11 @@ def process_entry(entry: Dict[str, Any], is_top: bool = True) -> Dict[str, Any]:
 
 def simplify_log(input_path: Path, output_path: Path, error_output_path: Path) -> None:
     """Main processing function that separates entries with and without errors"""
-    with open(input_path, 'r', encoding='utf-8') as f:
-        log_data = json.load(f)
-    
-    # Separate entries with and without errors
+    # Separate entries with and without errors, reading the log (.json, .jsonl or .dag.jsonl) one entry at a time
     valid_entries: List[Dict[str, Any]] = []
     error_entries: List[Dict[str, Any]] = []
     
-    for entry in log_data:
+    for entry in iter_results(input_path):
         if has_errors(entry):
             error_entries.append(entry)
         else:
@@ -173,13 +191,14 @@ def simplify_log(input_path: Path, output_path: Path, error_output_path: Path) -
         no_formula_entries: List[Dict[str, Any]] = []
         clean_entries: List[Dict[str, Any]] = []
         
+        checked: Dict[int, bool] = {}
+
         def has_no_formula(entry: Dict[str, Any]) -> bool:
             """Helper function to check if entry or any reference has no formula"""
-            if entry.get('cleaned_formula') == "Cellhasnoformulainfile":
-                return True
-            if entry.get('references'):
-                return any(has_no_formula(ref) for ref in entry['references'])
-            return False
+            if id(entry) not in checked:
+                checked[id(entry)] = entry.get('cleaned_formula') == "Cellhasnoformulainfile" or \
+                    any(has_no_formula(ref) for ref in entry.get('references') or [])
+            return checked[id(entry)]
         
         for entry in entries:
             if has_no_formula(entry):
@@ -210,7 +229,7 @@ def simplify_log(input_path: Path, output_path: Path, error_output_path: Path) -
     print(f"No formula log created at: {no_formula_path}")
 
 if __name__ == "__main__":
-    input_file = Path("Logs/Current Logs/log.json")
+    input_file = Path("Logs/Current Logs/log.dag.jsonl")
     output_file = Path("Logs/Current Logs/simplified_log.json")
     error_file = Path("Logs/Current Logs/error_log.json")
     
@@ -1,43 +1,318 @@
 from pathlib import Path
+import hashlib
 import json
 import os
-from typing import List, Dict, Set, DefaultDict, TypedDict
+from typing import Any, Iterable, Iterator, List, Dict, Optional, Set, DefaultDict, Tuple, TypedDict
 from collections import defaultdict
 from schema.schema import LogEntry, FormulaResult    
+from checkpoint import Checkpoint
 
 
+def is_dag_log(log_path: Path) -> bool:
+    """Tells whether a result log uses the .dag.jsonl format (see DagResultSink)."""
+    return Path(log_path).name.endswith(".dag.jsonl")
+
+
+def _iter_lines(log_path: Path) -> Iterator[Any]:
+    """
+    Yields the decoded lines of a JSON Lines file, skipping a last line truncated by a crash.
+
+    Raises:
+        ValueError: If a complete line is not valid JSON (a .dag.jsonl log cannot be rebuilt without it)
+    """
+    with open(log_path, 'r', encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                if line.endswith("\n"):
+                    raise ValueError(f"{log_path}: line {number} is corrupt: {e}") from e
+
+
+def iter_results(log_path: Path) -> Iterator[Any]:
+    """
+    Yields the entries of a result log one by one.
+
+    A .jsonl log (one product per line) is read line by line, so only one product
+    tree is in memory at a time; any other file is read as a single JSON list. A
+    truncated last line, left by an interrupted run, is skipped; any other corrupt
+    line raises ValueError. A .dag.jsonl log
+    is rebuilt into trees in which each cell is one dict, shared by every result
+    that references it (see iter_dag_results).
+    """
+    if is_dag_log(log_path):
+        yield from iter_dag_results(log_path)
+        return
+    if Path(log_path).suffix != ".jsonl":
+        with open(log_path, 'r', encoding='utf-8') as f:
+            yield from json.load(f)
+        return
+    yield from _iter_lines(log_path)
+
+
+def iter_dag_results(log_path: Path) -> Iterator[FormulaResult]:
+    """
+    Yields the products of a .dag.jsonl log as FormulaResult trees.
+
+    Each cell is built once and the same dict is referenced wherever the cell appears
+    (a reference repeated n times appears n times in the list), so memory scales with
+    the unique cells of the log, not with the size of the expanded trees. Code that
+    walks the trees recursively should remember visited cells by id() to benefit.
+    """
+    results: Dict[str, FormulaResult] = {}
+    for line in _iter_lines(log_path):
+        for key, record in line['nodes'].items():
+            results[key] = {**record, 'references': []}
+        for parent, child, count in line['edges']:
+            results[parent]['references'].extend([results[child]] * count)
+        yield results[line['product']]
+
+
+def load_results(log_path: Path) -> List[Any]:
+    """Loads every entry of a result log, .json or .jsonl."""
+    return list(iter_results(log_path))
+
+
+class JsonlResultSink:
+    """
+    Appends results to a JSON Lines log as they are produced, one compact line per product.
+
+    The file is flushed every flush_every results, so the products completed before
+    a crash are kept. With a checkpoint, the products of each flushed block are
+    recorded there once their lines are on disk, together with the size of the log;
+    when appending, the log is first cut back to the size of the last checkpoint.
+    """
+
+    def __init__(self, log_path: Path, flush_every: int = 10, append: bool = False, checkpoint: Optional[Checkpoint] = None):
+        """
+        Args:
+            log_path (Path): The .jsonl file
+            flush_every (int): Number of results written between two flushes
+            append (bool): Keep the results already in the file instead of starting a new log
+            checkpoint (Optional[Checkpoint]): Records the product IDs of the flushed results
+        """
+        self.log_path = log_path
+        self.flush_every = flush_every
+        self.checkpoint = checkpoint
+        if append:
+            self._truncate(checkpoint.log_offset if checkpoint is not None else None)
+        self.file = open(log_path, 'a' if append else 'w', encoding='utf-8')
+        self.count = 0
+        self.unflushed: List[str] = []  # Product IDs written since the last flush
+
+    def _truncate(self, log_offset: Optional[int]) -> None:
+        """
+        Cuts the lines written after the last checkpoint, or only a last line left
+        incomplete by a crash when there is no checkpoint offset, so that appended
+        lines stay readable and no product is in the log twice.
+        """
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, 'rb+') as f:
+            if log_offset is not None:
+                if os.fstat(f.fileno()).st_size > log_offset:
+                    f.truncate(log_offset)
+                return
+            content = f.read()
+            if content and not content.endswith(b"\n"):
+                f.truncate(content.rfind(b"\n") + 1)
+
+    def write(self, result: FormulaResult, product_id: Optional[str] = None) -> None:
+        """Writes one result as a single line."""
+        self.file.write(json.dumps(result, separators=(',', ':')) + "\n")
+        self.count += 1
+        if product_id is not None:
+            self.unflushed.append(product_id)
+        if self.count % self.flush_every == 0:
+            self.flush()
+
+    def flush(self) -> None:
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        if self.checkpoint is not None:
+            self.checkpoint.mark(self.unflushed, self.file.tell())
+        self.unflushed = []
+
+    def close(self) -> None:
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self) -> "JsonlResultSink":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+class DagResultSink(JsonlResultSink):
+    """
+    Appends results to a .dag.jsonl log, in which every distinct cell is written once.
+
+    Each line holds one product: the key of its root cell, the cells it adds to the
+    log ("nodes", keyed by cell id, without their references) and the references of
+    those cells ("edges", [parent, child, multiplicity] in formula order, where a
+    cell referenced several times in a row is one edge). Cells already written by
+    an earlier product are only pointed to, so an element sheet used by 200 products
+    is serialized once. Two cells with the same id but different content (a cell
+    cut off by a circular reference or the depth limit, a different product tag)
+    are stored under the keys "id", "id#2", ...
+    """
+
+    def __init__(self, log_path: Path, flush_every: int = 10, append: bool = False, checkpoint: Optional[Checkpoint] = None):
+        super().__init__(log_path, flush_every, append, checkpoint)
+        self.keys: Dict[bytes, str] = {}  # Content digest -> node key
+        self.variants: Dict[str, int] = {}  # Cell id -> number of keys used for it
+        if append:
+            self._load_keys()
+
+    def _load_keys(self) -> None:
+        """Registers the cells already in the log, so appended products point to them."""
+        for line in _iter_lines(self.log_path):
+            runs: Dict[str, List[List[Any]]] = {}
+            for parent, child, count in line['edges']:
+                runs.setdefault(parent, []).append([child, count])
+            for key, record in line['nodes'].items():
+                self.keys[self._digest(record, runs.get(key, []))] = key
+                self.variants[record.get('id', '')] = self.variants.get(record.get('id', ''), 0) + 1
+
+    @staticmethod
+    def _digest(record: Dict[str, Any], runs: List[List[Any]]) -> bytes:
+        return hashlib.blake2b(json.dumps([record, runs], separators=(',', ':')).encode('utf-8'), digest_size=16).digest()
+
+    def write(self, result: FormulaResult, product_id: Optional[str] = None) -> None:
+        """Writes one result as a single line holding only the cells not yet in the log."""
+        nodes: Dict[str, Dict[str, Any]] = {}
+        edges: List[Tuple[str, str, int]] = []
+        keys: Dict[int, str] = {}  # id() of the result dicts -> node key
+        # Children before parents, without recursion, so chains of any depth are written
+        stack: List[FormulaResult] = [result]
+        while stack:
+            node = stack[-1]
+            if id(node) in keys:
+                stack.pop()
+                continue
+            children = [child for child in node.get('references', []) if id(child) not in keys]
+            if children:
+                stack.extend(children)
+                continue
+            stack.pop()
+            keys[id(node)] = self._add_node(node, keys, nodes, edges)
+        super().write({"product": keys[id(result)], "nodes": nodes, "edges": edges}, product_id)
+
+    def _add_node(self, node: FormulaResult, keys: Dict[int, str], nodes: Dict[str, Dict[str, Any]],
+                  edges: List[Tuple[str, str, int]]) -> str:
+        """Returns the key of a cell whose references have keys, adding it to the line if it is new."""
+        record = {field: value for field, value in node.items() if field != 'references'}
+        runs: List[List[Any]] = []
+        for child in node.get('references', []):
+            if runs and runs[-1][0] == keys[id(child)]:
+                runs[-1][1] += 1
+            else:
+                runs.append([keys[id(child)], 1])
+        digest = self._digest(record, runs)
+        key = self.keys.get(digest)
+        if key is None:
+            cell_id = record.get('id', '')
+            self.variants[cell_id] = self.variants.get(cell_id, 0) + 1
+            key = cell_id if self.variants[cell_id] == 1 else f"{cell_id}#{self.variants[cell_id]}"
+            self.keys[digest] = key
+            nodes[key] = record
+            edges.extend((key, child, count) for child, count in runs)
+        return key
+
 
 class ResultManager:
     """Handles loading, saving, and managing results."""
     
-    def __init__(self, log_path: Path):
+    def __init__(self, log_path: Path, flush_every: int = 10):
         self.log_path = log_path
+        self.flush_every = flush_every
         self.summary_logger = SummaryLogger()
         self.formula_summarizer = FormulaSummarizer()
         
     def load_existing_results(self) -> List[LogEntry]:
-        """Loads existing results from the log file."""
+        """Loads existing results from the log file (.json or .jsonl)."""
         if not os.path.exists(self.log_path):
             return []
             
         try:
-            with open(self.log_path, 'r') as f:
-                return json.load(f)
+            return load_results(self.log_path)
         except json.JSONDecodeError:
             return []
     
-    def save_results(self, results: List[FormulaResult]) -> None:
-        """Save results with classification tracking"""
-        with open(self.log_path, 'w') as f:
-            json.dump(results, f, indent=2)
-        
-        # Update both summaries
-        for result in results:
-            self.summary_logger.classify_result(result)
-            self.formula_summarizer.process_result(result)
+    def save_results(self, results: Iterable[FormulaResult], append: bool = False, checkpoint: Optional[Checkpoint] = None,
+                     product_ids: Optional[Iterable[str]] = None) -> int:
+        """
+        Streams results to the log with classification tracking.
+
+        Each result is written as soon as it is produced, so results can be a generator
+        such as CellInfoExtractor.extract_batch and never needs to be held in full.
+        A .dag.jsonl log path writes each distinct cell once (see DagResultSink), and a
+        .json log path is written as a JSON list instead (for older tooling).
+        When appending, the results kept in the log (after it is cut back to the last
+        checkpoint) are counted in the summaries too.
+
+        Args:
+            results (Iterable[FormulaResult]): The results
+            append (bool): Add to the results already in a .jsonl log
+            checkpoint (Optional[Checkpoint]): Records each product once its result is on disk
+            product_ids (Optional[Iterable[str]]): Product ID of each result, in the same order, for the checkpoint
+
+        Returns:
+            int: Number of results written
+        """
+        ids = iter(product_ids) if product_ids is not None else None
+        count = 0
+        with self._open_sink(append, checkpoint) as sink:
+            # Counted once the sink has cut the log back to the last checkpoint, so results
+            # written after it (and written again by this run) are not counted twice
+            if append and isinstance(sink, JsonlResultSink):
+                for result in iter_results(self.log_path):
+                    self.summary_logger.classify_result(result)
+                    self.formula_summarizer.process_result(result)
+
+            for result in results:
+                sink.write(result, next(ids, None) if ids is not None else None)
+                count += 1
+                # Update both summaries
+                self.summary_logger.classify_result(result)
+                self.formula_summarizer.process_result(result)
         
         # Save both logs
         self.formula_summarizer.save_formula_summary()
+        return count
+
+    def _open_sink(self, append: bool, checkpoint: Optional[Checkpoint]) -> Any:
+        if is_dag_log(self.log_path):
+            return DagResultSink(self.log_path, self.flush_every, append, checkpoint)
+        if Path(self.log_path).suffix == ".jsonl":
+            return JsonlResultSink(self.log_path, self.flush_every, append, checkpoint)
+        return _JsonListSink(self.log_path)
+
+
+class _JsonListSink:
+    """Writes results as one indented JSON list, like the original log.json."""
+
+    def __init__(self, log_path: Path):
+        self.file = open(log_path, 'w', encoding='utf-8')
+        self.count = 0
+        self.file.write("[")
+
+    def write(self, result: FormulaResult, product_id: Optional[str] = None) -> None:
+        self.file.write(",\n" if self.count else "\n")
+        self.file.write(json.dumps(result, indent=2))
+        self.count += 1
+
+    def __enter__(self) -> "_JsonListSink":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.file.write("\n]" if self.count else "]")
+        self.file.close()
+
 
 class SummaryLogger:
     """Tracks and logs classification summary"""
@@ -70,6 +345,17 @@ class FormulaSummaryEntry(TypedDict):
     count: int
     unique_ids: List[str]
 
+class TemplateData(TypedDict):
+    cleaned_formula: str
+    count: int
+    unique_ids: Set[str]
+
+class TemplateSummaryEntry(TypedDict):
+    template: str
+    cleaned_formula: str
+    count: int
+    unique_ids: List[str]
+
 class FormulaSummarizer:
     """Groups formulas by type and usage patterns"""
     def __init__(self):
@@ -79,6 +365,8 @@ class FormulaSummarizer:
             'base_materials': defaultdict(lambda: {'count': 0, 'unique_ids': set()}),
             'other': defaultdict(lambda: {'count': 0, 'unique_ids': set()})
         }
+        # Formulas grouped by shape (relative R1C1 template), whatever their category
+        self.template_data: Dict[str, TemplateData] = {}
         self.processed_ids: Set[str] = set()  # Track already processed IDs
 
     def process_result(self, result: FormulaResult) -> None:
@@ -124,10 +412,16 @@ class FormulaSummarizer:
         # Update counts and IDs
         self.formula_data[category][formula]['count'] += 1
         self.formula_data[category][formula]['unique_ids'].add(result['id'])
+
+        template = result.get('template')
+        if template is not None:
+            template_entry = self.template_data.setdefault(template, {'cleaned_formula': formula, 'count': 0, 'unique_ids': set()})
+            template_entry['count'] += 1
+            template_entry['unique_ids'].add(result['id'])
     
     def save_formula_summary(self) -> None:
         """Save formatted summary to JSON file, overwriting previous"""
-        output: Dict[str, List[FormulaSummaryEntry]] = {}
+        output: Dict[str, List[FormulaSummaryEntry] | List[TemplateSummaryEntry]] = {}
         
         for category, formulas in self.formula_data.items():
             output[category] = []
@@ -137,6 +431,16 @@ class FormulaSummarizer:
                     'count': data['count'],
                     'unique_ids': list(data['unique_ids'])
                 })
+
+        output['templates'] = [
+            {
+                'template': template,
+                'cleaned_formula': data['cleaned_formula'],
+                'count': data['count'],
+                'unique_ids': list(data['unique_ids'])
+            }
+            for template, data in sorted(self.template_data.items(), key=lambda item: item[1]['count'], reverse=True)
+        ]
         
         # Write to temporary file first to ensure atomic write
         temp_path = Path('Logs/Current Logs/formula_summary.tmp')
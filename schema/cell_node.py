@@ -0,0 +1,174 @@
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+from schema.schema import FormulaResult
+
+# Boolean fields of a FormulaResult, packed into CellNode.flags
+FLAG_ELEMENT = 1
+FLAG_BASE_MATERIAL = 2
+FLAG_MULTIPLICATION = 4
+FLAG_DIVISION = 8
+
+FLAGS: Dict[str, int] = {
+    "isElement": FLAG_ELEMENT,
+    "isBaseMaterial": FLAG_BASE_MATERIAL,
+    "isMultiplication": FLAG_MULTIPLICATION,
+    "isDivision": FLAG_DIVISION,
+}
+
+# FormulaResult keys stored under another attribute name
+ATTRIBUTES: Dict[str, str] = {
+    "productID": "product_id",
+    "hReferenceCount": "h_reference_count",
+}
+
+
+def _intern(text: Optional[str]) -> Optional[str]:
+    return sys.intern(text) if text is not None else None
+
+
+class CellNode:
+    """
+    Compact, internal form of a FormulaResult.
+
+    Cells are created by the thousand during a batch (one per parsed reference and
+    one per read cell), so they use slots instead of 20-key dicts: file, sheet and path
+    strings are interned, the id is derived from file, sheet and cell, isProduct
+    from productID, and the other booleans are packed into flags. References are a
+    tuple of child nodes, shared by every parent that reaches them. Nodes are
+    converted to the FormulaResult shape only when a result leaves the extractor
+    (to_result). Fields can also be read with FormulaResult keys (node["cell"]).
+    """
+
+    __slots__ = ("file", "sheet", "cell", "path", "formula", "cleaned_formula", "updated_formula", "value",
+                 "product_id", "flags", "h_reference_count", "template", "quantities", "error", "references")
+
+    def __init__(self, file: str, sheet: str, cell: str, path: Optional[str] = None, flags: int = 0, error: Optional[str] = None):
+        self.file = sys.intern(file)
+        self.sheet = sys.intern(sheet)
+        self.cell = cell
+        self.path = _intern(path)
+        self.formula: Optional[str] = None
+        self.cleaned_formula: Optional[str] = None
+        self.updated_formula: Optional[str] = None
+        self.value: Any = None
+        self.product_id: Optional[str] = None
+        self.flags = flags
+        self.h_reference_count = 0
+        self.template: Optional[str] = None
+        self.quantities: Optional[Dict[str, float]] = None
+        self.error = error
+        self.references: Tuple["CellNode", ...] = ()
+
+    @property
+    def id(self) -> str:
+        return f"{self.file}_{self.sheet}_{self.cell}".replace(" ", "")
+
+    @property
+    def is_product(self) -> bool:
+        return self.product_id is not None
+
+    def has_flag(self, flag: int) -> bool:
+        return bool(self.flags & flag)
+
+    def set_flag(self, flag: int, value: bool) -> None:
+        self.flags = self.flags | flag if value else self.flags & ~flag
+
+    def copy(self) -> "CellNode":
+        """Returns a shallow copy (the references tuple is shared)."""
+        node = CellNode.__new__(CellNode)
+        for name in CellNode.__slots__:
+            setattr(node, name, getattr(self, name))
+        return node
+
+    def visit(self, file: str, sheet: str, cell: str, path: Optional[str], product_id: Optional[str], is_base_material: bool) -> "CellNode":
+        """
+        Returns this cell as reached through one reference.
+
+        Most references reach a cell spelled as it was read and without a product tag:
+        they all get this node itself, so the cell is one node wherever it appears.
+        Only a reference with another overlay (spelling, path, product tag or base
+        material flag) gets a copy carrying it, without references.
+        """
+        if (file == self.file and sheet == self.sheet and cell == self.cell and path == self.path
+                and product_id == self.product_id and is_base_material == self.has_flag(FLAG_BASE_MATERIAL)):
+            return self
+        node = self.copy()
+        node.file = sys.intern(file)
+        node.sheet = sys.intern(sheet)
+        node.cell = cell
+        node.path = _intern(path)
+        node.product_id = product_id
+        node.set_flag(FLAG_BASE_MATERIAL, is_base_material)
+        node.references = ()
+        return node
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "id":
+            return self.id
+        if key == "isProduct":
+            return self.is_product
+        if key in FLAGS:
+            return self.has_flag(FLAGS[key])
+        if key == "references":
+            return list(self.references)
+        try:
+            return getattr(self, ATTRIBUTES.get(key, key))
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def _result(self, references: List[FormulaResult]) -> FormulaResult:
+        return FormulaResult({
+            "id": self.id,
+            "file": self.file,
+            "sheet": self.sheet,
+            "cell": self.cell,
+            "formula": self.formula,
+            "cleaned_formula": self.cleaned_formula,
+            "updated_formula": self.updated_formula,
+            # "expanded_formula": None,
+            "value": self.value,
+            "path": self.path,
+            "isProduct": self.is_product,
+            "productID": self.product_id,
+            "isElement": self.has_flag(FLAG_ELEMENT),
+            "isBaseMaterial": self.has_flag(FLAG_BASE_MATERIAL),
+            "isMultiplication": self.has_flag(FLAG_MULTIPLICATION),
+            "isDivision": self.has_flag(FLAG_DIVISION),
+            "hReferenceCount": self.h_reference_count,
+            "template": self.template,
+            "quantities": self.quantities,
+            "error": self.error,
+            "references": references,
+        })
+
+    def to_result(self, converted: Optional[Dict[int, FormulaResult]] = None) -> FormulaResult:
+        """
+        Converts the node and everything below it to nested FormulaResult dicts.
+
+        Works without recursion, so reference chains of any depth convert. A node
+        reached through several paths is converted once and shared in the result.
+
+        Args:
+            converted (Optional[Dict[int, FormulaResult]]): Conversions to share with other roots, by node id()
+        """
+        if converted is None:
+            converted = {}
+        stack: List[CellNode] = [self]
+        while stack:
+            node = stack[-1]
+            if id(node) in converted:
+                stack.pop()
+                continue
+            children = [child for child in node.references if id(child) not in converted]
+            if children:
+                stack.extend(children)
+                continue
+            stack.pop()
+            converted[id(node)] = node._result([converted[id(child)] for child in node.references])
+        return converted[id(self)]
@@ -1,4 +1,7 @@
-from typing import TypedDict, List, Literal, Optional
+from typing import TYPE_CHECKING, Dict, TypedDict, List, Literal, Optional
+
+if TYPE_CHECKING:
+    from schema.cell_node import CellNode
 
 class ElementID(TypedDict):
     elementID: str
@@ -56,6 +59,8 @@ class FormulaResult(TypedDict):
     isMultiplication: bool
     isDivision: bool
     hReferenceCount: int
+    template: Optional[str]
+    quantities: Optional[Dict[str, float]]
     error: Optional[str]
     references: List['FormulaResult']
 
@@ -65,7 +70,9 @@ class FormulaInfo(TypedDict):
     isBaseMaterial: bool
     isProduct: bool
     updated_formula: Optional[str]
-    references: List[FormulaResult]
+    template: Optional[str]
+    quantities: Optional[Dict[str, float]]
+    references: List['CellNode']
 
 # Add types for LLM processing
 class LLMProcessedProduct(TypedDict):
@@ -1,5 +1,114 @@
 import sys
+import zipfile
 from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import pytest
 
 # Add the parent directory to the Python path
-sys.path.insert(0, str(Path(__file__).parent.parent)) 
\ No newline at end of file
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+
+def write_xlsx(path: Path, sheets: Dict[str, List[str]], shared_strings: Optional[List[str]] = None, external_links: Optional[List[str]] = None) -> Path:
+    """
+    Writes a minimal xlsx package by hand so tests control the exact sheet XML.
+
+    Args:
+        path: Target file
+        sheets: Sheet name -> list of raw <c> elements
+        shared_strings: Optional shared string table
+        external_links: Optional external workbook targets, numbered [1], [2], ...
+    """
+    external_links = external_links or []
+    with zipfile.ZipFile(path, "w") as zf:
+        workbook_rels: List[str] = []
+        sheet_entries: List[str] = []
+        for index, (name, cells) in enumerate(sheets.items(), 1):
+            sheet_entries.append(f'<sheet name="{name}" sheetId="{index}" r:id="rId{index}"/>')
+            workbook_rels.append(f'<Relationship Id="rId{index}" Target="worksheets/sheet{index}.xml" Type="worksheet"/>')
+            zf.writestr(f"xl/worksheets/sheet{index}.xml", f'<worksheet xmlns="{MAIN_NS}"><sheetData><row>{"".join(cells)}</row></sheetData></worksheet>')
+
+        external_entries: List[str] = []
+        for index, target in enumerate(external_links, 1):
+            rel_id = f"rIdExt{index}"
+            external_entries.append(f'<externalReference r:id="{rel_id}"/>')
+            workbook_rels.append(f'<Relationship Id="{rel_id}" Target="externalLinks/externalLink{index}.xml" Type="externalLink"/>')
+            zf.writestr(f"xl/externalLinks/externalLink{index}.xml", f'<externalLink xmlns="{MAIN_NS}"/>')
+            zf.writestr(
+                f"xl/externalLinks/_rels/externalLink{index}.xml.rels",
+                f'<Relationships xmlns="{PKG_REL_NS}"><Relationship Id="rId1" Target="{target}" TargetMode="External" Type="externalLinkPath"/></Relationships>',
+            )
+
+        externals = f'<externalReferences>{"".join(external_entries)}</externalReferences>' if external_entries else ""
+        zf.writestr("xl/workbook.xml", f'<workbook xmlns="{MAIN_NS}" xmlns:r="{REL_NS}"><sheets>{"".join(sheet_entries)}</sheets>{externals}</workbook>')
+        zf.writestr("xl/_rels/workbook.xml.rels", f'<Relationships xmlns="{PKG_REL_NS}">{"".join(workbook_rels)}</Relationships>')
+
+        if shared_strings:
+            items = "".join(f"<si><t>{text}</t></si>" for text in shared_strings)
+            zf.writestr("xl/sharedStrings.xml", f'<sst xmlns="{MAIN_NS}">{items}</sst>')
+    return path
+
+
+@pytest.fixture
+def xlsx_factory(tmp_path: Path) -> Callable[..., Path]:
+    """Returns a helper that writes a minimal xlsx file into the test's tmp directory."""
+    def factory(name: str, sheets: Dict[str, List[str]], **kwargs) -> Path:
+        return write_xlsx(tmp_path / name, sheets, **kwargs)
+    return factory
+
+
+class DictBackend:
+    """In-memory workbook backend: file name -> sheet -> cell -> (formula, value). Counts cell and sheet reads."""
+
+    def __init__(self, workbooks: Dict[str, Dict[str, Dict[str, Tuple[Optional[str], Any]]]]):
+        self.workbooks = workbooks
+        self.reads: List[Tuple[str, str, str]] = []
+        self.sheet_reads: List[Tuple[str, str]] = []
+
+    def get_sheet_names(self, file_path: Path) -> List[str]:
+        if file_path.name not in self.workbooks:
+            raise FileNotFoundError(file_path)
+        return list(self.workbooks[file_path.name])
+
+    def get_cell_info(self, file_path: Path, sheet_name: str, cell_ref: str) -> Tuple[str, Any]:
+        self.reads.append((file_path.name, sheet_name, cell_ref))
+        formula, value = self.workbooks[file_path.name][sheet_name].get(cell_ref, (None, None))
+        if not formula:
+            return "Cell has no formula in file", value
+        return formula, value
+
+    def iter_cells(self, file_path: Path, sheet_name: str) -> Iterable[Tuple[int, int, Optional[str], Any]]:
+        from utils.xlsx_reader import split_cell_ref
+
+        self.sheet_reads.append((file_path.name, sheet_name))
+        for cell_ref, (formula, value) in self.workbooks[file_path.name][sheet_name].items():
+            yield (*split_cell_ref(cell_ref), formula, value)
+
+    def get_cells(self, file_path: Path, sheet_name: str, cell_refs: Iterable[str]) -> Dict[str, Tuple[str, Any]]:
+        return {cell_ref: self.get_cell_info(file_path, sheet_name, cell_ref) for cell_ref in cell_refs}
+
+    def cleanup(self) -> None:
+        pass
+
+
+@pytest.fixture
+def make_extractor(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Callable[..., Any]:
+    """Returns a helper that builds a CellInfoExtractor over a DictBackend, logging into the tmp directory."""
+    from Mappings.product_mapper import ProductMapper
+    from cell_info_extractor import CellInfoExtractor
+    from file_indexer import FileIndex
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "Logs" / "Current Logs").mkdir(parents=True)
+
+    def factory(workbooks: Dict[str, Dict[str, Dict[str, Tuple[Optional[str], Any]]]], products: Optional[Dict[str, str]] = None, **kwargs) -> Any:
+        product_mapper = ProductMapper(tmp_path / "products.json")
+        product_mapper.product_mapping = dict(products or {})
+        product_mapper.reverse_mapping = {cell_id: product_id for product_id, cell_id in (products or {}).items()}
+        file_index = FileIndex(tmp_path / name for name in workbooks)
+        return CellInfoExtractor(file_index, product_mapper, backend=DictBackend(workbooks), **kwargs)
+    return factory
@@ -0,0 +1,42 @@
+import pytest
+from utils.add_quantity import AddQuantity
+
+
+class TestAddQuantity:
+    """Test cases for the linear-coefficient quantity engine."""
+
+    def setup_method(self):
+        self.add_quantity = AddQuantity()
+
+    def quantities(self, formula: str):
+        return self.add_quantity.quantities(formula, "test.xlsx", "Sheet1")
+
+    def test_linear_coefficients(self):
+        """Repeated references add up and constants scale them."""
+        assert self.quantities("2*A1+A1/2") == {"test.xlsx_Sheet1_A1": 2.5}
+        assert self.quantities("(B2-'[Book.xlsx]Data'!C3)*3+10%*B2") == {
+            "test.xlsx_Sheet1_B2": pytest.approx(3.1),
+            "Book.xlsx_Data_C3": -3.0,
+        }
+        assert self.quantities("SUM(A1,2*A2)/4") == {"test.xlsx_Sheet1_A1": 0.25, "test.xlsx_Sheet1_A2": 0.5}
+
+    def test_constant_powers(self):
+        assert self.quantities("A1*2^3") == {"test.xlsx_Sheet1_A1": 8.0}
+
+    def test_non_linear_formulas(self):
+        """Formulas that are not linear in their references have no quantities."""
+        for formula in ["A1*B1", "2/A1", "A1^2", "ROUND(A1,2)", "SUM(A1:A4)", "IF(A1>0,A1,0)", "A1/0", "A1+"]:
+            assert self.quantities(formula) is None, formula
+
+    def test_ranges_in_sum(self):
+        """With the used cells of a range known, SUM counts each of them once."""
+        def expand_range(file, sheet, first, last):
+            return ["A1", "A3"] if sheet == "Sheet1" else None
+
+        def quantities(formula: str):
+            tokens = self.add_quantity.extractor.tokenizer.tokenize(formula)
+            return self.add_quantity.quantities_from_tokens(tokens, "test.xlsx", "Sheet1", expand_range)
+
+        assert quantities("SUM(A1:A10,A1)") == {"test.xlsx_Sheet1_A1": 2.0, "test.xlsx_Sheet1_A3": 1.0}
+        assert quantities("SUM(A1:A10)+SUM(Other!B:B)") is None
+        assert quantities("A1:A10*2") is None
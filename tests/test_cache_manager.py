@@ -0,0 +1,64 @@
+from pathlib import Path
+from utils.cache_manager import WorkbookCache
+
+
+class TestWorkbookCache:
+    """Test cases for the shared workbook cache."""
+
+    def setup_method(self):
+        """Set up test fixtures before each test method."""
+        self.closed = []
+        self.cache = WorkbookCache(memory_budget=300, pinned_files=["calculatie cat 2022.xlsx"])
+
+    def _put(self, name: str, size: int = 100):
+        self.cache.put(f"xml|{name}", name, Path(name), size=size, close=self.closed.append)
+
+    def test_least_frequently_used_is_evicted_and_closed(self):
+        """Test that the coldest workbook is closed when the budget is exceeded."""
+        self._put("a.xlsx")
+        self._put("b.xlsx")
+        self._put("c.xlsx")
+        self.cache.get("xml|a.xlsx")
+        self.cache.get("xml|c.xlsx")
+
+        self._put("d.xlsx")
+
+        assert self.closed == ["b.xlsx"]
+        assert "xml|b.xlsx" not in self.cache
+        assert self.cache.stats()["evictions"] == 1
+        assert self.cache.memory_used == 300
+
+    def test_replaced_workbook_is_closed(self):
+        """Test that putting a new workbook under an existing key closes the old one, but not a re-put of the same one."""
+        self._put("a.xlsx")
+        self._put("a.xlsx")
+        assert self.closed == []
+
+        self.cache.put("xml|a.xlsx", "a.xlsx (reopened)", Path("a.xlsx"), size=50, close=self.closed.append)
+
+        assert self.closed == ["a.xlsx"]
+        assert self.cache.peek("xml|a.xlsx") == "a.xlsx (reopened)"
+        assert self.cache.memory_used == 50
+
+    def test_pinned_workbook_is_never_evicted(self):
+        """Test that the base-material catalogue stays cached even when it is the coldest entry."""
+        self._put("calculatie cat 2022 .xlsx", size=200)
+        self._put("a.xlsx")
+        self.cache.get("xml|a.xlsx")
+
+        self._put("b.xlsx")
+
+        assert "xml|calculatie cat 2022 .xlsx" in self.cache
+        assert self.closed == ["a.xlsx"]
+
+    def test_counters_and_clear(self):
+        """Test hit/miss counters and closing every entry of one reader."""
+        self._put("a.xlsx")
+        self.cache.put("com|a.xlsx", "com", Path("a.xlsx"), size=10, close=self.closed.append)
+
+        assert self.cache.get("xml|a.xlsx") == "a.xlsx"
+        assert self.cache.get("xml|missing.xlsx") is None
+        self.cache.clear("xml|")
+
+        assert self.closed == ["a.xlsx"]
+        assert self.cache.stats() == {"hits": 1, "misses": 1, "evictions": 0, "entries": 1, "memory_used": 10}
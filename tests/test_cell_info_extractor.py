@@ -0,0 +1,164 @@
+from conftest import DictBackend
+
+
+class CleanupRecorder(DictBackend):
+    """DictBackend that appends a line to a file each time it is released."""
+
+    def __init__(self, workbooks, log_path):
+        super().__init__(workbooks)
+        self.log_path = log_path
+
+    def cleanup(self) -> None:
+        with open(self.log_path, "a") as f:
+            f.write("cleanup\n")
+
+
+class TestCellInfoExtractor:
+    """Test cases for the CellInfoExtractor's cell memo."""
+
+    WORKBOOKS = {
+        "products.xlsx": {"PO": {"B1": ("=Elements!A1+Elements!A2", 5), "B2": ("=Elements!A1+Elements!A2", 5)},
+                          "Elements": {"A1": ("=Shared!C1", 2), "A2": (None, 3)},
+                          "Shared": {"C1": (None, 2)}},
+    }
+
+    def test_shared_cells_are_read_once(self, make_extractor):
+        """Two products reaching the same cells read and parse each of them once."""
+        extractor = make_extractor(self.WORKBOOKS)
+        first = extractor.extract_cell_info("products.xlsx", "PO", "B1", "P1", top_product=True)
+        second = extractor.extract_cell_info("products.xlsx", "PO", "B2", "P2", top_product=True)
+
+        assert sorted(extractor.backend.reads) == sorted(set(extractor.backend.reads))
+        assert len(extractor.backend.reads) == 5
+        assert first["productID"] == "P1" and second["productID"] == "P2"
+        assert [ref["id"] for ref in first["references"]] == [ref["id"] for ref in second["references"]]
+        assert first["references"][0]["references"][0]["value"] == 2
+
+    def test_product_tag_is_an_overlay(self, make_extractor):
+        """A memoized cell keeps the product tag of the path that reached it."""
+        extractor = make_extractor(self.WORKBOOKS, products={"E1": "products.xlsx_Elements_A1"})
+        nested = extractor.extract_cell_info("products.xlsx", "PO", "B1", "P1", top_product=True)["references"][0]
+        top = extractor.extract_cell_info("products.xlsx", "Elements", "A1", "TOP", top_product=True)
+
+        assert nested["productID"] == "E1" and nested["references"] == []
+        assert top["productID"] == "TOP" and [ref["cell"] for ref in top["references"]] == ["C1"]
+        assert len(extractor.backend.reads) == len(set(extractor.backend.reads))
+
+    def test_sheet_names_come_from_the_workbook(self, make_extractor):
+        """An unquoted reference to a sheet named with an operator is followed without configuration."""
+        extractor = make_extractor({"book.xlsx": {"PO": {"B1": ("=PRIJS+MARGE!A1+1", 3)}, "PRIJS+MARGE": {"A1": (None, 2)}}})
+        result = extractor.extract_cell_info("book.xlsx", "PO", "B1", "P1", top_product=True)
+
+        assert [(ref["sheet"], ref["cell"], ref["value"]) for ref in result["references"]] == [("PRIJS+MARGE", "A1", 2)]
+
+    def test_ranges_are_expanded_against_the_used_cells(self, make_extractor):
+        """SUM over a range or a whole column follows every used cell, read from one pass over the sheet."""
+        workbooks = {"book.xlsx": {"OVERZICHT": {"B1": ("=SUM(Data!A1:A1000)+SUM(Data!C:C)", 9)},
+                                   "Data": {"A2": (None, 1), "A5": ("=C7", 3), "C1": (None, 2), "C7": (None, 3), "B3": (None, 4)}}}
+        extractor = make_extractor(workbooks)
+        result = extractor.extract_cell_info("book.xlsx", "OVERZICHT", "B1", "P1", top_product=True)
+
+        assert [ref["cell"] for ref in result["references"]] == ["A2", "A5", "C1", "C7"]
+        assert result["quantities"] == {f"book.xlsx_Data_{cell}": 1.0 for cell in ("A2", "A5", "C1", "C7")}
+        assert extractor.backend.sheet_reads == [("book.xlsx", "Data")]
+        assert len(extractor.backend.reads) == len(set(extractor.backend.reads)) == 5
+
+    def test_deep_chain_has_no_recursion_limit(self, make_extractor):
+        """A reference chain deeper than Python's recursion limit resolves completely."""
+        depth = 3000
+        refs = [f"{column}{row}" for column in ("A", "B", "C", "D") for row in range(1, 751)]
+        cells = {ref: (f"={next_ref}", 1) for ref, next_ref in zip(refs, refs[1:])}
+        cells[refs[-1]] = (None, 1)
+        extractor = make_extractor({"chain.xlsx": {"S": cells}})
+
+        node = extractor.extract_cell_info("chain.xlsx", "S", "A1", "P1", top_product=True)
+        length = 1
+        while node["references"]:
+            node = node["references"][0]
+            length += 1
+        assert length == depth
+
+    def test_circular_reference(self, make_extractor):
+        extractor = make_extractor({"loop.xlsx": {"S": {"A1": ("=A2", 1), "A2": ("=A1", 1)}}})
+        result = extractor.extract_cell_info("loop.xlsx", "S", "A1", "P1", top_product=True)
+
+        assert result["error"] is None
+        assert result["references"][0]["references"][0]["error"] == "Circular Error: Circular reference detected"
+
+    def test_max_depth(self, make_extractor):
+        cells = {f"A{row}": (f"=A{row + 1}", 1) for row in range(1, 10)}
+        extractor = make_extractor({"chain.xlsx": {"S": cells}}, max_recursion_depth=2)
+        result = extractor.extract_cell_info("chain.xlsx", "S", "A1", "P1", top_product=True)
+
+        assert result["references"][0]["references"][0]["error"] == "Max Recursion Depth Error: Max recursion depth reached"
+
+    def test_parallel_batch_matches_serial(self, make_extractor):
+        """Sharded processing returns the same results, in input order, as the serial batch."""
+        from functools import partial
+        from conftest import DictBackend
+
+        workbooks = {
+            "a.xlsx": {"PO": {"B1": ("='[shared.xlsx]S'!A1+'[shared.xlsx]S'!A2", 0), "B2": ("='[shared.xlsx]S'!A2", 0)}},
+            "b.xlsx": {"PO": {"B1": ("='[shared.xlsx]S'!A1*2", 0)}},
+            "shared.xlsx": {"S": {"A1": ("=A2+A3", 0), "A2": (None, 2), "A3": ("=A1", 0)}},
+        }
+        requests = [("a.xlsx", "PO", "B1", "P1"), ("b.xlsx", "PO", "B1", "P2"), ("a.xlsx", "PO", "B2", "P3")]
+        serial = list(make_extractor(workbooks, stop_on_multiplication=False).extract_batch(requests))
+        extractor = make_extractor(workbooks, stop_on_multiplication=False)
+        parallel = list(extractor.extract_batch_parallel(requests, 2, partial(DictBackend, workbooks)))
+
+        assert extractor._shard_requests(requests, 2) == [[0, 2], [1]]
+        assert parallel == serial
+
+    def test_roots_sharing_external_workbooks_are_co_sharded(self, make_extractor):
+        """Root workbooks whose formulas point at the same external workbook land in the same shard."""
+        workbooks = {
+            "a.xlsx": {"PO": {"B1": ("='[x.xlsx]S'!A1", 0)}},
+            "b.xlsx": {"PO": {"B1": ("='[x.xlsx]S'!A1+1", 0)}},
+            "c.xlsx": {"PO": {"B1": ("='[y.xlsx]S'!A1", 0)}},
+            "d.xlsx": {"PO": {"B1": ("='[y.xlsx]S'!A1+1", 0)}},
+            "x.xlsx": {"S": {"A1": (None, 1)}},
+            "y.xlsx": {"S": {"A1": (None, 2)}},
+        }
+        requests = [(f"{name}.xlsx", "PO", "B1", f"P{index}") for index, name in enumerate("abcd")]
+        extractor = make_extractor(workbooks)
+
+        assert extractor._shard_requests(requests, 2) == [[0, 1], [2, 3]]
+
+    def test_worker_releases_backend_once(self, make_extractor, tmp_path, monkeypatch):
+        """A worker keeps its workbooks open across its shards and releases them once, when it goes away."""
+        import gc
+        from functools import partial
+        import cell_info_extractor
+
+        workbooks = {name: {"PO": {"B1": (None, 1)}} for name in ("a.xlsx", "b.xlsx", "c.xlsx")}
+        requests = [(name, "PO", "B1", f"P{index}") for index, name in enumerate(workbooks)]
+        extractor = make_extractor(workbooks)
+        log_path = tmp_path / "cleanups"
+        monkeypatch.setattr(cell_info_extractor.workbook_cache, "configure", lambda *args: None)
+
+        cell_info_extractor._init_worker(extractor.file_index, extractor.product_mapper, {}, partial(CleanupRecorder, workbooks, log_path), 0, 0, ())
+        cell_info_extractor._extract_shard(requests[:1])
+        cell_info_extractor._extract_shard(requests[1:])
+        assert not log_path.exists()
+
+        cell_info_extractor._worker_extractor = None
+        gc.collect()
+        assert log_path.read_text().splitlines() == ["cleanup"]
+
+        # Worker processes release their backend on exit
+        list(extractor.extract_batch_parallel(requests, 2, partial(CleanupRecorder, workbooks, tmp_path / "workers")))
+        assert len((tmp_path / "workers").read_text().splitlines()) == 2
+
+    def test_batch_is_streamed_in_chunks(self, make_extractor):
+        """Resolving the batch a chunk at a time yields the same results, one by one."""
+        requests = [("products.xlsx", "PO", "B1", "P1"), ("products.xlsx", "PO", "B2", "P2"), ("products.xlsx", "Elements", "A1", "P3")]
+        whole = list(make_extractor(self.WORKBOOKS).extract_batch(requests))
+        extractor = make_extractor(self.WORKBOOKS)
+        stream = extractor.extract_batch(requests, chunk_size=1)
+
+        first = next(stream)
+        assert first == whole[0]
+        assert ("products.xlsx", "PO", "B2") not in extractor.backend.reads
+        assert [first, *stream] == whole
+        assert len(extractor.backend.reads) == len(set(extractor.backend.reads))
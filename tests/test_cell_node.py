@@ -0,0 +1,27 @@
+from schema.cell_node import CellNode, FLAG_BASE_MATERIAL, FLAG_ELEMENT
+
+
+class TestCellNode:
+    """Test cases for the compact node used inside the extractor."""
+
+    def test_reads_like_a_formula_result(self):
+        node = CellNode("book.xlsx", "My Sheet", "A1", flags=FLAG_ELEMENT)
+        node.product_id = "P1"
+
+        assert node["id"] == "book.xlsx_MySheet_A1"
+        assert node["isProduct"] and node["isElement"] and not node["isBaseMaterial"]
+        assert node["productID"] == "P1"
+        assert node.get("missing", 0) == 0
+
+    def test_to_result_shares_converted_cells(self):
+        leaf = CellNode("book.xlsx", "S", "C1", flags=FLAG_BASE_MATERIAL)
+        root = CellNode("book.xlsx", "S", "A1")
+        root.references = (leaf, leaf)
+
+        result = root.to_result()
+
+        assert list(result) == ["id", "file", "sheet", "cell", "formula", "cleaned_formula", "updated_formula", "value", "path",
+                                "isProduct", "productID", "isElement", "isBaseMaterial", "isMultiplication", "isDivision",
+                                "hReferenceCount", "template", "quantities", "error", "references"]
+        assert result["references"][0] is result["references"][1]
+        assert result["references"][0]["isBaseMaterial"] is True
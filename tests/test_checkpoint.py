@@ -0,0 +1,117 @@
+import pytest
+from checkpoint import OFFSET_PREFIX, Checkpoint
+from result_manager import ResultManager, load_results
+
+
+class TestCheckpoint:
+    """Test cases for resuming an interrupted run from its checkpoint."""
+
+    REQUESTS = [("a.xlsx", "PO", f"B{row}", f"P {row}") for row in range(1, 6)]
+
+    @pytest.fixture(autouse=True)
+    def logs(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / "Logs" / "Current Logs").mkdir(parents=True)
+
+    def results(self, requests, fail_after=None):
+        for index, (_, _, cell, product_id) in enumerate(requests):
+            if index == fail_after:
+                raise RuntimeError("Excel crashed")
+            yield {"id": f"a.xlsx_PO_{cell}", "productID": product_id, "cleaned_formula": None, "references": []}
+
+    def checkpointed(self, tmp_path):
+        return [line for line in (tmp_path / "checkpoint.txt").read_text().splitlines() if not line.startswith(OFFSET_PREFIX)]
+
+    def run(self, tmp_path, resume, fail_after=None, persist=None, log_name="log.jsonl"):
+        checkpoint = Checkpoint(tmp_path / "checkpoint.txt", persist=persist)
+        checkpoint.start(resume)
+        pending = checkpoint.pending(self.REQUESTS)
+        try:
+            ResultManager(tmp_path / log_name, flush_every=2).save_results(
+                self.results(pending, fail_after), append=resume, checkpoint=checkpoint, product_ids=[request[3] for request in pending])
+        finally:
+            checkpoint.close()
+        return pending
+
+    def test_resume_skips_completed_products(self, tmp_path):
+        """A resumed run only processes the products missing from the checkpoint."""
+        with pytest.raises(RuntimeError):
+            self.run(tmp_path, resume=False, fail_after=3)
+        assert self.checkpointed(tmp_path) == ["P 1", "P 2", "P 3"]
+
+        pending = self.run(tmp_path, resume=True)
+
+        assert [request[3] for request in pending] == ["P 4", "P 5"]
+        assert [result["productID"] for result in load_results(tmp_path / "log.jsonl")] == ["P 1", "P 2", "P 3", "P 4", "P 5"]
+
+    def test_new_run_starts_over(self, tmp_path):
+        """Without resume the checkpoint and the log are started anew."""
+        self.run(tmp_path, resume=False)
+        pending = self.run(tmp_path, resume=False)
+
+        assert len(pending) == 5
+        assert len(load_results(tmp_path / "log.jsonl")) == 5
+
+    def test_partial_lines_are_dropped(self, tmp_path):
+        """Lines cut off by a hard crash are ignored in the checkpoint and removed from the log."""
+        (tmp_path / "checkpoint.txt").write_text("P 1\nP 2")
+        (tmp_path / "log.jsonl").write_text('{"id":"a.xlsx_PO_B1","productID":"P 1","references":[]}\n{"id":"a.xl')
+
+        pending = self.run(tmp_path, resume=True)
+
+        assert [request[3] for request in pending] == ["P 2", "P 3", "P 4", "P 5"]
+        assert [result["productID"] for result in load_results(tmp_path / "log.jsonl")] == ["P 1", "P 2", "P 3", "P 4", "P 5"]
+        assert self.checkpointed(tmp_path) == ["P 1", "P 2", "P 3", "P 4", "P 5"]
+
+    @pytest.mark.parametrize("log_name", ["log.jsonl", "log.dag.jsonl"])
+    def test_results_after_the_last_checkpoint_are_cut(self, tmp_path, log_name):
+        """A run killed between a log flush and its checkpoint leaves no duplicate products after resuming."""
+        calls = []
+
+        def killed_on_second_checkpoint():
+            calls.append(None)
+            if len(calls) >= 2:
+                raise SystemExit("killed")
+
+        with pytest.raises(SystemExit):
+            self.run(tmp_path, resume=False, persist=killed_on_second_checkpoint, log_name=log_name)
+        assert len(load_results(tmp_path / log_name)) == 4
+        assert self.checkpointed(tmp_path) == ["P 1", "P 2"]
+
+        pending = self.run(tmp_path, resume=True, log_name=log_name)
+
+        assert [request[3] for request in pending] == ["P 3", "P 4", "P 5"]
+        assert [result["productID"] for result in load_results(tmp_path / log_name)] == ["P 1", "P 2", "P 3", "P 4", "P 5"]
+
+    def test_resumed_summaries_count_each_product_once(self, tmp_path):
+        """Results cut from the log on resume are not counted in the summaries of the resumed run."""
+        calls = []
+
+        def killed_on_second_checkpoint():
+            calls.append(None)
+            if len(calls) >= 2:
+                raise SystemExit("killed")
+
+        with pytest.raises(SystemExit):
+            self.run(tmp_path, resume=False, persist=killed_on_second_checkpoint)
+
+        checkpoint = Checkpoint(tmp_path / "checkpoint.txt")
+        checkpoint.start(resume=True)
+        pending = checkpoint.pending(self.REQUESTS)
+        manager = ResultManager(tmp_path / "log.jsonl", flush_every=2)
+        manager.save_results(self.results(pending), append=True, checkpoint=checkpoint, product_ids=[request[3] for request in pending])
+        checkpoint.close()
+
+        assert sum(manager.summary_logger.counts.values()) == 5
+
+    def test_numeric_product_ids(self, tmp_path):
+        """Product IDs read as numbers are recognized as completed after a resume."""
+        checkpoint = Checkpoint(tmp_path / "checkpoint.txt")
+        checkpoint.start(resume=False)
+        checkpoint.mark([1001.0, 1002.0], log_offset=10)
+        checkpoint.close()
+
+        checkpoint.start(resume=True)
+        requests = [("a.xlsx", "PO", "B1", 1001.0), ("a.xlsx", "PO", "B2", 1003.0)]
+        assert checkpoint.pending(requests) == [("a.xlsx", "PO", "B2", 1003.0)]
+        checkpoint.close()
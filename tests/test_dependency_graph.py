@@ -0,0 +1,80 @@
+from utils.dependency_graph import cell_key
+
+
+class TestDependencyGraph:
+    """Test cases for the DependencyGraph built over batch requests."""
+
+    WORKBOOKS = {
+        "book.xlsx": {"S": {
+            "A1": ("=B1+C1", 0),
+            "A2": ("=C1*2", 0),
+            "B1": ("=D1", 0),
+            "C1": ("=D1+E1", 0),
+            "D1": (None, 1),
+            "E1": ("=F1", 0),
+            "F1": ("=E1", 0),
+        }},
+    }
+
+    def extract(self, make_extractor):
+        extractor = make_extractor(self.WORKBOOKS, stop_on_multiplication=False)
+        results = list(extractor.extract_batch([("book.xlsx", "S", "A1", "P1"), ("book.xlsx", "S", "A2", "P2")]))
+        return extractor, results
+
+    def test_cells_are_read_once(self, make_extractor):
+        extractor, results = self.extract(make_extractor)
+
+        assert len(extractor.backend.reads) == len(set(extractor.backend.reads)) == 7
+        assert [result["productID"] for result in results] == ["P1", "P2"]
+        # Shared cell C1 is resolved once, as one node under both products
+        c1 = cell_key("book.xlsx", "S", "C1")
+        assert extractor.resolver.resolution_cache[c1] in extractor.resolver.graph.nodes.values()
+        assert results[0]["references"][1] is results[1]["references"][0]
+
+    def test_cells_are_one_node(self, make_extractor):
+        """A cell reached through several references is the node that was read, not a copy per visit."""
+        extractor, results = self.extract(make_extractor)
+        d1 = extractor.cell_memo[cell_key("book.xlsx", "S", "D1")].result
+        b1, c1 = extractor.resolver.resolution_cache[cell_key("book.xlsx", "S", "B1")], extractor.resolver.resolution_cache[cell_key("book.xlsx", "S", "C1")]
+
+        assert b1.references[0] is c1.references[0] is d1
+        assert c1 is extractor.cell_memo[cell_key("book.xlsx", "S", "C1")].result
+        assert results[0]["references"][0]["references"][0] is results[0]["references"][1]["references"][0]
+
+    def test_cycles_and_order(self, make_extractor):
+        extractor, _ = self.extract(make_extractor)
+        graph = extractor.resolver.graph
+
+        assert graph.cycles() == [[cell_key("book.xlsx", "S", "E1"), cell_key("book.xlsx", "S", "F1")]]
+        order = graph.topological_order()
+        assert order.index(cell_key("book.xlsx", "S", "C1")) > order.index(cell_key("book.xlsx", "S", "E1"))
+        assert order.index(cell_key("book.xlsx", "S", "A1")) > order.index(cell_key("book.xlsx", "S", "C1"))
+
+    def test_circular_reference_in_tree(self, make_extractor):
+        _, results = self.extract(make_extractor)
+        e1 = results[0]["references"][1]["references"][1]
+
+        assert e1["error"] is None
+        assert e1["references"][0]["references"][0]["error"] == "Circular Error: Circular reference detected"
+
+    def test_impact_queries(self, make_extractor):
+        extractor, _ = self.extract(make_extractor)
+        graph = extractor.resolver.graph
+        d1 = cell_key("book.xlsx", "S", "D1")
+
+        assert graph.dependents(d1) == {cell_key("book.xlsx", "S", cell) for cell in ("A1", "A2", "B1", "C1")}
+        assert d1 in graph.dependencies(cell_key("book.xlsx", "S", "A2"))
+
+    def test_levels_are_fetched_per_workbook(self, make_extractor):
+        """Each level of the graph reads each workbook sheet in one bulk read."""
+        workbooks = {
+            "products.xlsx": {"PO": {f"B{row}": (f"='[elements.xlsx]E'!A{row}+'[materials.xlsx]M'!A{row}", 0) for row in range(1, 6)}},
+            "elements.xlsx": {"E": {f"A{row}": (f"='[materials.xlsx]M'!B{row}", 0) for row in range(1, 6)}},
+            "materials.xlsx": {"M": {**{f"A{row}": (None, 1) for row in range(1, 6)}, **{f"B{row}": (None, 2) for row in range(1, 6)}}},
+        }
+        extractor = make_extractor(workbooks)
+        list(extractor.extract_batch([("products.xlsx", "PO", f"B{row}", f"P{row}") for row in range(1, 6)]))
+
+        # Level 1: elements + materials, level 2: materials
+        assert extractor.workbook_switches == 3
+        assert len(extractor.backend.reads) == len(set(extractor.backend.reads)) == 20
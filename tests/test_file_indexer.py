@@ -0,0 +1,134 @@
+import json
+import os
+from pathlib import Path
+import pytest
+from batch_processor import validate_requests
+from file_indexer import FileIndex, FileIndexer
+
+
+class TestFileIndexer:
+    """Test cases for the persisted, incremental file index."""
+
+    @staticmethod
+    def touch(path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"")
+
+    @staticmethod
+    def bump_mtime(directory):
+        # Make the change visible whatever the timestamp resolution of the file system
+        mtime = os.stat(directory).st_mtime_ns + 10 ** 9
+        os.utime(directory, ns=(mtime, mtime))
+
+    def build(self, tmp_path):
+        base = tmp_path / "products"
+        for name in ("a.xlsx", "notes.txt", "x/b.xlsm", "x/y/c.xls", "z/d.xlsx"):
+            self.touch(base / name)
+        return base
+
+    def test_same_index_as_os_walk(self, tmp_path):
+        base = self.build(tmp_path)
+        self.touch(base / "z" / "a.xlsx")  # Duplicate name: the later one in os.walk order wins
+
+        expected = {}
+        for root, _, files in os.walk(base):
+            for file in files:
+                if file.endswith(('.xlsx', '.xls', '.xlsm')):
+                    expected[file] = Path(root) / file
+
+        file_index = FileIndexer(base, workers=3).create_file_index()
+        assert {name: file_index.get(name) for name in expected} == expected
+        assert len(file_index) == 5
+
+    def test_refresh_only_lists_changed_directories(self, tmp_path):
+        base = self.build(tmp_path)
+        index_path = tmp_path / "file_index.json"
+        assert {path.name for path in FileIndexer(base, index_path).create_file_index()} == {"a.xlsx", "b.xlsm", "c.xls", "d.xlsx"}
+
+        unchanged = FileIndexer(base, index_path)
+        unchanged.create_file_index()
+        assert unchanged.rescanned == 0
+
+        self.touch(base / "x" / "y" / "new.xlsx")
+        self.bump_mtime(base / "x" / "y")
+        (base / "z" / "d.xlsx").unlink()
+        (base / "z").rmdir()
+        self.bump_mtime(base)
+
+        refreshed = FileIndexer(base, index_path)
+        file_index = refreshed.create_file_index()
+        assert {path.name for path in file_index} == {"a.xlsx", "b.xlsm", "c.xls", "new.xlsx"}
+        assert file_index.get("new.xlsx") == base / "x" / "y" / "new.xlsx"
+        assert refreshed.rescanned == 2
+
+
+class TestFileIndex:
+    """Test cases for file name lookups in formulas."""
+
+    def test_names_are_normalized(self, tmp_path):
+        file_index = FileIndex([tmp_path / "calculatie cat 2022.xlsx"])
+
+        assert file_index.get("calculatie cat 2022 .xlsx") == tmp_path / "calculatie cat 2022.xlsx"
+        assert file_index.resolve("CALCULATIE cat 2022 .xlsx", "c.basis") == ("calculatie cat 2022.xlsx", "c.basis")
+        assert file_index.get("other.xlsx") is None
+
+    def test_collisions_keep_every_file(self, tmp_path):
+        first, second, exact = tmp_path / "a" / "Book.xlsx", tmp_path / "b" / "book.xlsx", tmp_path / "c" / "Book.xlsx"
+        file_index = FileIndex([first, exact, second])
+
+        assert file_index.paths("book.xlsx") == [first, exact, second]
+        assert file_index.get("book.xlsx") == second
+        # An exact name match wins over a normalized one
+        assert file_index.get("Book.xlsx") == exact
+        assert list(file_index.collisions()) == ["book.xlsx"]
+
+    def test_aliases(self, tmp_path):
+        aliases_path = tmp_path / "file_aliases.json"
+        aliases_path.write_text(json.dumps({
+            "Berekening Ladenkasten 794.xlsx": {"file": "2022 - P1 Berekening  Ladenkasten 794-KLEUR.xlsx", "sheet": "OVERZICHT COP"},
+            "old.xlsx": "new.xlsx",
+        }), encoding="utf-8")
+        file_index = FileIndex([tmp_path / "2022 - P1 Berekening  Ladenkasten 794-KLEUR.xlsx", tmp_path / "new.xlsx"])
+        file_index.load_aliases(aliases_path)
+
+        assert file_index.resolve("Berekening Ladenkasten 794.xlsx", "LADE 30") == ("2022 - P1 Berekening  Ladenkasten 794-KLEUR.xlsx", "OVERZICHT COP")
+        assert file_index.resolve("Old.xlsx", "S") == ("new.xlsx", "S")
+
+
+class TestSheetCatalogue:
+    """Test cases for the sheet names kept with the file index."""
+
+    def test_missing_files_and_tabs_are_found_from_the_index(self, tmp_path, xlsx_factory, monkeypatch):
+        base = tmp_path / "products"
+        base.mkdir()
+        xlsx_factory("products/book.xlsx", {"OVERZICHT PO": [], "LADE 30": []})
+        index_path = tmp_path / "file_index.json"
+        requests = [("book.xlsx", "LADE 30", "A1", "P1"), ("book.xlsx", "LADE 40", "A1", "P2"), ("gone.xlsx", "S", "A1", "P3")]
+
+        indexer = FileIndexer(base, index_path)
+        file_index = indexer.create_file_index()
+        assert file_index.sheet_names("Book.xlsx") == ["OVERZICHT PO", "LADE 30"]
+        assert validate_requests(requests, file_index) == [
+            (requests[1], "Sheet Error: Sheet LADE 40 not found"),
+            (requests[2], "File Error: File gone.xlsx not found in index"),
+        ]
+        indexer.save(file_index)
+
+        # The next run answers from the saved catalogue without reading the workbook again
+        monkeypatch.setattr("file_indexer.read_sheet_names", lambda path: pytest.fail("workbook read again"))
+        assert FileIndexer(base, index_path).create_file_index().sheet_names("book.xlsx") == ["OVERZICHT PO", "LADE 30"]
+
+    def test_changed_workbook_is_read_again(self, tmp_path, xlsx_factory):
+        base = tmp_path / "products"
+        base.mkdir()
+        path = xlsx_factory("products/book.xlsx", {"S": []})
+        index_path = tmp_path / "file_index.json"
+        indexer = FileIndexer(base, index_path)
+        indexer.save(indexer.create_file_index())
+        indexer.create_file_index().sheet_names("book.xlsx")
+
+        xlsx_factory("products/book.xlsx", {"S": [], "New tab": []})
+        os.utime(path, ns=(os.stat(path).st_mtime_ns + 10 ** 9,) * 2)
+
+        assert FileIndexer(base, index_path).create_file_index().sheet_names("book.xlsx") == ["S", "New tab"]
+        assert FileIndex([base / "book.xls"]).sheet_names("book.xls") is None
@@ -0,0 +1,22 @@
+from utils.formula_cleaner import FormulaCleaner
+
+
+class TestFormulaCleaner:
+    """Test cases for the FormulaCleaner class."""
+
+    def test_removes_prefixes_and_spaces(self):
+        """Base URLs, known folders and spaces outside quotes are removed."""
+        formula = "=+'\\\\LS420D340\\Zaak\\Kovera\\BASISMATERIALEN\\[calculatie cat 2022.xlsx]Blad 1'!$A$1 + 2"
+        assert FormulaCleaner.clean_formula(formula) == "'[calculatie cat 2022.xlsx]Blad 1'!A1+2"
+
+        folder = FormulaCleaner.FOLDERS[5]
+        assert FormulaCleaner.clean_formula(f"='{folder}/[Kast 1.xlsx]OVERZICHT PO'!U19 * 3") == "'[Kast 1.xlsx]OVERZICHT PO'!U19*3"
+
+    def test_unmatched_quote(self):
+        """A trailing quote without its pair does not protect the spaces after it."""
+        assert FormulaCleaner.clean_formula("='a b'+' c d") == "'a b'+'cd"
+
+    def test_clean_many(self):
+        """A batch is cleaned in order, with duplicates cleaned once."""
+        formulas = ["=A1 + B1", None, "=A1 + B1", "=SUM( C1:C3 )"]
+        assert FormulaCleaner.clean_many(formulas) == ["A1+B1", None, "A1+B1", "SUM(C1:C3)"]
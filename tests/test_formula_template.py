@@ -0,0 +1,69 @@
+from utils.formula_parser import FormulaParser
+from utils.formula_template import formula_template
+
+
+class TestFormulaTemplate:
+    """Test cases for R1C1 templates and the template cache of the FormulaParser."""
+
+    def setup_method(self):
+        self.parser = FormulaParser()
+
+    def test_copies_share_template(self):
+        """A formula dragged down a column keeps the same template."""
+        assert formula_template("+C19*D17", "E19") == "+R[0]C[-2]*R[-2]C[-1]"
+        assert formula_template("+C20*D18", "E20") == formula_template("+C19*D17", "E19")
+        assert formula_template("+C20*D17", "E20") != formula_template("+C19*D17", "E19")
+
+    def test_template_ignores_sheet_names_and_strings(self):
+        """Only cell references are converted."""
+        template = formula_template("'Sheet A1'!B2+Data1!C3&\"D4\"+LOG10(E5)", "A1")
+        assert template == "'Sheet A1'!R[1]C[1]+Data1!R[2]C[2]&\"D4\"+LOG10(R[4]C[4])"
+
+    def test_reanchored_copy_matches_fresh_parse(self):
+        """A formula answered from the template cache equals a fresh parse."""
+        self.parser.parse_formula("C19*'[Book.xlsx]Data'!D17+SUM(H1:H4)", "test.xlsx", "Sheet1", "E19")
+        cached = self.parser.parse_formula("C20*'[Book.xlsx]Data'!D18+SUM(H2:H5)", "test.xlsx", "Sheet1", "E20")
+        fresh = FormulaParser().parse_formula("C20*'[Book.xlsx]Data'!D18+SUM(H2:H5)", "test.xlsx", "Sheet1")
+
+        assert self.parser.template_hits == 1
+        assert cached["template"] is not None
+        assert cached["updated_formula"] == fresh["updated_formula"]
+        assert [ref["id"] for ref in cached["references"]] == [ref["id"] for ref in fresh["references"]]
+
+    def test_hit_is_not_parsed_again(self, monkeypatch):
+        """A copy answered from the template cache is neither tokenized, nor extracted, nor folded into quantities."""
+        self.parser.parse_formula("H19+2*'[Book.xlsx]Data'!H17+Data!A1:B4", "test.xlsx", "Sheet1", "E19")
+
+        def not_called(*args, **kwargs):
+            raise AssertionError("parsed again")
+        monkeypatch.setattr(self.parser.extractor.tokenizer, "tokenize", not_called)
+        monkeypatch.setattr(self.parser.extractor, "extract_references_from_tokens", not_called)
+        monkeypatch.setattr(self.parser.add_quantity.builder, "parse", not_called)
+        monkeypatch.setattr(self.parser.add_quantity, "quantities_from_tokens", not_called)
+
+        cached = self.parser.parse_formula("H20+2*'[Book.xlsx]Data'!H18+Data!A2:B5", "test.xlsx", "Sheet1", "E20")
+        moved = self.parser.parse_formula("I20+2*'[Book.xlsx]Data'!I18+Data!B2:C5", "test.xlsx", "Sheet1", "F20")
+        monkeypatch.undo()
+
+        assert self.parser.template_hits == 2
+        for info, formula in [(cached, "H20+2*'[Book.xlsx]Data'!H18+Data!A2:B5"), (moved, "I20+2*'[Book.xlsx]Data'!I18+Data!B2:C5")]:
+            fresh = FormulaParser().parse_formula(formula, "test.xlsx", "Sheet1")
+            assert {key: value for key, value in info.items() if key not in ("references", "template")} == \
+                {key: value for key, value in fresh.items() if key not in ("references", "template")}
+            assert [ref.id for ref in info["references"]] == [ref.id for ref in fresh["references"]]
+
+    def test_reference_off_sheet_falls_back(self):
+        """A copy whose references would leave the sheet is parsed from scratch."""
+        self.parser.parse_formula("A2+B1", "test.xlsx", "Sheet1", "C2")
+        info = self.parser.parse_formula("A1+B0", "test.xlsx", "Sheet1", "C1")
+
+        assert self.parser.template_hits == 0
+        assert info["updated_formula"] == FormulaParser().parse_formula("A1+B0", "test.xlsx", "Sheet1")["updated_formula"]
+
+    def test_cell_becoming_invalid_falls_back(self):
+        """A copy whose reference leaves the cell pattern (row 1000) is parsed from scratch."""
+        self.parser.parse_formula("A998+B1", "test.xlsx", "Sheet1", "C2")
+        info = self.parser.parse_formula("A1000+B3", "test.xlsx", "Sheet1", "C4")
+
+        assert self.parser.template_hits == 0
+        assert info["updated_formula"] == "A1000+test.xlsx_Sheet1_B3"
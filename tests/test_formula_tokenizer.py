@@ -0,0 +1,74 @@
+import pytest
+from utils.formula_tokenizer import (
+    CELL, EXTERNAL_REF, FUNCTION, NUMBER, RANGE, SHEET_REF, STRING,
+    BinaryOp, Call, FormulaSyntaxError, FormulaTokenizer, Number, Reference, SheetNameTrie, UnaryOp, parse_formula_ast,
+)
+from utils.reference_extractor import ReferenceExtractor
+
+
+class TestFormulaTokenizer:
+    """Test cases for the FormulaTokenizer and the AST builder."""
+
+    def setup_method(self):
+        self.tokenizer = FormulaTokenizer()
+
+    def test_tokens_round_trip(self):
+        """Joining the token texts gives back the original formula."""
+        formulas = [
+            "=SUM('[Book 1.xlsx]My Sheet'!A1:B2)*2+Sheet2!$C$3",
+            "=IF(A1>=10,\"yes \"\"quoted\"\"\",#N/A)",
+            "='FRIGO+OVEN'!D5+ 1.5E3%",
+            "=[2]Prijzen!B4-A:A",
+        ]
+        for formula in formulas:
+            assert "".join(token.text for token in self.tokenizer.tokenize(formula)) == formula
+
+    def test_token_kinds(self):
+        """Each reference form is recognised with its file, sheet and cell."""
+        tokens = [token for token in self.tokenizer.tokenize("='[Book.xlsx]Data'!A1+Sheet2!$B$2+C3+SUM(D1:D4)+\"E5\"")
+                  if token.kind not in ("operator", "open", "close")]
+
+        assert [token.kind for token in tokens] == [EXTERNAL_REF, SHEET_REF, CELL, FUNCTION, RANGE, STRING]
+        assert (tokens[0].file, tokens[0].sheet, tokens[0].cell) == ("Book.xlsx", "Data", "A1")
+        assert (tokens[1].sheet, tokens[1].cell) == ("Sheet2", "B2")
+        assert (tokens[4].cell, tokens[4].end) == ("D1", "D4")
+
+    def test_operator_sheet_names(self):
+        """Sheet names containing an operator are kept whole."""
+        tokens = self.tokenizer.tokenize("=KOLOM+BL!A1*2")
+        assert tokens[1].kind == SHEET_REF
+        assert tokens[1].sheet == "KOLOM+BL"
+
+    def test_workbook_sheet_names(self):
+        """Unquoted sheet names with odd characters are read from the workbook's own names, longest first."""
+        trie = SheetNameTrie(["Prijzen", "PRIJS+MARGE", "PRIJS+MARGE 2", "Übersicht", "KOLOM"])
+        assert trie.names == ("PRIJS+MARGE", "PRIJS+MARGE 2", "Übersicht")
+
+        tokens = [token for token in self.tokenizer.tokenize("=PRIJS+MARGE!A1+Übersicht!B2*KOLOM+BL!C3", trie)
+                  if token.kind == SHEET_REF]
+        assert [(token.sheet, token.cell) for token in tokens] == [("PRIJS+MARGE", "A1"), ("Übersicht", "B2"), ("BL", "C3")]
+
+    def test_ast_precedence(self):
+        """Multiplication binds tighter than addition, unary minus tighter than power."""
+        tree = parse_formula_ast("=1+2*A1")
+        assert isinstance(tree, BinaryOp) and tree.op == "+"
+        assert tree.left == Number(1.0)
+        assert isinstance(tree.right, BinaryOp) and tree.right.op == "*"
+        assert isinstance(tree.right.right, Reference)
+
+        tree = parse_formula_ast("=-2^2")
+        assert tree == BinaryOp("^", UnaryOp("-", Number(2.0)), Number(2.0))
+
+        tree = parse_formula_ast("=ROUND(A1, 2)")
+        assert isinstance(tree, Call) and tree.name == "ROUND" and len(tree.args) == 2
+
+    def test_ast_syntax_error(self):
+        with pytest.raises(FormulaSyntaxError):
+            parse_formula_ast("=(1+2")
+
+    def test_reference_ids_do_not_overlap(self):
+        """A1 is replaced as a whole token, never inside AA1."""
+        refs, updated = ReferenceExtractor().extract_references("AA1+A1", "test.xlsx", "Sheet1")
+
+        assert [ref["cell"] for ref in refs] == ["AA1", "A1"]
+        assert updated == "test.xlsx_Sheet1_AA1+test.xlsx_Sheet1_A1"
@@ -0,0 +1,88 @@
+from utils.cache_manager import WorkbookCache
+from utils.prefetcher import WorkbookPrefetcher
+from utils.workbook_snapshot import SnapshotBackend
+from utils.xlsx_reader import XlsxReader
+
+
+class CountingReader(XlsxReader):
+    """XlsxReader that counts how often a sheet is streamed."""
+
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+
+    def iter_cells(self, file_path, sheet_name):
+        self.reads += 1
+        return super().iter_cells(file_path, sheet_name)
+
+
+class RecordingPrefetcher:
+    """Stands in for WorkbookPrefetcher and records what was queued."""
+
+    def __init__(self):
+        self.queued = []
+
+    def prefetch(self, file_path, sheet_name):
+        self.queued.append((file_path.name, sheet_name))
+
+
+class TestWorkbookPrefetcher:
+    """Test cases for the background workbook prefetcher."""
+
+    def test_sheet_is_loaded_in_background(self, xlsx_factory):
+        """A prefetched sheet is answered from its snapshot without streaming it again."""
+        path = xlsx_factory("book.xlsx", {"OVERZICHT": ['<c r="Y20"><f>+C19*D17</f><v>12</v></c>']})
+        reader = CountingReader()
+        backend = SnapshotBackend(reader)
+        prefetcher = WorkbookPrefetcher(backend, workers=2)
+
+        prefetcher.prefetch(path, "OVERZICHT")
+        prefetcher.prefetch(path, "OVERZICHT")
+        prefetcher.wait()
+
+        assert prefetcher.submitted == 1
+        assert reader.reads == 1
+        assert backend.get_cell_info(path, "OVERZICHT", "Y20") == ("=+C19*D17", 12.0)
+        assert reader.reads == 1
+        prefetcher.shutdown()
+        backend.cleanup()
+
+    def test_prefetch_respects_memory_budget(self, xlsx_factory):
+        """A workbook that does not fit in the cache budget is left to the foreground read."""
+        path = xlsx_factory("book.xlsx", {"OVERZICHT": ['<c r="Y20"><v>1</v></c>']})
+        reader = CountingReader()
+        backend = SnapshotBackend(reader)
+        prefetcher = WorkbookPrefetcher(backend, workers=1)
+        prefetcher.cache = WorkbookCache(memory_budget=10)
+
+        prefetcher.prefetch(path, "OVERZICHT")
+        prefetcher.wait()
+
+        assert prefetcher.skipped == 1 and prefetcher.submitted == 0
+        assert reader.reads == 0
+        prefetcher.shutdown()
+        backend.cleanup()
+
+    def test_missing_file_is_ignored(self, tmp_path):
+        """A failed prefetch does not raise; the foreground read reports it."""
+        prefetcher = WorkbookPrefetcher(SnapshotBackend(XlsxReader()), workers=1)
+
+        prefetcher.prefetch(tmp_path / "missing.xlsx", "OVERZICHT")
+        prefetcher.wait()
+
+        assert prefetcher.in_flight == 0
+        prefetcher.shutdown()
+
+    def test_extractor_queues_referenced_sheets(self, make_extractor):
+        """Parsing a formula queues the other sheets and workbooks it refers to."""
+        workbooks = {
+            "products.xlsx": {"PO": {"B1": ("='[catalogue.xlsx]Prices'!A1+Elements!A2+B2", 5), "B2": (None, 1)},
+                              "Elements": {"A2": (None, 3)}},
+            "catalogue.xlsx": {"Prices": {"A1": (None, 1)}},
+        }
+        prefetcher = RecordingPrefetcher()
+        extractor = make_extractor(workbooks, prefetcher=prefetcher)
+
+        extractor.extract_cell_info("products.xlsx", "PO", "B1", "P1", top_product=True)
+
+        assert sorted(prefetcher.queued) == [("catalogue.xlsx", "Prices"), ("products.xlsx", "Elements")]
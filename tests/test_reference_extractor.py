@@ -278,3 +278,34 @@ class TestReferenceExtractor:
         assert refs[0]["cell"] == "I65" 
 
         assert updated_formula == "calculatiecat2022.xlsx_c.basis_I65*7"
+
+    def test_ranges_expand_to_their_used_cells(self):
+        """A range refers to the used cells of the sheet inside it, or to its first cell when they are unknown."""
+        used = {"A1", "A4", "B2", "C1"}
+
+        def expand_range(file, sheet, first, last):
+            assert (first, last) in [("A1", "B10"), ("C", "C")]
+            columns = "AB" if first == "A1" else "C"
+            return sorted((cell for cell in used if cell[0] in columns), key=lambda cell: (int(cell[1:]), cell[0]))
+
+        refs, updated_formula = self.extractor.extract_references("SUM(A1:B10)+SUM(C:C)+A4", "test.xlsx", "Sheet1", expand_range=expand_range)
+
+        assert [ref["cell"] for ref in refs] == ["A1", "B2", "A4", "C1"]
+        assert updated_formula == "SUM(test.xlsx_Sheet1_A1:test.xlsx_Sheet1_B10)+SUM(test.xlsx_Sheet1_C:test.xlsx_Sheet1_C)+test.xlsx_Sheet1_A4"
+
+        refs, _ = self.extractor.extract_references("SUM(A1:B10)+SUM(C:C)", "test.xlsx", "Sheet1")
+        assert [ref["cell"] for ref in refs] == ["A1"]
+
+    def test_lookup_tables_are_not_expanded(self):
+        """Only ranges summed by SUM are expanded; a VLOOKUP table keeps referring to its first cell."""
+        expanded = []
+
+        def expand_range(file, sheet, first, last):
+            expanded.append((sheet, first, last))
+            return ["B1", "B2"]
+
+        refs, _ = self.extractor.extract_references("VLOOKUP(A1,Data!A1:C10,2,FALSE)+IF(A1>0,SUM(B1:B3),0)", "test.xlsx", "Sheet1",
+                                                    expand_range=expand_range)
+
+        assert expanded == [("Sheet1", "B1", "B3")]
+        assert [(ref["sheet"], ref["cell"]) for ref in refs] == [("Data", "A1"), ("Sheet1", "A1"), ("Sheet1", "B1"), ("Sheet1", "B2")]
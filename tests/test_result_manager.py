@@ -0,0 +1,105 @@
+import json
+import pytest
+from result_manager import DagResultSink, JsonlResultSink, ResultManager, load_results
+
+
+class TestResultLog:
+    """Test cases for the streamed result log."""
+
+    RESULTS = [
+        {"id": "a.xlsx_PO_B1", "cleaned_formula": "A1+A2", "isProduct": True, "references": []},
+        {"id": "a.xlsx_PO_B2", "cleaned_formula": "A3", "isProduct": True, "references": []},
+    ]
+
+    def test_sink_writes_one_line_per_result(self, tmp_path):
+        """Each result is one compact JSON line, readable back in order."""
+        path = tmp_path / "log.jsonl"
+        with JsonlResultSink(path, flush_every=1) as sink:
+            sink.write(self.RESULTS[0])
+            # Flushed before the sink is closed
+            assert path.read_text(encoding="utf-8").count("\n") == 1
+            sink.write(self.RESULTS[1])
+
+        assert len(path.read_text(encoding="utf-8").splitlines()) == 2
+        assert load_results(path) == self.RESULTS
+
+    def test_truncated_last_line_is_skipped(self, tmp_path):
+        """A line cut off by a crash does not hide the results before it."""
+        path = tmp_path / "log.jsonl"
+        path.write_text(json.dumps(self.RESULTS[0]) + "\n" + json.dumps(self.RESULTS[1])[:20], encoding="utf-8")
+
+        assert load_results(path) == self.RESULTS[:1]
+
+    def test_save_results_streams_generator(self, tmp_path, monkeypatch):
+        """save_results consumes a generator and writes .jsonl or a .json list."""
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / "Logs" / "Current Logs").mkdir(parents=True)
+
+        manager = ResultManager(tmp_path / "log.jsonl")
+        assert manager.save_results(result for result in self.RESULTS) == 2
+        assert manager.load_existing_results() == self.RESULTS
+        assert manager.summary_logger.counts["products"] == 2
+
+        legacy = ResultManager(tmp_path / "log.json")
+        legacy.save_results(iter(self.RESULTS))
+        assert json.loads((tmp_path / "log.json").read_text(encoding="utf-8")) == self.RESULTS
+        assert legacy.load_existing_results() == self.RESULTS
+
+
+class TestDagLog:
+    """Test cases for the .dag.jsonl log, which writes each distinct cell once."""
+
+    @staticmethod
+    def cell(cell, references=(), **fields):
+        return {"id": f"e.xlsx_E_{cell}", "cell": cell, "error": None, **fields, "references": list(references)}
+
+    def results(self):
+        shared = self.cell("A1", value=2)
+        cut = self.cell("A1", value=2, error="Circular Error: Circular reference detected")
+        first = self.cell("B1", [shared, shared, self.cell("A2"), shared], productID="P1")
+        second = self.cell("B2", [self.cell("A1", value=2), cut], productID="P2")
+        return [first, second]
+
+    def test_cells_are_written_once(self, tmp_path):
+        """Later products only point to cells already in the log; repeated references become multiplicities."""
+        path = tmp_path / "log.dag.jsonl"
+        with DagResultSink(path) as sink:
+            for result in self.results():
+                sink.write(result)
+
+        first, second = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+        assert first["product"] == "e.xlsx_E_B1"
+        assert first["edges"] == [["e.xlsx_E_B1", "e.xlsx_E_A1", 2], ["e.xlsx_E_B1", "e.xlsx_E_A2", 1], ["e.xlsx_E_B1", "e.xlsx_E_A1", 1]]
+        # Same id but different content: stored under its own key
+        assert sorted(second["nodes"]) == ["e.xlsx_E_A1#2", "e.xlsx_E_B2"]
+        assert load_results(path) == self.results()
+
+    def test_append_reuses_logged_cells(self, tmp_path):
+        """A resumed run points to the cells written by the previous one."""
+        path = tmp_path / "log.dag.jsonl"
+        first, second = self.results()
+        with DagResultSink(path) as sink:
+            sink.write(first)
+        with DagResultSink(path, append=True) as sink:
+            sink.write(second)
+
+        assert sorted(json.loads(path.read_text(encoding="utf-8").splitlines()[1])["nodes"]) == ["e.xlsx_E_A1#2", "e.xlsx_E_B2"]
+        results = load_results(path)
+        assert results == self.results()
+        # Shared cells are one dict in the rebuilt trees
+        assert results[0]["references"][0] is results[1]["references"][0]
+
+    def test_corrupt_line_is_an_error(self, tmp_path):
+        """Only a truncated last line is skipped: a corrupt line in the middle may hold cells used later."""
+        path = tmp_path / "log.dag.jsonl"
+        with DagResultSink(path) as sink:
+            for result in self.results():
+                sink.write(result)
+        first, second = path.read_text(encoding="utf-8").splitlines()
+
+        path.write_text(f"{first}\n{second[:20]}", encoding="utf-8")
+        assert len(load_results(path)) == 1
+
+        path.write_text(f"{first[:20]}\n{second}\n", encoding="utf-8")
+        with pytest.raises(ValueError, match="line 1"):
+            load_results(path)
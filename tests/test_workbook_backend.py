@@ -0,0 +1,100 @@
+import pytest
+from openpyxl import Workbook
+from utils.excel_utils import ExcelUtils
+from utils.workbook_backend import OpenpyxlBackend, create_backend
+from utils.workbook_snapshot import SnapshotBackend
+from utils.xlsx_reader import XlsxReader
+
+
+class TestWorkbookBackend:
+    """Test cases for the interchangeable workbook backends."""
+
+    def setup_method(self):
+        """Set up test fixtures before each test method."""
+        self.backends = [OpenpyxlBackend(), XlsxReader(), SnapshotBackend(OpenpyxlBackend()), SnapshotBackend(XlsxReader())]
+
+    def teardown_method(self):
+        for backend in self.backends:
+            backend.cleanup()
+
+    def _write_workbook(self, path):
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "OVERZICHT CK213"
+        ws["C19"] = 4
+        ws["D17"] = 3
+        ws["D19"] = "=+C19*D17"
+        wb.create_sheet("DE446x2137")["H39"] = "=SUM(A1:A3)"
+        wb.save(path)
+        return path
+
+    def test_backends_agree(self, tmp_path):
+        """Test that the openpyxl, xml and snapshot backends return the same cell info."""
+        path = self._write_workbook(tmp_path / "book.xlsx")
+
+        for backend in self.backends:
+            assert backend.get_sheet_names(path) == ["OVERZICHT CK213", "DE446x2137"]
+            assert backend.get_cell_info(path, "OVERZICHT CK213", "D19") == ("=+C19*D17", None)
+            assert backend.get_cell_info(path, "OVERZICHT CK213", "C19") == ("Cell has no formula in file", 4)
+            assert backend.get_cells(path, "DE446x2137", ["H39", "A1"]) == {
+                "H39": ("=SUM(A1:A3)", None),
+                "A1": ("Cell has no formula in file", None),
+            }
+
+    def test_openpyxl_get_cells_reads_tables_once(self, tmp_path, monkeypatch):
+        """Test that openpyxl answers several cells from the sheet tables, without a lookup per cell."""
+        path = self._write_workbook(tmp_path / "book.xlsx")
+        backend = OpenpyxlBackend()
+
+        def per_cell(*args, **kwargs):
+            raise AssertionError("looked up cell by cell")
+        monkeypatch.setattr(ExcelUtils, "get_cell_value", per_cell)
+
+        assert backend.get_cells(path, "OVERZICHT CK213", ["D19", "C19", "$D$17", "Z99"]) == {
+            "D19": ("=+C19*D17", None),
+            "C19": ("Cell has no formula in file", 4),
+            "$D$17": ("Cell has no formula in file", 3),
+            "Z99": ("Cell has no formula in file", None),
+        }
+        monkeypatch.undo()
+        assert backend.get_cells(path, "Missing", ["A1"]) == {"A1": ("Sheet not found", None)}
+        assert backend.get_cells(tmp_path / "missing.xlsx", "Sheet1", ["A1"]) == {"A1": ("File not found", None)}
+
+    def test_array_formulas_agree(self, tmp_path):
+        """Array formulas read the same through openpyxl as from the sheet XML."""
+        from openpyxl.worksheet.formula import ArrayFormula
+
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "Data"
+        ws["B1"] = ArrayFormula("B1:B3", "=_xlfn.UNIQUE(A1:A3)")
+        ws["C1"] = "=_xlfn.XLOOKUP(A1,A1:A3,A1:A3)"
+        path = tmp_path / "array.xlsx"
+        wb.save(path)
+
+        for backend in self.backends:
+            assert backend.get_cell_info(path, "Data", "B1") == ("=UNIQUE(A1:A3)", None)
+            assert [formula for _, _, formula, _ in backend.iter_cells(path, "Data")] == ["=UNIQUE(A1:A3)", "=XLOOKUP(A1,A1:A3,A1:A3)"]
+
+    def test_missing_file(self, tmp_path):
+        """Test that every backend reports a missing file the same way."""
+        for backend in self.backends:
+            assert backend.get_cell_info(tmp_path / "missing.xlsx", "Sheet1", "A1") == ("File not found", None)
+            with pytest.raises(FileNotFoundError):
+                backend.get_sheet_names(tmp_path / "missing.xlsx")
+
+    def test_unknown_backend(self):
+        """Test that an unknown backend name is rejected."""
+        with pytest.raises(ValueError):
+            create_backend("excel")
+
+    def test_read_only_sheet_is_materialized_once(self, tmp_path):
+        """Test that openpyxl lookups are served from the materialized sheet table."""
+        path = self._write_workbook(tmp_path / "book.xlsx")
+
+        assert ExcelUtils.get_cell_value(path, "OVERZICHT CK213", "C19") == 4
+        assert ExcelUtils.get_cell_value(path, "OVERZICHT CK213", "D19", data_only=False) == "=+C19*D17"
+        assert ExcelUtils.get_cell_value(path, "OVERZICHT CK213", "Z99") is None
+
+        table = ExcelUtils._SHEET_CACHE[f"{path}|True"]["OVERZICHT CK213"]
+        assert table == {(17, 4): 3, (19, 3): 4}
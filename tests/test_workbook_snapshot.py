@@ -0,0 +1,109 @@
+from utils.cache_manager import WorkbookCache
+from utils.parse_cache import ParseCache
+from utils.workbook_snapshot import SnapshotBackend, WorkbookSnapshot, pack_cell, unpack_cell
+from utils.xlsx_reader import XlsxReader
+
+
+class CountingReader(XlsxReader):
+    """XlsxReader that counts how often a sheet is streamed."""
+
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+
+    def iter_cells(self, file_path, sheet_name):
+        self.reads += 1
+        return super().iter_cells(file_path, sheet_name)
+
+
+class TestWorkbookSnapshot:
+    """Test cases for the in-memory sheet snapshots."""
+
+    def test_pack_cell_round_trip(self):
+        """Test packing (row, column) into one integer key."""
+        assert unpack_cell(pack_cell(17, 4)) == (17, 4)
+        assert unpack_cell(pack_cell(1048576, 16384)) == (1048576, 16384)
+        assert pack_cell(1, 2) != pack_cell(2, 1)
+
+    def test_value_types_and_interned_formulas(self, tmp_path):
+        """Test that every value type survives the columnar storage and formulas are shared."""
+        snapshot = WorkbookSnapshot(tmp_path / "book.xlsx", ["Sheet1"])
+        sheet = snapshot.build_sheet("Sheet1", [
+            (1, 1, "=B1*2", 3.5),
+            (2, 1, "=B1*2", True),
+            (3, 1, None, "ALU BODEM"),
+            (4, 1, "=A9", None),
+        ])
+
+        assert sheet.get(1, 1) == ("=B1*2", 3.5)
+        assert sheet.get(2, 1) == ("=B1*2", True)
+        assert sheet.get(3, 1) == (None, "ALU BODEM")
+        assert sheet.get(4, 1) == ("=A9", None)
+        assert sheet.get(5, 1) == (None, None)
+        assert snapshot.formula_pool.formulas == ["=B1*2", "=A9"]
+
+    def test_sheet_is_read_once(self, xlsx_factory):
+        """Test that repeated lookups in a sheet are answered without re-reading the file."""
+        path = xlsx_factory("book.xlsx", {
+            "OVERZICHT": ['<c r="D19"><f>+C19*D17</f><v>12</v></c>', '<c r="C19"><v>4</v></c>'],
+        })
+        reader = CountingReader()
+        backend = SnapshotBackend(reader)
+
+        assert backend.get_cell_info(path, "OVERZICHT", "D19") == ("=+C19*D17", 12.0)
+        assert backend.get_cell_info(path, "OVERZICHT", "C19") == ("Cell has no formula in file", 4.0)
+        assert backend.get_cell_info(path, "OVERZICHT", "$C$19") == ("Cell has no formula in file", 4.0)
+        assert backend.get_cell_info(path, "Missing", "A1") == ("Sheet not found", None)
+        assert reader.reads == 1
+        backend.cleanup()
+
+    def test_snapshot_is_kept_while_its_sheet_is_built(self, xlsx_factory):
+        """Opening the wrapped reader's package while a sheet is built does not evict the snapshot being filled."""
+        path = xlsx_factory("book.xlsx", {"OVERZICHT": ['<c r="D19"><f>+C19*D17</f><v>12</v></c>', '<c r="C19"><v>4</v></c>']})
+        reader = CountingReader()
+        backend = SnapshotBackend(reader)
+        # Smaller than the xml package alone, so putting the package has to evict something
+        reader.cache = backend.cache = cache = WorkbookCache(memory_budget=5_000)
+
+        assert backend.get_cell_info(path, "OVERZICHT", "D19") == ("=+C19*D17", 12.0)
+        assert f"snapshot|{path}" in cache
+        assert f"xml|{path}" not in cache
+        assert backend.get_cell_info(path, "OVERZICHT", "C19") == ("Cell has no formula in file", 4.0)
+        assert reader.reads == 1
+        assert cache.memory_used == cache.entries[f"snapshot|{path}"].size
+        backend.cleanup()
+
+
+class TestParseCache:
+    """Test cases for the on-disk parse cache."""
+
+    def test_warm_run_does_not_read_workbook(self, xlsx_factory, tmp_path):
+        """Test that a second run is served from the cache without streaming the sheet."""
+        path = xlsx_factory("book.xlsx", {"OVERZICHT": ['<c r="D19"><f>+C19*D17</f><v>12</v></c>']})
+
+        cold = SnapshotBackend(CountingReader(), ParseCache(tmp_path / "cache"))
+        assert cold.get_cell_info(path, "OVERZICHT", "D19") == ("=+C19*D17", 12.0)
+        cold.cleanup()
+
+        reader = CountingReader()
+        warm = SnapshotBackend(reader, ParseCache(tmp_path / "cache"))
+        assert warm.get_cell_info(path, "OVERZICHT", "D19") == ("=+C19*D17", 12.0)
+        assert warm.get_sheet_names(path) == ["OVERZICHT"]
+        assert reader.reads == 0
+        assert warm.parse_cache.hits == 1
+        warm.cleanup()
+
+    def test_changed_workbook_invalidates_entry(self, xlsx_factory, tmp_path):
+        """Test that an entry is ignored once the workbook size or mtime changes."""
+        path = xlsx_factory("book.xlsx", {"OVERZICHT": ['<c r="D19"><f>+C19*D17</f><v>12</v></c>']})
+        cache = ParseCache(tmp_path / "cache")
+        backend = SnapshotBackend(XlsxReader(), cache)
+        backend.get_cell_info(path, "OVERZICHT", "D19")
+        backend.cleanup()
+
+        xlsx_factory("book.xlsx", {"OVERZICHT": ['<c r="D19"><f>+C19*D18</f><v>15</v></c>']})
+
+        assert cache.load(path) is None
+        backend = SnapshotBackend(XlsxReader(), cache)
+        assert backend.get_cell_info(path, "OVERZICHT", "D19") == ("=+C19*D18", 15.0)
+        backend.cleanup()
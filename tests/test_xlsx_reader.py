@@ -0,0 +1,91 @@
+from pathlib import Path
+from utils.xlsx_reader import XlsxReader, split_cell_ref, column_letter
+
+
+class TestXlsxReader:
+    """Test cases for the XlsxReader class."""
+
+    def setup_method(self):
+        """Set up test fixtures before each test method."""
+        self.reader = XlsxReader()
+
+    def teardown_method(self):
+        self.reader.cleanup()
+
+    def test_formula_and_cached_value(self, xlsx_factory):
+        """Test reading a formula together with its cached value."""
+        path = xlsx_factory("book.xlsx", {
+            "OVERZICHT CK213": ['<c r="D19"><f>+C19*D17</f><v>12.5</v></c>'],
+        })
+
+        formula, value = self.reader.get_cell_info(path, "OVERZICHT CK213", "D19")
+
+        assert formula == "=+C19*D17"
+        assert value == 12.5
+
+    def test_cell_without_formula(self, xlsx_factory):
+        """Test hardcoded values, shared strings and empty cells."""
+        path = xlsx_factory("book.xlsx", {
+            "Sheet1": ['<c r="A1"><v>2</v></c>', '<c r="B1" t="s"><v>0</v></c>'],
+        }, shared_strings=["ALU BODEM"])
+
+        assert self.reader.get_cell_info(path, "Sheet1", "A1") == ("Cell has no formula in file", 2.0)
+        assert self.reader.get_cell_info(path, "Sheet1", "B1") == ("Cell has no formula in file", "ALU BODEM")
+        assert self.reader.get_cell_info(path, "Sheet1", "C1") == ("Cell has no formula in file", None)
+
+    def test_sheet_is_streamed_once(self, xlsx_factory, monkeypatch):
+        """Looking up several cells of a sheet, one by one or in bulk, streams the sheet XML once."""
+        path = xlsx_factory("book.xlsx", {"Sheet1": ['<c r="A1"><v>2</v></c>', '<c r="B1"><f>A1*2</f><v>4</v></c>']})
+        streams = []
+        iter_cells = self.reader.iter_cells
+        monkeypatch.setattr(self.reader, "iter_cells", lambda *args: streams.append(args) or iter_cells(*args))
+
+        assert self.reader.get_cell_info(path, "Sheet1", "B1") == ("=A1*2", 4.0)
+        assert self.reader.get_cells(path, "Sheet1", ["A1", "C1"]) == {
+            "A1": ("Cell has no formula in file", 2.0),
+            "C1": ("Cell has no formula in file", None),
+        }
+        assert len(streams) == 1
+
+    def test_shared_formula_is_translated(self, xlsx_factory):
+        """Test that dragged (shared) formulas are re-anchored to each cell."""
+        path = xlsx_factory("book.xlsx", {
+            "Sheet1": [
+                '<c r="D17"><f t="shared" ref="D17:D19" si="0">C17*B17</f><v>1</v></c>',
+                '<c r="D18"><f t="shared" si="0"/><v>2</v></c>',
+                '<c r="D19"><f t="shared" si="0"/><v>3</v></c>',
+            ],
+        })
+
+        assert self.reader.get_cell_info(path, "Sheet1", "D18") == ("=C18*B18", 2.0)
+        assert self.reader.get_cell_info(path, "Sheet1", "D19") == ("=C19*B19", 3.0)
+
+    def test_external_links_are_resolved(self, xlsx_factory):
+        """Test that [n] external indexes are rewritten to the linked file name."""
+        path = xlsx_factory("book.xlsx", {
+            "Sheet1": [
+                "<c r=\"A1\"><f>[1]c.basis!$I$94*3</f><v>6</v></c>",
+                "<c r=\"A2\"><f>'[1]OVERZICHT COP'!Y20</f><v>6</v></c>",
+            ],
+        }, external_links=["https://example.com/BASISMATERIALEN/calculatie%20cat%202022.xlsx"])
+
+        formula, _ = self.reader.get_cell_info(path, "Sheet1", "A1")
+        assert formula == "='https://example.com/BASISMATERIALEN/[calculatie cat 2022.xlsx]c.basis'!$I$94*3"
+
+        formula, _ = self.reader.get_cell_info(path, "Sheet1", "A2")
+        assert formula == "='https://example.com/BASISMATERIALEN/[calculatie cat 2022.xlsx]OVERZICHT COP'!Y20"
+
+    def test_missing_file_and_sheet(self, xlsx_factory, tmp_path: Path):
+        """Test the error messages for missing files and sheets."""
+        path = xlsx_factory("book.xlsx", {"Sheet1": []})
+
+        assert self.reader.get_cell_info(tmp_path / "missing.xlsx", "Sheet1", "A1") == ("File not found", None)
+        assert self.reader.get_cell_info(path, "Other", "A1") == ("Sheet not found", None)
+        assert self.reader.get_sheet_names(path) == ["Sheet1"]
+
+    def test_cell_ref_helpers(self):
+        """Test conversion between A1 references and row/column numbers."""
+        assert split_cell_ref("D17") == (17, 4)
+        assert split_cell_ref("$AA$1") == (1, 27)
+        assert column_letter(27) == "AA"
+        assert column_letter(4) == "D"
@@ -1,59 +1,129 @@
-from sympy import expand, sympify  # type: ignore
-from typing import cast, Dict
-from sympy import Expr
-import re
+from typing import Dict, List, NamedTuple, Optional
+from .formula_tokenizer import BinaryOp, Call, FormulaAstBuilder, FormulaSyntaxError, Node, Number, Reference, Token, UnaryOp
+from .reference_extractor import RangeExpander, ReferenceExtractor
+
+
+class LinearForm(NamedTuple):
+    """constant + sum(coefficient * reference) for a formula that is linear in its references."""
+    constant: float
+    coefficients: Dict[str, float]
+
+
+class NonLinearFormula(Exception):
+    """Raised while evaluating a formula that is not linear in its references."""
+
 
 class AddQuantity:
+    """
+    Computes how many times each reference counts in a formula.
+
+    The formula tree is folded into a linear form, so 2*A1+A1/2 gives {A1: 2.5}.
+    Formulas that are not linear in their references (a product of two references,
+    a division by a reference, functions other than SUM, text) have no quantities.
+    A range counts once per used cell when it is an argument of SUM and its cells
+    are known (expand_range); anywhere else it makes the formula non-linear.
+    """
+
     def __init__(self):
-        # Dictionary to map variable names to their original identifiers
-        self.variable_map: Dict[str, str] = {}
-
-    #Example ckeabed formula: (2022-P1Berekeningopzetkast1323-KLEUR.xlsx_OVERZICHTCOZ1323_G31*2022-P1Berekeningopzetkast1323-KLEUR.xlsx_OVERZICHTCOZ1323_C33)+('calculatiecat2022.xlsx_c.basis_I59*3.5)
-    #Expected output: 
-    #   Reference_1*Reference_2+Reference_3*3.5
-    #   Dict 
-    #   {
-    #       Reference_1: 2022-P1Berekeningopzetkast1323-KLEUR.xlsx_OVERZICHTCOZ1323_G31
-    #       Reference_2: 2022-P1Berekeningopzetkast1323-KLEUR.xlsx_OVERZICHTCOZ1323_C33
-    #       Reference_3: calculatiecat2022.xlsx_c.basis_I59
-    #   }
-
-    def clean_formula(self, formula: str) -> str:
-        formula = formula.replace("'", "")
-        return formula
-
-    def convert_to_expr(self, formula: str) -> Expr:
-        # Updated pattern to match Excel file references with special characters
-
-        pattern = r"([\w\-\.]+)_([\w\-\.]+)_([\w\-\.]+)"
-        
-        # Function to replace each match with a formatted variable name
-        def replace_match(match: re.Match[str]) -> str:
-            # Create a safe variable name by replacing special characters
-            safe_name = f"ref_{len(self.variable_map)}"
-            # Store the mapping of safe name to original identifier
-            self.variable_map[safe_name] = match.group(0)
-            return safe_name
-
-        # Replace Excel-style references with safe variable names
-        processed_formula = re.sub(pattern, replace_match, formula)
-        
+        self.extractor = ReferenceExtractor()
+        self.builder = FormulaAstBuilder()
+
+    def quantities(self, cleaned_formula: str, parent_file: str, parent_sheet: str) -> Optional[Dict[str, float]]:
+        """
+        Returns the coefficient of each reference of a cleaned formula.
+
+        Args:
+            cleaned_formula (str): The cleaned formula
+            parent_file (str): The file containing the formula
+            parent_sheet (str): The sheet containing the formula
+
+        Returns:
+            Optional[Dict[str, float]]: Reference id -> coefficient, None if the formula is not linear
+        """
+        return self.quantities_from_tokens(self.extractor.tokenizer.tokenize(cleaned_formula), parent_file, parent_sheet)
+
+    def quantities_from_tokens(self, tokens: List[Token], parent_file: str, parent_sheet: str,
+                               expand_range: Optional[RangeExpander] = None) -> Optional[Dict[str, float]]:
+        """Returns the coefficient of each reference of an already tokenized formula, None if it is not linear."""
+        try:
+            tree = self.builder.parse(tokens)
+        except FormulaSyntaxError:
+            return None
+        return self.coefficients(tree, parent_file, parent_sheet, expand_range)
+
+    def coefficients(self, tree: Node, parent_file: str, parent_sheet: str, expand_range: Optional[RangeExpander] = None) -> Optional[Dict[str, float]]:
+        """Returns the coefficient of each reference of a parsed formula, None if it is not linear."""
         try:
-            # Convert the processed formula string to a SymPy expression
-            return cast(Expr, sympify(processed_formula))
-        except Exception as e:
-            raise ValueError(f"Failed to parse formula: {formula}. Error: {str(e)}")
+            return self.linear_form(tree, parent_file, parent_sheet, expand_range).coefficients
+        except (NonLinearFormula, ZeroDivisionError, OverflowError, TypeError):  # TypeError: complex power
+            return None
+
+    def linear_form(self, node: Node, parent_file: str, parent_sheet: str, expand_range: Optional[RangeExpander] = None) -> LinearForm:
+        """
+        Folds a formula tree into a linear form.
+
+        Raises:
+            NonLinearFormula: If the formula is not linear in its references
+        """
+        if isinstance(node, Number):
+            return LinearForm(node.value, {})
+
+        if isinstance(node, Reference):
+            ref_id = self.extractor.reference_id(node.token, parent_file, parent_sheet)
+            if ref_id is None or node.token.end is not None:
+                raise NonLinearFormula(node.token.text)
+            return LinearForm(0.0, {ref_id: 1.0})
 
-    def simpy_formula(self, formula: str) -> Expr:
-        # Expand the SymPy expression to simplify it
-        formula = self.clean_formula(formula)
-        expr = self.convert_to_expr(formula)
-        return cast(Expr, expand(expr))
+        if isinstance(node, UnaryOp):
+            operand = self.linear_form(node.operand, parent_file, parent_sheet, expand_range)
+            if node.op == "-":
+                return self._scale(operand, -1.0)
+            if node.op == "%":
+                return self._scale(operand, 0.01)
+            return operand
 
-    def get_original_identifier(self, variable_name: str) -> str:
-        # Retrieve the original identifier from the variable name
-        return self.variable_map.get(variable_name, "Unknown identifier")
+        if isinstance(node, BinaryOp):
+            left = self.linear_form(node.left, parent_file, parent_sheet, expand_range)
+            right = self.linear_form(node.right, parent_file, parent_sheet, expand_range)
+            if node.op == "+":
+                return self._add(left, right, 1.0)
+            if node.op == "-":
+                return self._add(left, right, -1.0)
+            if node.op == "*":
+                if not left.coefficients:
+                    return self._scale(right, left.constant)
+                if not right.coefficients:
+                    return self._scale(left, right.constant)
+            elif node.op == "/":
+                if not right.coefficients:
+                    return self._scale(left, 1.0 / right.constant)
+            elif node.op == "^":
+                if not left.coefficients and not right.coefficients:
+                    return LinearForm(float(left.constant ** right.constant), {})
+            raise NonLinearFormula(node.op)
 
+        if isinstance(node, Call) and node.name == "SUM":
+            total = LinearForm(0.0, {})
+            for arg in node.args:
+                if isinstance(arg, Reference) and arg.token.end is not None:
+                    members = self.extractor.range_cells(arg.token, parent_file, parent_sheet, expand_range)
+                    if members is None:
+                        raise NonLinearFormula(arg.token.text)
+                    form = LinearForm(0.0, {f"{file}_{sheet}_{cell}".replace(" ", ""): 1.0 for file, sheet, cell in members})
+                else:
+                    form = self.linear_form(arg, parent_file, parent_sheet, expand_range)
+                total = self._add(total, form, 1.0)
+            return total
 
+        raise NonLinearFormula(type(node).__name__)
 
+    @staticmethod
+    def _scale(form: LinearForm, factor: float) -> LinearForm:
+        return LinearForm(form.constant * factor, {ref_id: coefficient * factor for ref_id, coefficient in form.coefficients.items()})
 
+    @staticmethod
+    def _add(left: LinearForm, right: LinearForm, sign: float) -> LinearForm:
+        coefficients = dict(left.coefficients)
+        for ref_id, coefficient in right.coefficients.items():
+            coefficients[ref_id] = coefficients.get(ref_id, 0.0) + sign * coefficient
+        return LinearForm(left.constant + sign * right.constant, coefficients)
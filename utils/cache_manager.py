@@ -0,0 +1,195 @@
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+DEFAULT_MEMORY_BUDGET = 2 * 1024 ** 3  # 2 GB
+DEFAULT_SIZE_FACTOR = 10  # An open workbook takes roughly ten times its xlsx size in memory
+
+
+class _CacheEntry:
+    __slots__ = ("value", "size", "close", "pinned", "frequency", "last_access", "holds")
+
+    def __init__(self, value: Any, size: int, close: Optional[Callable[[Any], None]], pinned: bool, tick: int):
+        self.value = value
+        self.size = size
+        self.close = close
+        self.pinned = pinned
+        self.frequency = 1
+        self.last_access = tick
+        self.holds = 0  # Open hold() blocks: the entry is being filled and must not be evicted
+
+
+class WorkbookCache:
+    """
+    Memory-bounded cache of open workbooks shared by every reader (COM, openpyxl, xml, snapshots).
+
+    Eviction is frequency-aware (LFU, least recently used among equals), so a
+    workbook touched by every product, like the base-material catalogue, stays
+    open while one-off product workbooks are closed. Pinned files are never
+    evicted, nor are entries inside a hold() block. Evicted workbooks are closed through the callback given to put().
+    All methods are thread-safe, so background prefetch threads can fill it.
+    """
+
+    def __init__(self, memory_budget: int = DEFAULT_MEMORY_BUDGET, size_factor: int = DEFAULT_SIZE_FACTOR, pinned_files: Iterable[str] = ()):
+        self.entries: Dict[str, _CacheEntry] = {}
+        self.lock = threading.RLock()
+        self.logger = logging.getLogger("excel_processor")
+        self._tick = 0
+        self.memory_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.configure(memory_budget, size_factor, pinned_files)
+
+    def configure(self, memory_budget: int, size_factor: int = DEFAULT_SIZE_FACTOR, pinned_files: Iterable[str] = ()) -> None:
+        """
+        Sets the memory budget and the files that must never be evicted.
+
+        Args:
+            memory_budget (int): Budget in bytes for all cached workbooks together
+            size_factor (int): Estimated in-memory size of a workbook as a multiple of its file size
+            pinned_files (Iterable[str]): File names (spaces ignored) that are never evicted
+        """
+        with self.lock:
+            self.memory_budget = memory_budget
+            self.size_factor = size_factor
+            self.pinned_files = {self._normalize(name) for name in pinned_files}
+            self._evict()
+
+    @staticmethod
+    def _normalize(file_name: str) -> str:
+        return file_name.replace(" ", "").lower()
+
+    def estimate_size(self, file_path: Path) -> int:
+        """Estimates the memory taken by an open workbook from its size on disk."""
+        try:
+            return os.path.getsize(file_path) * self.size_factor
+        except OSError:
+            return 0
+
+    def get(self, key: str) -> Any:
+        """Returns the cached value for key, or None."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._tick += 1
+            entry.frequency += 1
+            entry.last_access = self._tick
+            return entry.value
+
+    def peek(self, key: str) -> Any:
+        """Returns the cached value for key without counting it as a use."""
+        with self.lock:
+            entry = self.entries.get(key)
+            return entry.value if entry is not None else None
+
+    def put(self, key: str, value: Any, file_path: Path, size: Optional[int] = None, close: Optional[Callable[[Any], None]] = None) -> None:
+        """
+        Adds (or replaces) a cached workbook and evicts others if the budget is exceeded.
+
+        A replaced workbook is closed through its own callback, unless it is the same object.
+
+        Args:
+            key (str): Cache key, prefixed by the reader that owns the entry
+            value (Any): The open workbook
+            file_path (Path): The workbook's file, used for pinning and size estimation
+            size (Optional[int]): Memory taken by the value, estimated from the file size if omitted
+            close (Optional[Callable[[Any], None]]): Called with the value when it is evicted
+        """
+        with self.lock:
+            self._tick += 1
+            previous = self.entries.get(key)
+            entry = _CacheEntry(value, size if size is not None else self.estimate_size(file_path), close,
+                                self._normalize(file_path.name) in self.pinned_files, self._tick)
+            if previous is not None:
+                entry.frequency = previous.frequency
+                self.memory_used -= previous.size
+                if previous.value is not value:
+                    self._close(key, previous)
+            self.entries[key] = entry
+            self.memory_used += entry.size
+            self._evict(keep=key)
+
+    @contextmanager
+    def hold(self, key: str) -> Iterator[None]:
+        """Keeps an entry from being evicted inside the with block, e.g. while a sheet is added to it."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                entry.holds += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                if entry is not None:
+                    entry.holds -= 1
+                self._evict()
+
+    def resize(self, key: str, size: int) -> None:
+        """Updates the size of an entry that grew after it was added."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.memory_used += size - entry.size
+                entry.size = size
+                self._evict(keep=key)
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        """Closes least frequently used workbooks until the cache fits its budget."""
+        while self.memory_used > self.memory_budget:
+            candidates = [(entry.frequency, entry.last_access, key) for key, entry in self.entries.items() if not entry.pinned and not entry.holds and key != keep]
+            if not candidates:
+                return
+            _, _, key = min(candidates)
+            self.logger.debug(f"Evicting workbook from cache: {key}")
+            self.evictions += 1
+            self.pop(key)
+
+    def pop(self, key: str) -> None:
+        """Removes an entry and closes its workbook."""
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                return
+            self.memory_used -= entry.size
+            self._close(key, entry)
+
+    def _close(self, key: str, entry: _CacheEntry) -> None:
+        if entry.close is not None:
+            try:
+                entry.close(entry.value)
+            except Exception as e:
+                self.logger.warning(f"Error closing cached workbook {key}: {str(e)}")
+
+    def clear(self, prefix: str = "") -> None:
+        """Closes and removes every entry whose key starts with prefix."""
+        with self.lock:
+            for key in [key for key in self.entries if key.startswith(prefix)]:
+                self.pop(key)
+
+    def keys(self, prefix: str = "") -> Iterable[str]:
+        with self.lock:
+            return [key for key in self.entries if key.startswith(prefix)]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries
+
+    def stats(self) -> Dict[str, int]:
+        """Returns hit, miss and eviction counters and the current memory use."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "memory_used": self.memory_used,
+        }
+
+
+# Single cache instance shared by all readers, configured from main.py
+workbook_cache = WorkbookCache()
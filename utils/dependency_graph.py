@@ -0,0 +1,298 @@
+from collections import defaultdict
+from logging import Logger
+from typing import Any, DefaultDict, Dict, List, NamedTuple, Optional, Set
+from schema.cell_node import FLAG_ELEMENT, CellNode
+
+# Attributes that depend on how a cell was reached rather than on its content (id and isProduct derive from them)
+OVERLAY_FIELDS = ('file', 'sheet', 'cell', 'path', 'product_id')
+
+CIRCULAR_ERROR = "Circular Error: Circular reference detected"
+MAX_DEPTH_ERROR = "Max Recursion Depth Error: Max recursion depth reached"
+
+
+def cell_key(file: str, sheet: str, cell: str) -> str:
+    """Normalized, product-independent key of a cell (spaces and case ignored, like Excel)."""
+    return f"{file.replace(' ', '').casefold()}|{sheet.replace(' ', '').casefold()}|{cell.replace('$', '').upper()}"
+
+
+def overlay(resolved: CellNode, result: CellNode) -> CellNode:
+    """Reuses a resolved cell for another path to it, keeping the caller's id and product tag."""
+    if all(getattr(resolved, field) == getattr(result, field) for field in OVERLAY_FIELDS):
+        return resolved
+    overlaid = resolved.copy()
+    for field in OVERLAY_FIELDS:
+        setattr(overlaid, field, getattr(result, field))
+    return overlaid
+
+
+class Edge(NamedTuple):
+    key: str                # cell_key of the referenced cell
+    result: CellNode        # The referenced cell: its shared node, or a copy when reached with another overlay (product tag...)
+    follow: bool            # True if the referenced cell is a node whose own references are resolved
+
+
+class _Frame:
+    """A cycle member whose references are being resolved."""
+    __slots__ = ("key", "edge", "index", "resolved")
+
+    def __init__(self, key: str, edge: Optional[Edge]):
+        self.key = key
+        self.edge = edge
+        self.index = 0
+        self.resolved: List[CellNode] = []
+
+
+class DependencyGraph:
+    """
+    Directed graph of every cell reachable from a set of root cells.
+
+    Nodes are the cells whose references are followed (keyed by cell_key), edges
+    come from their parsed references, in formula order. The graph is built
+    breadth first, then resolved children first along the strongly connected
+    components found by Tarjan's algorithm, so each cell is resolved once
+    however many roots reach it. Components with more than one cell (or a cell
+    referring to itself) are circular references.
+    """
+
+    def __init__(self, extractor: Any, logger: Logger, resolved: Optional[Dict[str, CellNode]] = None, max_depth: Optional[int] = None):
+        """
+        Args:
+            extractor (Any): CellInfoExtractor used to read the cells (prepare_cell_info)
+            logger (Logger): Logger
+            resolved (Optional[Dict[str, CellNode]]): Cells resolved earlier, reused and extended
+            max_depth (Optional[int]): Cells this many references away from every root are not followed
+        """
+        self.extractor = extractor
+        self.logger = logger
+        self.resolved: Dict[str, CellNode] = resolved if resolved is not None else {}
+        self.max_depth = max_depth
+        self.nodes: Dict[str, CellNode] = {}
+        self.edges: Dict[str, List[Edge]] = {}
+        self.parents: DefaultDict[str, List[str]] = defaultdict(list)  # cell_key -> nodes referring to it
+        self.roots: List[Edge] = []
+        self._frontier: List[str] = []
+        self._depth = 0
+
+    @staticmethod
+    def _is_base_case(result: CellNode) -> bool:
+        """Determines if a cell has nothing to resolve."""
+        return bool(
+            result.has_flag(FLAG_ELEMENT) or
+            isinstance(result.value, (int, float, str)) and
+            not result.formula
+        )
+
+    @staticmethod
+    def _validate_reference(ref: CellNode) -> bool:
+        """Validates if a reference contains all required fields."""
+        return ref.file is not None and ref.sheet is not None and ref.cell is not None
+
+    def _add(self, result: CellNode, follow: bool, frontier: List[str]) -> Edge:
+        """Registers a visited cell, queueing it for expansion when it becomes a new node."""
+        key = cell_key(result.file, result.sheet, result.cell)
+        if follow and self._is_base_case(result):
+            follow = False
+        if follow and key not in self.nodes and key not in self.resolved:
+            if self.max_depth is not None and self._depth >= self.max_depth:
+                self.logger.warning(f"Max recursion depth {self.max_depth} reached for {result.id}")
+                result = result.copy()  # The node may be shared with visits that are within the depth limit
+                result.error = MAX_DEPTH_ERROR
+                follow = False
+            else:
+                self.nodes[key] = result
+                frontier.append(key)
+        return Edge(key, result, follow)
+
+    def add_root(self, result: CellNode, follow: bool) -> None:
+        """
+        Adds a root cell.
+
+        Args:
+            result (CellNode): The root as returned by prepare_cell_info
+            follow (bool): Whether its references must be resolved
+        """
+        self.roots.append(self._add(result, follow, self._frontier))
+
+    def build(self) -> None:
+        """
+        Reads every cell reachable from the roots, one reference level at a time.
+
+        All references of a level, across every root, are fetched together (grouped by
+        workbook and sheet) before the level is expanded, so workbooks are visited once
+        per level rather than once per cell.
+        """
+        while self._frontier:
+            frontier, self._frontier = self._frontier, []
+            self._depth += 1
+            self.extractor.prefetch_cells(
+                (ref.file, ref.sheet, ref.cell)
+                for key in frontier
+                for ref in self.nodes[key].references
+                if self._validate_reference(ref)
+            )
+            for key in frontier:
+                self._expand(key, self._frontier)
+
+    def _expand(self, key: str, frontier: List[str]) -> None:
+        """Reads the references of one node and records its edges."""
+        children: List[Edge] = []
+        for ref in self.nodes[key].references:
+            if not self._validate_reference(ref):
+                continue
+            result, follow = self.extractor.prepare_cell_info(ref.file, ref.sheet, ref.cell)
+            edge = self._add(result, follow, frontier)
+            children.append(edge)
+            self.parents[edge.key].append(key)
+        self.edges[key] = children
+
+    def _node_children(self, key: str) -> List[str]:
+        """Keys of the unresolved nodes a node refers to."""
+        return [edge.key for edge in self.edges.get(key, []) if edge.follow and edge.key in self.nodes]
+
+    def strongly_connected_components(self) -> List[List[str]]:
+        """
+        Finds the strongly connected components with an iterative Tarjan walk from the roots.
+
+        Returns:
+            List[List[str]]: Components in reverse topological order (a component comes after
+            every component it refers to); cells of a component in visiting order
+        """
+        index: Dict[str, int] = {}
+        low: Dict[str, int] = {}
+        stack: List[str] = []
+        on_stack: Set[str] = set()
+        components: List[List[str]] = []
+
+        for root in self.roots:
+            if not root.follow or root.key not in self.nodes or root.key in index:
+                continue
+            index[root.key] = low[root.key] = len(index)
+            stack.append(root.key)
+            on_stack.add(root.key)
+            work = [(root.key, self._node_children(root.key), 0)]
+            while work:
+                key, children, position = work[-1]
+                if position < len(children):
+                    work[-1] = (key, children, position + 1)
+                    child = children[position]
+                    if child not in index:
+                        index[child] = low[child] = len(index)
+                        stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, self._node_children(child), 0))
+                    elif child in on_stack:
+                        low[key] = min(low[key], index[child])
+                    continue
+
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[key])
+                if low[key] == index[key]:
+                    component: List[str] = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == key:
+                            break
+                    components.append(sorted(component, key=index.__getitem__))
+        return components
+
+    def _is_cycle(self, component: List[str]) -> bool:
+        return len(component) > 1 or component[0] in self._node_children(component[0])
+
+    def cycles(self) -> List[List[str]]:
+        """Returns the groups of cells that refer to each other in a circle."""
+        return [component for component in self.strongly_connected_components() if self._is_cycle(component)]
+
+    def topological_order(self) -> List[str]:
+        """Returns the node keys with every cell after the cells it refers to (cycles kept together)."""
+        return [key for component in self.strongly_connected_components() for key in component]
+
+    def _reference(self, edge: Edge) -> CellNode:
+        """The resolved result for one reference."""
+        if edge.follow:
+            resolved = self.resolved.get(edge.key)
+            if resolved is not None:
+                return overlay(resolved, edge.result)
+        return edge.result
+
+    def resolve(self) -> List[CellNode]:
+        """
+        Builds the remaining graph and resolves every node, children first.
+
+        Returns:
+            List[CellNode]: The resolved roots, in the order they were added
+        """
+        self.build()
+        for component in self.strongly_connected_components():
+            if self._is_cycle(component):
+                self._resolve_cycle(component)
+            else:
+                key = component[0]
+                node = self.nodes[key]
+                node.references = tuple(self._reference(edge) for edge in self.edges.get(key, []))
+                self.resolved[key] = node
+        return [self._reference(root) for root in self.roots]
+
+    def _resolve_cycle(self, component: List[str]) -> None:
+        """
+        Resolves the cells of a circular reference.
+
+        The cycle is always walked from the same cell (the smallest key), whichever root
+        reached it, so the result does not depend on the other roots of the batch. A
+        reference back to a cell still being resolved ends the walk there and carries
+        the circular error.
+        """
+        members = set(component)
+        entry = min(component)
+        chain = {entry}
+        work = [_Frame(entry, None)]
+        while work:
+            frame = work[-1]
+            children = self.edges.get(frame.key, [])
+            if frame.index < len(children):
+                edge = children[frame.index]
+                frame.index += 1
+                if not edge.follow or edge.key not in members or edge.key in self.resolved:
+                    frame.resolved.append(self._reference(edge))
+                elif edge.key in chain:
+                    self.logger.error(f"Circular reference detected: {edge.key}")
+                    circular = edge.result.copy()
+                    circular.error = CIRCULAR_ERROR
+                    frame.resolved.append(circular)
+                else:
+                    chain.add(edge.key)
+                    work.append(_Frame(edge.key, edge))
+                continue
+
+            work.pop()
+            chain.discard(frame.key)
+            node = self.nodes[frame.key]
+            node.references = tuple(frame.resolved)
+            self.resolved[frame.key] = node
+            if work:
+                work[-1].resolved.append(overlay(node, frame.edge.result) if frame.edge is not None else node)
+
+    def dependencies(self, key: str) -> Set[str]:
+        """Returns every cell a cell depends on, directly or not."""
+        seen: Set[str] = set()
+        pending = [key]
+        while pending:
+            for edge in self.edges.get(pending.pop(), []):
+                if edge.key not in seen:
+                    seen.add(edge.key)
+                    pending.append(edge.key)
+        return seen
+
+    def dependents(self, key: str) -> Set[str]:
+        """Returns every cell whose value depends on a cell (impact of changing it)."""
+        seen: Set[str] = set()
+        pending = [key]
+        while pending:
+            for parent in self.parents.get(pending.pop(), []):
+                if parent not in seen:
+                    seen.add(parent)
+                    pending.append(parent)
+        return seen
@@ -1,13 +1,18 @@
 import json
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
 from pathlib import Path
-import pythoncom
-import win32com.client
 from utils.logging_utils import setup_logger
+from utils.xlsx_reader import split_cell_ref
 from openpyxl import load_workbook
-from collections import OrderedDict
+from utils.cache_manager import WorkbookCache, workbook_cache
 from openpyxl.workbook.workbook import Workbook
-from win32com.client import CDispatch  # For Excel workbook type
+try:
+    import pythoncom
+    import win32com.client
+    from win32com.client import CDispatch  # For Excel workbook type
+except ImportError:
+    # Not on Windows: ExcelHelper is unavailable, use XlsxReader instead
+    CDispatch = Any
 
 def save_to_log(result: Dict[str, Any], log_path: str) -> None:
     """
@@ -37,19 +42,74 @@ class ExcelHelper:
         self.excel.DisplayAlerts = False
         self.excel.AskToUpdateLinks = False
         self.excel.AlertBeforeOverwriting = False
-        self.cache: Dict[str, CDispatch] = {}  # Cache of Excel workbooks
+        self.cache = workbook_cache  # Shared, memory-bounded cache of open workbooks
         self.logger = setup_logger()  # Initialize the logger
 
+    def open(self, file_path: Path) -> CDispatch:
+        """Get cached Excel workbook or open it."""
+        key = f"com|{file_path}"
+        wb = self.cache.get(key)
+        if wb is None:
+            if not file_path.exists():
+                raise FileNotFoundError(file_path)
+            wb = self.excel.Workbooks.Open(str(file_path))
+            self.cache.put(key, wb, file_path, close=lambda wb: wb.Close(False))
+        return wb
+
+    def get_sheet_names(self, file_path: Path) -> List[str]:
+        """Returns the worksheet names of a workbook in tab order."""
+        return [sheet.Name for sheet in self.open(file_path).Worksheets]
+
+    def get_cells(self, file_path: Path, sheet_name: str, cell_refs: Iterable[str]) -> Dict[str, Tuple[str, Any]]:
+        """
+        Extracts formula and value for several cells of the same sheet.
+
+        The used range is read once (iter_cells: two bulk COM calls) and the requested
+        cells are picked from it, instead of two COM calls per cell. A missing file or
+        sheet, or a reference that cannot be split, is answered by get_cell_info.
+        """
+        cell_refs = list(cell_refs)
+        try:
+            used = {(row, col): (formula, value) for row, col, formula, value in self.iter_cells(file_path, sheet_name)}
+        except Exception:
+            return {cell_ref: self.get_cell_info(file_path, sheet_name, cell_ref) for cell_ref in cell_refs}
+
+        cells: Dict[str, Tuple[str, Any]] = {}
+        for cell_ref in cell_refs:
+            try:
+                formula, value = used.get(split_cell_ref(cell_ref), (None, None))
+            except ValueError:
+                cells[cell_ref] = self.get_cell_info(file_path, sheet_name, cell_ref)
+                continue
+            if formula is None:
+                self.logger.warning(f"Cell has no formula: {cell_ref} in {sheet_name}")
+                cells[cell_ref] = "Cell has no formula in file", value
+            else:
+                cells[cell_ref] = formula, value
+        return cells
+
+    def iter_cells(self, file_path: Path, sheet_name: str) -> Iterator[Tuple[int, int, Optional[str], Any]]:
+        """Yields (row, column, formula, value) for the used range with two bulk COM calls."""
+        used_range = self.open(file_path).Sheets(sheet_name).UsedRange
+        formulas, values = used_range.Formula, used_range.Value
+        # Read once: every attribute access is a cross-process COM call
+        first_row, first_col = used_range.Row, used_range.Column
+        if not isinstance(formulas, tuple):  # A single-cell range returns scalars
+            formulas, values = ((formulas,),), ((values,),)
+        for i, (formula_row, value_row) in enumerate(zip(formulas, values)):
+            for j, (formula, value) in enumerate(zip(formula_row, value_row)):
+                has_formula = isinstance(formula, str) and formula.startswith("=")
+                if has_formula or value is not None:
+                    yield first_row + i, first_col + j, formula if has_formula else None, value
+
     def get_cell_info(self, file_path: Path, sheet_name: str, cell_ref: str) -> Tuple[str, Any]:
         """Extracts formula and value from a specific cell."""
         try:
-            wb = self.cache.get(str(file_path))
-            if wb is None:
-                if not file_path.exists():
-                    self.logger.warning(f"File not found: {file_path}")
-                    return "File not found", None  # Return directly for file not found
-                wb = self.excel.Workbooks.Open(str(file_path))
-                self.cache[str(file_path)] = wb
+            try:
+                wb = self.open(file_path)
+            except FileNotFoundError:
+                self.logger.warning(f"File not found: {file_path}")
+                return "File not found", None  # Return directly for file not found
             
             sheet = wb.Sheets(sheet_name)
             if sheet is None:
@@ -74,37 +134,66 @@ class ExcelHelper:
 
     def cleanup(self):
         """Clean up Excel resources."""
-        for wb in self.cache.values():
-            wb.Close(False)
+        self.cache.clear("com|")
         self.excel.Quit()
         pythoncom.CoUninitialize()
 
 class ExcelUtils:
-    """Add LRU workbook caching with max size"""
-    _WORKBOOK_CACHE: OrderedDict[str, Workbook] = OrderedDict()
-    MAX_CACHE_SIZE = 20  # Adjust based on available memory
+    """Openpyxl workbook caching through the shared memory-bounded workbook cache"""
+    _WORKBOOK_CACHE: WorkbookCache = workbook_cache
+    # Materialized read-only sheets: workbook key -> sheet name -> (row, col) -> value
+    _SHEET_CACHE: Dict[str, Dict[str, Dict[Tuple[int, int], Any]]] = {}
 
     @classmethod
-    def get_workbook(cls, file_path: Path) -> Workbook:
+    def _close_workbook(cls, key: str, wb: Workbook) -> None:
+        """Release the file handle of an evicted read-only workbook and its sheet tables."""
+        wb.close()
+        cls._SHEET_CACHE.pop(key, None)
+
+    @classmethod
+    def get_workbook(cls, file_path: Path, data_only: bool = True) -> Workbook:
         """Get cached workbook or load new one"""
-        key = str(file_path)
+        key = f"{file_path}|{data_only}"
         
         # Get from cache if exists
-        if key in cls._WORKBOOK_CACHE:
-            cls._WORKBOOK_CACHE.move_to_end(key)
-            return cls._WORKBOOK_CACHE[key]
+        wb = cls._WORKBOOK_CACHE.get(f"openpyxl|{key}")
+        if wb is not None:
+            return wb
         
         # Load new workbook with optimizations
         wb = load_workbook(
             filename=file_path,
             read_only=True,  # Dramatically faster loading
-            data_only=True,  # Only needed for values
-            keep_links=False  # Reduce external link loading
+            data_only=data_only,  # Cached values, or formulas when False
+            keep_links=not data_only  # Links are only needed to name external files in formulas
         )
         
-        # Manage cache size
-        if len(cls._WORKBOOK_CACHE) >= cls.MAX_CACHE_SIZE:
-            cls._WORKBOOK_CACHE.popitem(last=False)
-            
-        cls._WORKBOOK_CACHE[key] = wb
-        return wb 
\ No newline at end of file
+        # The cache closes the workbook when it gets evicted
+        cls._WORKBOOK_CACHE.put(f"openpyxl|{key}", wb, file_path, close=lambda wb: cls._close_workbook(key, wb))
+        return wb
+
+    @classmethod
+    def get_sheet_table(cls, file_path: Path, sheet_name: str, data_only: bool = True) -> Dict[Tuple[int, int], Any]:
+        """
+        Get a worksheet materialized into a (row, col) -> value lookup table.
+
+        In read-only mode openpyxl re-scans the sheet XML from the top for every
+        ws[cell_ref], so the sheet is read once here and later lookups are O(1).
+        """
+        key = f"{file_path}|{data_only}"
+        wb = cls.get_workbook(file_path, data_only)
+        sheets = cls._SHEET_CACHE.setdefault(key, {})
+        table = sheets.get(sheet_name)
+        if table is None:
+            table = {}
+            for row, values in enumerate(wb[sheet_name].iter_rows(min_row=1, min_col=1, values_only=True), 1):
+                for col, value in enumerate(values, 1):
+                    if value is not None:
+                        table[(row, col)] = value
+            sheets[sheet_name] = table
+        return table
+
+    @classmethod
+    def get_cell_value(cls, file_path: Path, sheet_name: str, cell_ref: str, data_only: bool = True) -> Any:
+        """Get the value (or formula when data_only is False) of one cell from the sheet table."""
+        return cls.get_sheet_table(file_path, sheet_name, data_only).get(split_cell_ref(cell_ref)) 
\ No newline at end of file
@@ -1,4 +1,5 @@
 import re
+from typing import Dict, Iterable, List
 
 class FormulaCleaner:
     """Handles cleaning of Excel formulas."""
@@ -17,6 +18,18 @@ class FormulaCleaner:
         "9 -2022- COMFORTLINE - MASSIEF KADER-FINEER  + CORPUS KLEUR",
         "10 -2022- COMFORTLINE - DIK FINEER EN HOOGGLANS  + CORPUS KLEUR"
     ]
+
+    # Base URLs of the shared workbook folders
+    BASE_URLS = [
+        "https://mordrel-my.sharepoint.com/Kovera/BASISMATERIALEN/",
+        "https://mordrel-my.sharepoint.com/personal/matthieu_mordrel_pro/Documents/Work/Projects/Kovera/Project 2/BASISMATERIALEN/",
+        "\\\\LS420D340\\Zaak\\Kovera\\BASISMATERIALEN\\"
+    ]
+
+    # Every base URL and folder prefix in one alternation, longest first so a prefix never shadows a longer one
+    PREFIX_PATTERN = re.compile("|".join(
+        re.escape(prefix) for prefix in sorted(BASE_URLS + [f"{folder}/" for folder in FOLDERS], key=len, reverse=True)
+    ))
     
     @staticmethod
     def clean_formula(formula: str) -> str:
@@ -35,21 +48,43 @@ class FormulaCleaner:
         # Remove $ signs, single quotes, and handle "=+" pattern
         cleaned_formula = formula.replace('$', '').replace("=+", "").replace("=", "")
         
-        # Remove the base URL
-        base_urls = [
-            "https://mordrel-my.sharepoint.com/Kovera/BASISMATERIALEN/",
-            "https://mordrel-my.sharepoint.com/personal/matthieu_mordrel_pro/Documents/Work/Projects/Kovera/Project 2/BASISMATERIALEN/",
-            "\\\\LS420D340\\Zaak\\Kovera\\BASISMATERIALEN\\"
-        ]
-        for base_url in base_urls:
-            cleaned_formula = cleaned_formula.replace(base_url, "")
-
-        
-        # Remove known folders
-        for folder in FormulaCleaner.FOLDERS:
-            cleaned_formula = cleaned_formula.replace(f"{folder}/", "")
+        # Remove the base URLs and known folders in a single pass
+        cleaned_formula = FormulaCleaner.PREFIX_PATTERN.sub("", cleaned_formula)
         
         # Remove spaces not within single quotes
-        cleaned_formula = re.sub(r"(?:'[^']*')|\s+", lambda m: m.group(0) if m.group(0).startswith("'") else '', cleaned_formula)
-        
-        return cleaned_formula 
\ No newline at end of file
+        return FormulaCleaner._strip_spaces(cleaned_formula)
+
+    @staticmethod
+    def _strip_spaces(formula: str) -> str:
+        """Removes whitespace outside single-quoted sheet names in one scan."""
+        if "'" not in formula:
+            return "".join(formula.split())
+        parts = formula.split("'")
+        # Even parts are outside quotes; a trailing unmatched quote does not open a quoted part
+        quoted_end = len(parts) - 1 if len(parts) % 2 == 1 else len(parts) - 2
+        return "'".join(
+            part if index % 2 == 1 and index < quoted_end else "".join(part.split())
+            for index, part in enumerate(parts)
+        )
+
+    @staticmethod
+    def clean_many(formulas: Iterable[str]) -> List[str]:
+        """
+        Cleans a batch of formulas, such as all formulas of a sheet snapshot.
+
+        Identical formulas are cleaned once.
+
+        Args:
+            formulas (Iterable[str]): The raw Excel formulas
+
+        Returns:
+            List[str]: The cleaned formulas, in the same order
+        """
+        cleaned: Dict[str, str] = {}
+        results: List[str] = []
+        for formula in formulas:
+            result = cleaned.get(formula)
+            if result is None:
+                result = cleaned[formula] = FormulaCleaner.clean_formula(formula)
+            results.append(result)
+        return results
@@ -1,5 +1,8 @@
-from .reference_extractor import ReferenceExtractor
+from typing import Dict, List, Optional, Tuple
+from .reference_extractor import RangeExpander, ReferenceExtractor
 from .element_detector import ElementDetector
+from .formula_template import FormulaTemplate, formula_template
+from .formula_tokenizer import SheetNameTrie, Token
 from schema.schema import FormulaInfo
 from .add_quantity import AddQuantity
 
@@ -10,8 +13,15 @@ class FormulaParser:
         self.extractor = ReferenceExtractor()
         self.detector = ElementDetector()
         self.add_quantity = AddQuantity()
+        # Parse results keyed by their relative R1C1 template, shared by all copies of a formula in a
+        # sheet (and by the unusual sheet names they were tokenized with, usually none); None when
+        # the formula cannot be re-anchored
+        self.templates: Dict[Tuple[str, Tuple[str, ...], str, str], Optional[FormulaTemplate]] = {}
+        self.template_hits = 0
+        self.template_misses = 0
     
-    def parse_formula(self, cleaned_formula: str, parent_file: str, parent_sheet: str) -> FormulaInfo:
+    def parse_formula(self, cleaned_formula: str, parent_file: str, parent_sheet: str, cell_ref: Optional[str] = None,
+                      sheet_names: Optional[SheetNameTrie] = None, expand_range: Optional[RangeExpander] = None) -> FormulaInfo:
         """
         Parses a cleaned Excel formula to extract references and determine if it's an element.
         
@@ -19,6 +29,12 @@ class FormulaParser:
             cleaned_formula (str): The cleaned Excel formula to parse
             parent_file (str): The file containing the formula
             parent_sheet (str): The sheet containing the formula
+            cell_ref (Optional[str]): The cell containing the formula; enables the template cache, which
+                answers copies of an already parsed formula without parsing them again
+            sheet_names (Optional[SheetNameTrie]): Sheet names of parent_file, to read unquoted references
+                to sheets such as KOLOM+BL (defaults to the tokenizer's OPERATOR_SHEET_NAMES)
+            expand_range (Optional[RangeExpander]): Lists the used cells of a range; without it a
+                range only refers to its first cell and has no quantities
             
         Returns:
             FormulaInfo: Information about the formula
@@ -31,23 +47,46 @@ class FormulaParser:
                 "isProduct": False,
                 "updated_formula": None,
                 # "expanded_formula": None,
+                "template": None,
+                "quantities": None,
                 "references": []
             })
         
+        if sheet_names is None:
+            sheet_names = self.extractor.tokenizer.default_sheet_names
+        template = formula_template(cleaned_formula, cell_ref) if cell_ref else None
+        key = (template, sheet_names.names, parent_file, parent_sheet)
+        if template is not None:
+            cached = self.templates.get(key)
+            info = cached.anchor(cell_ref, template) if cached is not None else None
+            if info is not None:
+                self.template_hits += 1
+                return info
+            self.template_misses += 1
+
+        tokens = self.extractor.tokenizer.tokenize(cleaned_formula, sheet_names)
+        info = self._parse_tokens(tokens, parent_file, parent_sheet, template, expand_range)
+        if template is not None and key not in self.templates:
+            # Ranges expanded against the sheet's cells do not move with the formula: those formulas are always parsed
+            expanded = expand_range is not None and bool(self.extractor.summed_ranges(tokens))
+            self.templates[key] = None if expanded else FormulaTemplate.from_parse(tokens, info, template, cell_ref, parent_file, parent_sheet)
+        return info
+
+    def _parse_tokens(self, tokens: List[Token], parent_file: str, parent_sheet: str, template: Optional[str],
+                      expand_range: Optional[RangeExpander]) -> FormulaInfo:
+        """Extracts references, element flags and quantities from a tokenized formula."""
         # Extract references from the cleaned formula
-        references, updated_formula = self.extractor.extract_references(cleaned_formula, parent_file, parent_sheet)
+        references, updated_formula = self.extractor.extract_references_from_tokens(tokens, parent_file, parent_sheet, expand_range)
         # print("Updated formula: ", updated_formula)
         
         # Determine if it's an element
         is_element = self.detector.is_element(references)
 
-        # Add the quantity to the references
-        # expanded_formula = self.add_quantity.simpy_formula(updated_formula)
-        #Convert the expanded formula to a string because json cannot serialize a sympy expression
-        # expanded_formula = str(expanded_formula)
+        # Coefficient of each reference, None when the formula is not linear in its references
+        quantities = self.add_quantity.quantities_from_tokens(tokens, parent_file, parent_sheet, expand_range)
 
         # Count H-references
-        h_reference_count = len([ref for ref in references if ref["cell"].startswith('H')])
+        h_reference_count = len([ref for ref in references if ref.cell.startswith('H')])
 
         return FormulaInfo({
             "isElement": is_element,
@@ -56,5 +95,7 @@ class FormulaParser:
             "isProduct": False,
             "updated_formula": updated_formula,
             # "expanded_formula": expanded_formula,
+            "template": template,
+            "quantities": quantities,
             "references": references
-        })
\ No newline at end of file
+        })
@@ -0,0 +1,177 @@
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+from schema.cell_node import CellNode
+from schema.schema import FormulaInfo
+from .element_detector import ElementDetector
+from .formula_tokenizer import REFERENCE_KINDS, Token
+from .reference_extractor import ReferenceExtractor
+from .xlsx_reader import column_letter, split_cell_ref
+
+# Cell references outside quoted sheet names, strings and [file] prefixes. Sheet names
+# (followed by "!") and function names (followed by "(") are left alone.
+_TEMPLATE_PATTERN = re.compile(
+    r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\[[^\]]*\]"
+    r"|(?<![A-Za-z0-9_.$])([A-Za-z]{1,3}\d+)(?![A-Za-z0-9_.(!])"
+)
+
+
+def _r1c1(cell: Tuple[int, int], anchor_row: int, anchor_col: int) -> str:
+    return f"R[{cell[0] - anchor_row}]C[{cell[1] - anchor_col}]"
+
+
+def formula_template(cleaned_formula: str, cell_ref: str) -> str:
+    """
+    Converts a cleaned formula to its relative R1C1 shape as seen from the cell holding it.
+
+    Copies of a formula dragged over a range share the same template:
+    "C19*D17" in E19 and "C20*D18" in E20 both become "R[0]C[-2]*R[-2]C[-1]".
+    The cleaner already strips $ signs, so every reference is treated as relative.
+    References not written in uppercase are kept as they are, so "c19" and "C19"
+    (which give different updated formulas) never share a template.
+
+    Args:
+        cleaned_formula (str): The cleaned formula
+        cell_ref (str): The cell containing the formula
+
+    Returns:
+        str: The template, usable as a cache and grouping key
+    """
+    anchor_row, anchor_col = split_cell_ref(cell_ref)
+
+    def to_r1c1(match: re.Match) -> str:
+        if match.group(1) is None or not match.group(1).isupper():
+            return match.group(0)
+        return _r1c1(split_cell_ref(match.group(1)), anchor_row, anchor_col)
+
+    return _TEMPLATE_PATTERN.sub(to_r1c1, cleaned_formula)
+
+
+class _Slot(NamedTuple):
+    """A reference token that moves with the formula."""
+    prefix: str  # Token text before the cell: sheet or [file]sheet
+    file: str
+    sheet: str
+    start: Tuple[int, int]
+    end: Optional[Tuple[int, int]]  # Last cell of a range
+    replaced: bool  # Written as its id in the updated formula (a valid cell), else kept as text
+
+
+class FormulaTemplate:
+    """
+    Parse result of one formula, kept relative to the cell holding it.
+
+    Every copy of the formula with the same template (in the same sheet) is answered
+    by shifting the stored references, updated formula and quantities, without
+    tokenizing, extracting references or folding quantities again. Whether a copy
+    is an element is only recomputed when it moved to another column.
+    """
+
+    def __init__(self, anchor: Tuple[int, int], segments: List[Union[str, _Slot]], references: List[Tuple[str, str, int, int]],
+                 quantities: Optional[List[Tuple[int, float]]], is_element: bool, h_reference_count: int):
+        self.anchor_row, self.anchor_col = anchor
+        self.segments = segments
+        self.references = references  # (file, sheet, row, col) in extraction order
+        self.quantities = quantities  # (index in references, coefficient)
+        self.is_element = is_element
+        self.h_reference_count = h_reference_count
+
+    @classmethod
+    def from_parse(cls, tokens: List[Token], info: FormulaInfo, template: str, cell_ref: str,
+                   parent_file: str, parent_sheet: str) -> Optional["FormulaTemplate"]:
+        """
+        Builds the template of a freshly parsed formula.
+
+        Returns:
+            Optional[FormulaTemplate]: None if the formula cannot be re-anchored safely: its
+            tokens do not spell its template (lowercase or $ references) or a quantity does
+            not belong to a reference
+        """
+        anchor = split_cell_ref(cell_ref)
+        segments: List[Union[str, _Slot]] = []
+        spelled: List[str] = []  # The template as read from the tokens, to check it against template
+        for token in tokens:
+            movable = token.kind in REFERENCE_KINDS and bool(token.cell) and (token.cell or "")[-1].isdigit()
+            cell_text = f"{token.cell}:{token.end}" if token.end is not None else token.cell or ""
+            if not movable:
+                segments.append(token.text)
+                spelled.append(token.text)
+                continue
+            if not token.text.endswith(cell_text) or not cell_text.isupper():
+                return None
+            start = split_cell_ref(token.cell or "")
+            end = split_cell_ref(token.end) if token.end is not None else None
+            prefix = token.text[:-len(cell_text)]
+            segments.append(_Slot(prefix, token.file or parent_file, token.sheet or parent_sheet, start, end,
+                                  ReferenceExtractor._is_valid_cell(token.cell or "")))
+            spelled.append(prefix + _r1c1(start, *anchor) + (f":{_r1c1(end, *anchor)}" if end is not None else ""))
+        if "".join(spelled) != template:
+            return None
+
+        references = []
+        indexes: Dict[str, int] = {}
+        for index, ref in enumerate(info["references"]):
+            references.append((ref.file, ref.sheet, *split_cell_ref(ref.cell)))
+            indexes[ref.id] = index
+        quantities = None
+        if info["quantities"] is not None:
+            if any(ref_id not in indexes for ref_id in info["quantities"]):
+                return None
+            quantities = [(indexes[ref_id], coefficient) for ref_id, coefficient in info["quantities"].items()]
+        return cls(anchor, segments, references, quantities, info["isElement"], info["hReferenceCount"])
+
+    def anchor(self, cell_ref: str, template: str) -> Optional[FormulaInfo]:
+        """
+        Returns the parse result of the copy of the formula held by cell_ref.
+
+        Returns:
+            Optional[FormulaInfo]: The shifted result, None if a reference would move off the sheet
+            or become (or stop being) a valid cell reference
+        """
+        row, col = split_cell_ref(cell_ref)
+        row_offset, col_offset = row - self.anchor_row, col - self.anchor_col
+
+        def shift(cell: Tuple[int, int]) -> Optional[str]:
+            if cell[0] + row_offset < 1 or cell[1] + col_offset < 1:
+                return None
+            return f"{column_letter(cell[1] + col_offset)}{cell[0] + row_offset}"
+
+        parts: List[str] = []
+        for segment in self.segments:
+            if isinstance(segment, str):
+                parts.append(segment)
+                continue
+            start = shift(segment.start)
+            end = shift(segment.end) if segment.end is not None else None
+            if start is None or (segment.end is not None and end is None) or ReferenceExtractor._is_valid_cell(start) != segment.replaced:
+                return None
+            if not segment.replaced:
+                parts.append(f"{segment.prefix}{start}" + (f":{end}" if end is not None else ""))
+                continue
+            ref_id = f"{segment.file}_{segment.sheet}_{start}"
+            parts.append((ref_id if end is None else f"{ref_id}:{segment.file}_{segment.sheet}_{end}").replace(" ", ""))
+
+        references: List[CellNode] = []
+        for file, sheet, ref_row, ref_col in self.references:
+            cell = shift((ref_row, ref_col))
+            if cell is None:
+                return None
+            references.append(CellNode(file, sheet, cell))
+        quantities = None
+        if self.quantities is not None:
+            quantities = {references[index].id: coefficient for index, coefficient in self.quantities}
+        if col_offset == 0:
+            is_element, h_reference_count = self.is_element, self.h_reference_count
+        else:
+            is_element = ElementDetector.is_element(references)
+            h_reference_count = len([ref for ref in references if ref.cell.startswith('H')])
+
+        return FormulaInfo({
+            "isElement": is_element,
+            "hReferenceCount": h_reference_count,
+            "isBaseMaterial": False,
+            "isProduct": False,
+            "updated_formula": "".join(parts),
+            "template": template,
+            "quantities": quantities,
+            "references": references
+        })
@@ -0,0 +1,375 @@
+import re
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+# Token kinds
+EXTERNAL_REF = "external_ref"  # '[file.xlsx]Sheet'!A1
+SHEET_REF = "sheet_ref"        # Sheet!A1 or 'My Sheet'!A1
+CELL = "cell"                  # A1
+RANGE = "range"                # A1:B2, Sheet!A1:B2, A:A (any scope)
+NUMBER = "number"
+STRING = "string"
+FUNCTION = "function"          # SUM, IF, ... (the opening parenthesis is a separate token)
+NAME = "name"                  # Defined names, TRUE/FALSE and anything else that is not a reference
+OPERATOR = "operator"
+OPEN = "open"
+CLOSE = "close"
+SEPARATOR = "separator"
+ERROR = "error"                # #REF!, #N/A, ...
+SPACE = "space"
+
+REFERENCE_KINDS = (EXTERNAL_REF, SHEET_REF, CELL, RANGE)
+
+# Sheet names that contain operator characters and still appear unquoted in our formulas.
+# They cannot be told apart from an addition by syntax alone, so they are matched as whole names.
+# Only used for workbooks whose sheet names are unknown; otherwise the names come from the workbook.
+OPERATOR_SHEET_NAMES: Tuple[str, ...] = ("FRIGO+OVEN", "KOLOM+BL", "LEGGERS+OVEN")
+
+_NAME_CHARS = re.compile(r"[A-Za-z0-9_.$]+")
+_NUMBER = re.compile(r"\d+(?:\.\d*)?(?:[Ee][+-]?\d+)?|\.\d+(?:[Ee][+-]?\d+)?")
+_CELL = re.compile(r"\$?([A-Za-z]{1,3})\$?(\d+)")
+_COLUMN = re.compile(r"\$?([A-Za-z]{1,3})")
+_ERROR = re.compile(r"#(?:NULL!|DIV/0!|VALUE!|REF!|NAME\?|NUM!|N/A|GETTING_DATA)")
+_TWO_CHAR_OPERATORS = ("<=", ">=", "<>")
+
+
+class Token(NamedTuple):
+    kind: str
+    text: str                      # Exact source text, so joining all token texts gives the formula back
+    file: Optional[str] = None     # External workbook for EXTERNAL_REF (and external ranges)
+    sheet: Optional[str] = None    # Sheet for SHEET_REF / EXTERNAL_REF (and scoped ranges)
+    cell: Optional[str] = None     # Cell, or first cell of a range, without $ signs
+    end: Optional[str] = None      # Last cell of a range
+
+
+class SheetNameTrie:
+    """
+    The sheet names of a workbook that the tokenizer cannot read on its own, as a trie.
+
+    Excel writes some sheet names unquoted although they contain characters that
+    are not name characters (KOLOM+BL!A1). Names made only of name characters are
+    read by the tokenizer itself and are left out, so for most workbooks the trie
+    is empty. match walks the formula once from a token start and returns the
+    longest name directly followed by "!".
+    """
+
+    _END = ""  # Key marking the end of a name (never a character of the formula)
+
+    def __init__(self, sheet_names: Iterable[str] = ()):
+        self.names = tuple(sorted({name for name in sheet_names if name and _NAME_CHARS.fullmatch(name) is None}))
+        self.root: Dict[str, Any] = {}
+        for name in self.names:
+            node = self.root
+            for char in name:
+                node = node.setdefault(char, {})
+            node[self._END] = name
+
+    def match(self, formula: str, pos: int) -> Optional[str]:
+        """Returns the longest sheet name starting at pos and followed by "!", None if there is none."""
+        found = None
+        node = self.root
+        length = len(formula)
+        while pos < length:
+            char = formula[pos]
+            if char == "!" and self._END in node:
+                found = node[self._END]
+            node = node.get(char)
+            if node is None:
+                break
+            pos += 1
+        return found
+
+
+class FormulaTokenizer:
+    """Splits a cleaned Excel formula into typed tokens in a single left-to-right pass."""
+
+    def __init__(self, operator_sheet_names: Iterable[str] = OPERATOR_SHEET_NAMES):
+        # Used when the sheet names of the formula's workbook are not given
+        self.default_sheet_names = SheetNameTrie(operator_sheet_names)
+
+    def _read_reference(self, formula: str, pos: int) -> Tuple[Optional[str], Optional[str], int]:
+        """
+        Reads a cell, a cell range or a column range starting at pos.
+
+        Returns:
+            Tuple[Optional[str], Optional[str], int]: (first cell, last cell or None, end position);
+            first cell is None when no reference starts at pos
+        """
+        match = _CELL.match(formula, pos)
+        column_only = match is None or _NAME_CHARS.match(formula, match.end()) is not None
+        if column_only:
+            # Whole-column range such as A:A
+            match = _COLUMN.match(formula, pos)
+            if match is None or _NAME_CHARS.match(formula, match.end()) is not None or not formula.startswith(":", match.end()):
+                return None, None, pos
+        start = match.group(0).replace("$", "")
+        end_pos = match.end()
+        if formula.startswith(":", end_pos):
+            pattern = _COLUMN if column_only else _CELL
+            end_match = pattern.match(formula, end_pos + 1)
+            if end_match is not None and _NAME_CHARS.match(formula, end_match.end()) is None:
+                return start, end_match.group(0).replace("$", ""), end_match.end()
+            if column_only:
+                return None, None, pos
+        return start, None, end_pos
+
+    def _scoped_reference(self, formula: str, start: int, pos: int, file: Optional[str], sheet: str) -> Tuple[Token, int]:
+        """Builds the token for a reference that follows 'sheet!' (pos points after the '!')."""
+        cell, end, end_pos = self._read_reference(formula, pos)
+        if cell is None:
+            # Sheet-scoped defined name or broken reference: keep it as an opaque name
+            match = _NAME_CHARS.match(formula, pos)
+            end_pos = match.end() if match else pos
+            return Token(NAME, formula[start:end_pos]), end_pos
+        kind = RANGE if end else EXTERNAL_REF if file else SHEET_REF
+        return Token(kind, formula[start:end_pos], file, sheet, cell, end), end_pos
+
+    def tokenize(self, formula: str, sheet_names: Optional[SheetNameTrie] = None) -> List[Token]:
+        """
+        Tokenizes a cleaned formula.
+
+        Args:
+            formula (str): The cleaned formula (leading "=" optional)
+            sheet_names (Optional[SheetNameTrie]): Sheet names of the formula's workbook, for unquoted
+                references to sheets with unusual names (defaults to OPERATOR_SHEET_NAMES)
+
+        Returns:
+            List[Token]: Tokens in source order; their texts concatenate back to the formula
+        """
+        trie = sheet_names if sheet_names is not None else self.default_sheet_names
+        tokens: List[Token] = []
+        pos, length = 0, len(formula)
+        while pos < length:
+            char = formula[pos]
+            start = pos
+
+            sheet = trie.match(formula, pos) if char in trie.root else None
+            if sheet is not None:
+                token, pos = self._scoped_reference(formula, start, pos + len(sheet) + 1, None, sheet)
+                tokens.append(token)
+
+            elif char.isspace():
+                while pos < length and formula[pos].isspace():
+                    pos += 1
+                tokens.append(Token(SPACE, formula[start:pos]))
+
+            elif char == "'":
+                # Quoted sheet, possibly with a path and [file] prefix; '' escapes a quote
+                pos += 1
+                while pos < length and not (formula[pos] == "'" and not formula.startswith("''", pos)):
+                    pos += 2 if formula.startswith("''", pos) else 1
+                name = formula[start + 1:pos].replace("''", "'")
+                pos += 1
+                if formula.startswith("!", pos):
+                    file = None
+                    if "[" in name and "]" in name:
+                        file = name[name.index("[") + 1:name.index("]")]
+                        name = name[name.index("]") + 1:]
+                    token, pos = self._scoped_reference(formula, start, pos + 1, file, name)
+                    tokens.append(token)
+                else:
+                    tokens.append(Token(NAME, formula[start:pos]))
+
+            elif char == '"':
+                pos += 1
+                while pos < length and not (formula[pos] == '"' and not formula.startswith('""', pos)):
+                    pos += 2 if formula.startswith('""', pos) else 1
+                pos += 1
+                tokens.append(Token(STRING, formula[start:pos]))
+
+            elif char == "[" and formula.find("]", pos) != -1:
+                # Unquoted external reference: [file.xlsx]Sheet!A1
+                close = formula.find("]", pos)
+                bang = formula.find("!", close)
+                match = _NAME_CHARS.match(formula, close + 1)
+                if bang != -1 and match is not None and match.end() == bang:
+                    token, pos = self._scoped_reference(formula, start, bang + 1, formula[pos + 1:close], formula[close + 1:bang])
+                else:
+                    pos = close + 1
+                    token = Token(NAME, formula[start:pos])
+                tokens.append(token)
+
+            elif char == "#":
+                match = _ERROR.match(formula, pos)
+                pos = match.end() if match else pos + 1
+                tokens.append(Token(ERROR, formula[start:pos]))
+
+            elif char.isdigit() or (char == "." and pos + 1 < length and formula[pos + 1].isdigit()):
+                match = _NUMBER.match(formula, pos)
+                pos = match.end() if match else pos + 1
+                tokens.append(Token(NUMBER, formula[start:pos]))
+
+            elif _NAME_CHARS.match(formula, pos):
+                match = _NAME_CHARS.match(formula, pos)
+                name_end = match.end()
+                if formula.startswith("!", name_end):
+                    token, pos = self._scoped_reference(formula, start, name_end + 1, None, formula[pos:name_end])
+                    tokens.append(token)
+                elif formula.startswith("(", name_end):
+                    pos = name_end
+                    tokens.append(Token(FUNCTION, formula[start:pos]))
+                else:
+                    cell, end, end_pos = self._read_reference(formula, pos)
+                    if cell is not None and (end is not None or end_pos == name_end):
+                        pos = end_pos
+                        tokens.append(Token(RANGE if end else CELL, formula[start:pos], cell=cell, end=end))
+                    else:
+                        pos = name_end
+                        tokens.append(Token(NAME, formula[start:pos]))
+
+            elif formula.startswith(_TWO_CHAR_OPERATORS, pos):
+                pos += 2
+                tokens.append(Token(OPERATOR, formula[start:pos]))
+            elif char == "(" or char == "{":
+                pos += 1
+                tokens.append(Token(OPEN, char))
+            elif char == ")" or char == "}":
+                pos += 1
+                tokens.append(Token(CLOSE, char))
+            elif char == "," or char == ";":
+                pos += 1
+                tokens.append(Token(SEPARATOR, char))
+            else:
+                # Operators, and any stray character kept as-is so the formula round-trips
+                pos += 1
+                tokens.append(Token(OPERATOR, char))
+        return tokens
+
+
+# --- AST -------------------------------------------------------------------------------
+
+class Number(NamedTuple):
+    value: float
+
+
+class Reference(NamedTuple):
+    token: Token
+
+
+class Text(NamedTuple):
+    token: Token  # Strings, names and errors
+
+
+class UnaryOp(NamedTuple):
+    op: str
+    operand: "Node"
+
+
+class BinaryOp(NamedTuple):
+    op: str
+    left: "Node"
+    right: "Node"
+
+
+class Call(NamedTuple):
+    name: str
+    args: Tuple["Node", ...]
+
+
+Node = Union[Number, Reference, Text, UnaryOp, BinaryOp, Call]
+
+
+class FormulaSyntaxError(ValueError):
+    """Raised when a token stream does not form a valid formula expression."""
+
+
+# Binding power of binary operators, lowest first (Excel precedence)
+_BINARY_PRECEDENCE = {
+    "=": 1, "<": 1, ">": 1, "<=": 1, ">=": 1, "<>": 1,
+    "&": 2,
+    "+": 3, "-": 3,
+    "*": 4, "/": 4,
+    "^": 5,
+}
+_PREFIX_PRECEDENCE = 6
+_POSTFIX_PRECEDENCE = 7  # %
+
+
+class FormulaAstBuilder:
+    """Builds an expression tree from tokens with a single precedence-climbing pass."""
+
+    def parse(self, tokens: List[Token]) -> Node:
+        """
+        Parses tokens into an AST.
+
+        Args:
+            tokens (List[Token]): Tokens from FormulaTokenizer.tokenize
+
+        Returns:
+            Node: Root of the expression tree
+        """
+        self.tokens = [token for token in tokens if token.kind != SPACE]
+        if self.tokens and self.tokens[0].kind == OPERATOR and self.tokens[0].text == "=":
+            self.tokens = self.tokens[1:]
+        self.pos = 0
+        if not self.tokens:
+            raise FormulaSyntaxError("Empty formula")
+        node = self._expression(0)
+        if self.pos != len(self.tokens):
+            raise FormulaSyntaxError(f"Unexpected token: {self.tokens[self.pos].text}")
+        return node
+
+    def _peek(self) -> Optional[Token]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _next(self) -> Token:
+        token = self._peek()
+        if token is None:
+            raise FormulaSyntaxError("Unexpected end of formula")
+        self.pos += 1
+        return token
+
+    def _expression(self, min_precedence: int) -> Node:
+        left = self._prefix()
+        while True:
+            token = self._peek()
+            if token is None or token.kind != OPERATOR:
+                return left
+            if token.text == "%":
+                self.pos += 1
+                left = UnaryOp("%", left)
+                continue
+            precedence = _BINARY_PRECEDENCE.get(token.text)
+            if precedence is None or precedence <= min_precedence:
+                return left
+            self.pos += 1
+            left = BinaryOp(token.text, left, self._expression(precedence))
+
+    def _prefix(self) -> Node:
+        token = self._next()
+        if token.kind == OPERATOR and token.text in ("+", "-"):
+            return UnaryOp(token.text, self._expression(_PREFIX_PRECEDENCE))
+        if token.kind == NUMBER:
+            return Number(float(token.text))
+        if token.kind in REFERENCE_KINDS:
+            return Reference(token)
+        if token.kind in (STRING, NAME, ERROR):
+            return Text(token)
+        if token.kind == OPEN and token.text == "(":
+            node = self._expression(0)
+            if self._next().kind != CLOSE:
+                raise FormulaSyntaxError("Missing closing parenthesis")
+            return node
+        if token.kind == FUNCTION:
+            return self._call(token.text.upper())
+        raise FormulaSyntaxError(f"Unexpected token: {token.text}")
+
+    def _call(self, name: str) -> Call:
+        if self._next().kind != OPEN:
+            raise FormulaSyntaxError(f"Missing parenthesis after {name}")
+        args: List[Node] = []
+        token = self._peek()
+        if token is not None and token.kind == CLOSE:
+            self.pos += 1
+            return Call(name, ())
+        while True:
+            args.append(self._expression(0))
+            token = self._next()
+            if token.kind == CLOSE:
+                return Call(name, tuple(args))
+            if token.kind != SEPARATOR:
+                raise FormulaSyntaxError(f"Unexpected token in {name}(): {token.text}")
+
+
+def parse_formula_ast(formula: str, tokenizer: Optional[FormulaTokenizer] = None) -> Node:
+    """Tokenizes and parses a cleaned formula into an AST."""
+    return FormulaAstBuilder().parse((tokenizer or FormulaTokenizer()).tokenize(formula))
@@ -0,0 +1,82 @@
+import hashlib
+import logging
+import os
+import pickle
+from pathlib import Path
+from typing import Any, Dict, Optional
+from utils.workbook_snapshot import WorkbookSnapshot
+
+CACHE_VERSION = 1  # Bump when the snapshot layout changes so old entries are ignored
+
+
+class ParseCache:
+    """
+    On-disk cache of parsed workbooks (sheet names, formulas and values).
+
+    Each workbook is stored as one pickle file named after a hash of its path.
+    An entry is only used while the workbook's size and modification time
+    (or, optionally, its content hash) are unchanged.
+    """
+
+    def __init__(self, cache_dir: Path, use_content_hash: bool = False):
+        self.cache_dir = cache_dir
+        self.use_content_hash = use_content_hash
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.logger = logging.getLogger("excel_processor")
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_path(self, file_path: Path) -> Path:
+        digest = hashlib.sha1(str(file_path).encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{digest}.pkl"
+
+    def _fingerprint(self, file_path: Path) -> Dict[str, Any]:
+        """Describes the current state of the workbook on disk."""
+        stat = os.stat(file_path)
+        fingerprint: Dict[str, Any] = {"version": CACHE_VERSION, "size": stat.st_size, "mtime": stat.st_mtime_ns}
+        if self.use_content_hash:
+            with open(file_path, "rb") as f:
+                fingerprint["sha1"] = hashlib.file_digest(f, "sha1").hexdigest()
+            del fingerprint["mtime"]  # Copies between shares change mtime but not content
+        return fingerprint
+
+    def load(self, file_path: Path) -> Optional[WorkbookSnapshot]:
+        """
+        Returns the cached snapshot of a workbook, or None if it is missing or stale.
+
+        Args:
+            file_path (Path): Path to the workbook
+
+        Returns:
+            Optional[WorkbookSnapshot]: The cached snapshot
+        """
+        entry_path = self._entry_path(file_path)
+        if not entry_path.exists():
+            self.misses += 1
+            return None
+        try:
+            with open(entry_path, "rb") as f:
+                entry = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as e:
+            self.logger.warning(f"Ignoring unreadable cache entry for {file_path}: {str(e)}")
+            self.misses += 1
+            return None
+
+        if entry.get("fingerprint") != self._fingerprint(file_path):
+            self.logger.debug(f"Cache entry is stale: {file_path}")
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry["snapshot"]
+
+    def store(self, snapshot: WorkbookSnapshot) -> None:
+        """Writes the snapshot of a workbook to the cache, replacing any previous entry."""
+        entry_path = self._entry_path(snapshot.file_path)
+        entry = {"fingerprint": self._fingerprint(snapshot.file_path), "snapshot": snapshot}
+
+        # Write to temporary file first to ensure atomic write (one per process, parallel workers share the cache)
+        temp_path = entry_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temp_path, "wb") as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        temp_path.replace(entry_path)
@@ -0,0 +1,91 @@
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional, Set, Tuple
+from utils.cache_manager import workbook_cache
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+class WorkbookPrefetcher:
+    """
+    Loads referenced workbooks on background threads before the resolver reaches them.
+
+    As soon as a formula's references are parsed, the sheets they point to are
+    queued here. With a snapshot backend the whole sheet snapshot is built in the
+    background; with another thread-safe backend the workbook is opened; otherwise
+    (COM) the file is only read once so the OS and network share caches are warm.
+    A prefetch is skipped when it would push the shared workbook cache over its
+    memory budget, so prefetching never evicts workbooks that are in use.
+    """
+
+    def __init__(self, backend: Any, workers: int = 4, load_sheets: bool = True):
+        """
+        Args:
+            backend (Any): The backend used by the extractor
+            workers (int): Number of background threads
+            load_sheets (bool): Load workbooks through the backend; False only reads the files (for COM)
+        """
+        self.backend = backend
+        self.load_sheets = load_sheets
+        self.cache = workbook_cache
+        self.logger = logging.getLogger("excel_processor")
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self.lock = threading.Lock()
+        self.requested: Set[Tuple[Path, str]] = set()
+        self.pending: Dict[Tuple[Path, str], Future] = {}
+        self.in_flight = 0  # Estimated memory of the prefetches still running
+        self.submitted = 0
+        self.skipped = 0
+
+    def prefetch(self, file_path: Path, sheet_name: str) -> None:
+        """
+        Queues a sheet for background loading, unless it was queued before or the budget is full.
+
+        Args:
+            file_path (Path): Path to the workbook
+            sheet_name (str): Sheet the references point to
+        """
+        key = (file_path, sheet_name)
+        with self.lock:
+            if key in self.requested:
+                return
+            self.requested.add(key)
+            size = self.cache.estimate_size(file_path)
+            if self.cache.memory_used + self.in_flight + size > self.cache.memory_budget:
+                self.skipped += 1
+                return
+            self.in_flight += size
+            self.submitted += 1
+            self.pending[key] = self.executor.submit(self._load, file_path, sheet_name, size)
+
+    def _load(self, file_path: Path, sheet_name: str, size: int) -> None:
+        """Loads one sheet (or reads its file) on a background thread."""
+        try:
+            if not self.load_sheets:
+                with open(file_path, "rb") as f:
+                    while f.read(READ_CHUNK_SIZE):
+                        pass
+            elif hasattr(self.backend, "get_sheet"):
+                self.backend.get_sheet(file_path, sheet_name)
+            else:
+                self.backend.open(file_path)
+        except Exception as e:
+            # The foreground read reports the problem with the right context
+            self.logger.debug(f"Prefetch failed for {file_path.name} [{sheet_name}]: {str(e)}")
+        finally:
+            with self.lock:
+                self.in_flight -= size
+                self.pending.pop((file_path, sheet_name), None)
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """Blocks until every queued prefetch has finished."""
+        with self.lock:
+            futures = list(self.pending.values())
+        for future in futures:
+            future.result(timeout)
+
+    def shutdown(self) -> None:
+        """Cancels queued prefetches and waits for the running ones."""
+        self.executor.shutdown(wait=True, cancel_futures=True)
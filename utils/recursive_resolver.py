@@ -1,6 +1,7 @@
-from typing import Dict, List, Any, Set
-from schema.schema import FormulaResult
+from typing import Dict, List, Any, Optional, Tuple
+from schema.cell_node import CellNode
 from logging import Logger
+from .dependency_graph import DependencyGraph
 
 class RecursiveResolver:
     """Handles recursive resolution of Excel formulas."""
@@ -9,24 +10,11 @@ class RecursiveResolver:
         self.extractor = extractor
         self.logger = logger
         self.BASE_MATERIAL_FILE = "calculatie cat 2022 .xlsx"
-        self.resolution_cache: Dict[str, FormulaResult] = {}
+        self.resolution_cache: Dict[str, CellNode] = {}  # cell_key -> resolved result, shared by all graphs
         self.stop_on_multiplication = stop_on_multiplication
-        self.current_chain: Set[str] = set()  # Track current resolution chain
+        self.graph: Optional[DependencyGraph] = None  # Graph of the last resolution, for impact queries
 
-    def _is_base_case(self, result: FormulaResult) -> bool:
-        """Determines if we should stop recursion."""
-        return bool(
-            result.get('isElement', False) or 
-            isinstance(result.get('value'), (int, float, str)) and 
-            not result.get('formula')
-        )
-
-    def _validate_reference(self, ref: FormulaResult) -> bool:
-        """Validates if a reference contains all required fields."""
-        return all(key in ref for key in ['file', 'sheet', 'cell'])
-
-
-    def _classify_cell(self, result: FormulaResult) -> str:
+    def _classify_cell(self, result: CellNode) -> str:
         """Determine cell classification for logging"""
         if result.get('isProduct'):
             return 'Product'
@@ -36,41 +24,26 @@ class RecursiveResolver:
             return 'Base Material'
         return 'Other'
 
-    def resolve_references(self, result: FormulaResult, max_depth: int = 10, current_depth: int = 0) -> FormulaResult:
-        """Recursively resolves formula references."""
-        if current_depth >= max_depth:
-            self.logger.warning(f"Max recursion depth {max_depth} reached for {result['id']}")
-            result['error'] = "Max Recursion Depth Error: Max recursion depth reached"
-            return result
-        # Add classification logging at resolution start
-        
-        cache_key = f"{result.get('productID','')}|{result['file']}|{result['sheet']}|{result['cell']}"
-        
-        if cache_key in self.current_chain:
-            self.logger.error(f"Circular reference detected: {cache_key}")
-            result['error'] = "Circular Error: Circular reference detected"
-            return result
-        
-        self.current_chain.add(cache_key)
-        try:
-            if cache_key in self.resolution_cache:
-                return self.resolution_cache[cache_key]
-            
-            if self._is_base_case(result):
-                return result
-            
-            # Process references
-            resolved_references: List[FormulaResult] = []
-            for ref in result.get('references', []):
-                if self._validate_reference(ref):
-                    # Log when resolving a reference
-                    resolved_ref = self.extractor.extract_cell_info(ref['file'], ref['sheet'], ref['cell'])
-                    resolved_references.append(resolved_ref)
-            
-            result['references'] = resolved_references
-            
-            # Store before returning
-            self.resolution_cache[cache_key] = result
-            return result
-        finally:
-            self.current_chain.remove(cache_key) 
\ No newline at end of file
+    def resolve_batch(self, roots: List[Tuple[CellNode, bool]], max_depth: Optional[int] = None) -> List[CellNode]:
+        """
+        Resolves several root cells through one dependency graph, so shared cells are resolved once.
+
+        Args:
+            roots (List[Tuple[CellNode, bool]]): Results of prepare_cell_info, with whether to follow their references
+            max_depth (Optional[int]): Maximum depth of the resolution, unlimited when None
+
+        Returns:
+            List[CellNode]: The resolved roots, in the same order
+        """
+        graph = DependencyGraph(self.extractor, self.logger, self.resolution_cache, max_depth)
+        for result, follow in roots:
+            graph.add_root(result, follow)
+        graph.build()
+        for cycle in graph.cycles():
+            self.logger.error(f"Circular reference between: {', '.join(cycle)}")
+        self.graph = graph
+        return graph.resolve()
+
+    def resolve_references(self, result: CellNode, max_depth: Optional[int] = None) -> CellNode:
+        """Resolves the references of a single result, and theirs, down to cells without formulas."""
+        return self.resolve_batch([(result, True)], max_depth)[0]
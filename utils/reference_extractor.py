@@ -1,14 +1,51 @@
 import re
-from typing import List, Tuple
-from schema.schema import FormulaResult
+from typing import Callable, List, Optional, Tuple
+from schema.cell_node import CellNode
 from typing import Set
+from .formula_tokenizer import (BinaryOp, Call, FormulaAstBuilder, FormulaSyntaxError, FormulaTokenizer, Node, Reference, SheetNameTrie,
+                                Token, UnaryOp, EXTERNAL_REF, REFERENCE_KINDS, CELL)
+from .xlsx_reader import split_cell_ref
+
+# (file, sheet, first cell, last cell) -> the used cells of the range in row-major order,
+# or None when the sheet's cells are unknown (the range then contributes its first cell)
+RangeExpander = Callable[[str, str, str, str], Optional[List[str]]]
+
+# Rows and columns of a range: (first row, first column, last row, last column), rows None for whole columns
+RangeBounds = Tuple[Optional[int], int, Optional[int], int]
+
+_COLUMN_REF = re.compile(r"^[A-Z]{1,3}$")
+
+
+def range_bounds(first: str, last: str) -> Optional[RangeBounds]:
+    """
+    Returns the rows and columns covered by a range such as A1:C10 or A:C.
+
+    Returns:
+        Optional[RangeBounds]: The bounds (sorted, so C10:A1 works too), None if the range is not valid
+    """
+    first, last = first.upper(), last.upper()
+    if _COLUMN_REF.match(first) and _COLUMN_REF.match(last):
+        (_, first_col), (_, last_col) = split_cell_ref(f"{first}1"), split_cell_ref(f"{last}1")
+        return None, min(first_col, last_col), None, max(first_col, last_col)
+    try:
+        (first_row, first_col), (last_row, last_col) = split_cell_ref(first), split_cell_ref(last)
+    except ValueError:
+        return None
+    return min(first_row, last_row), min(first_col, last_col), max(first_row, last_row), max(first_col, last_col)
 
 
 class ReferenceExtractor:
     """Handles extraction of references from cleaned formulas."""
+
+    # Pattern: One or two letters followed by 1 to 3 digits
+    CELL_PATTERN = re.compile(r"^[A-Z]{1,2}\d{1,3}$")
+
+    def __init__(self):
+        self.tokenizer = FormulaTokenizer()
+        self.builder = FormulaAstBuilder()
     
-    @staticmethod
-    def _is_valid_cell(cell_ref: str) -> bool:
+    @classmethod
+    def _is_valid_cell(cls, cell_ref: str) -> bool:
         """
         Validates if a cell reference is in the correct format.
         
@@ -18,35 +55,71 @@ class ReferenceExtractor:
         Returns:
             bool: True if the cell reference is valid
         """
-        # Pattern: One or two letters followed by 1 to 3 digits
-        cell_pattern = r"^[A-Z]{1,2}\d{1,3}$"
-        return bool(re.match(cell_pattern, cell_ref))
+        return bool(cls.CELL_PATTERN.match(cell_ref))
     
-    def _create_reference(self, file: str, sheet: str, cell: str) -> FormulaResult:
-        """Create a properly typed reference."""
-        return FormulaResult({
-            "id": f"{file}_{sheet}_{cell}".replace(" ", ""),
-            "file": file,
-            "sheet": sheet,
-            "cell": cell,
-            "formula": None,
-            "cleaned_formula": None,
-            "updated_formula": None,
-            # "expanded_formula": None,
-            "value": None,
-            "path": None,
-            "isElement": False,
-            "isMultiplication": False,
-            "isDivision": False,
-            "hReferenceCount": 0,
-            "isBaseMaterial": False,
-            "isProduct": False,
-            "productID": None,
-            "references": [],
-            "error": None
-        })
-
-    def extract_references(self, cleaned_formula: str, parent_file: str, parent_sheet: str) -> Tuple[List[FormulaResult], str]:
+    def reference_id(self, token: Token, parent_file: str, parent_sheet: str) -> Optional[str]:
+        """
+        Returns the id of the (first) cell a reference token points to.
+
+        Args:
+            token (Token): A token from the tokenizer
+            parent_file (str): The file containing the formula
+            parent_sheet (str): The sheet containing the formula
+
+        Returns:
+            Optional[str]: The reference id, None if the token is not a valid cell reference
+        """
+        if token.kind not in REFERENCE_KINDS or not self._is_valid_cell(token.cell or ""):
+            return None
+        return f"{token.file or parent_file}_{token.sheet or parent_sheet}_{(token.cell or '').upper()}".replace(" ", "")
+
+    def _create_reference(self, file: str, sheet: str, cell: str) -> CellNode:
+        """Create a reference to a cell that has not been read yet."""
+        return CellNode(file, sheet, cell)
+
+    def range_cells(self, token: Token, parent_file: str, parent_sheet: str, expand_range: Optional[RangeExpander]) -> Optional[List[Tuple[str, str, str]]]:
+        """
+        Returns the (file, sheet, cell) of every used cell of a range token.
+
+        Returns:
+            Optional[List[Tuple[str, str, str]]]: The member cells, None if the range
+            cannot be expanded (no expand_range, unknown sheet, invalid range)
+        """
+        if expand_range is None or token.end is None or range_bounds(token.cell or "", token.end) is None:
+            return None
+        file = token.file or parent_file
+        sheet = token.sheet or parent_sheet
+        cells = expand_range(file, sheet, (token.cell or "").upper(), token.end.upper())
+        return [(file, sheet, cell) for cell in cells] if cells is not None else None
+
+    def summed_ranges(self, tokens: List[Token]) -> Set[int]:
+        """
+        Returns the id() of the range tokens that are arguments of SUM, anywhere in the formula.
+
+        Only these ranges are expanded: they are the ones AddQuantity counts, while the
+        tables of VLOOKUP, INDEX or MATCH would turn every used cell into a reference.
+        """
+        if not any(token.end is not None for token in tokens):
+            return set()
+        try:
+            stack: List[Node] = [self.builder.parse(tokens)]
+        except FormulaSyntaxError:
+            return set()
+        summed: Set[int] = set()
+        while stack:
+            node = stack.pop()
+            if isinstance(node, Call):
+                if node.name == "SUM":
+                    summed.update(id(arg.token) for arg in node.args if isinstance(arg, Reference) and arg.token.end is not None)
+                stack.extend(node.args)
+            elif isinstance(node, BinaryOp):
+                stack.extend((node.left, node.right))
+            elif isinstance(node, UnaryOp):
+                stack.append(node.operand)
+        return summed
+
+    def extract_references(self, cleaned_formula: str, parent_file: str, parent_sheet: str, sheet_names: Optional[SheetNameTrie] = None,
+                           expand_range: Optional[RangeExpander] = None) -> Tuple[List[CellNode], str]:
         """
         Extracts references from a cleaned formula.
         
@@ -54,102 +127,56 @@ class ReferenceExtractor:
             cleaned_formula (str): The cleaned formula
             parent_file (str): The file containing the formula
             parent_sheet (str): The sheet containing the formula
+            sheet_names (Optional[SheetNameTrie]): Sheet names of parent_file (see FormulaTokenizer.tokenize)
+            expand_range (Optional[RangeExpander]): Lists the used cells of a range, so that
+                every member of SUM(A1:A10) or SUM(A:A) becomes a reference
             
         Returns:
-            List[FormulaResult]: List of reference dictionaries
+            List[CellNode]: List of references
         """
-        # Pattern 1: [filename]sheetname!cell (external reference)
-        pattern1 = r"\[([^\]]+)\]([^\[]+)'!([A-Z]{1,2}\d{1,3})"
-        
-        # Updated Pattern 2 with special cases and SUM handling
-        pattern2 = r"""(?x)                           # Enable verbose mode for clarity
-            (
-              (?P<special>                # Capture group for special cases
-                FRIGO\+OVEN               # Match "FRIGO+OVEN"
-                | KOLOM\+BL              # Match "KOLOM+BL"
-                | LEGGERS\+OVEN          # Match "LEGGERS+OVEN"
-              )
-              |
-              '(?P<quoted_sheet>[^']+)'   # Capture a quoted sheet name (e.g. 'Sheet1')
-              |
-              SUM\((?P<sum_sheet>[^!+*']+)  # Capture sheet name inside SUM(...) call
-              |
-              (?P<unquoted_sheet>[^()!+*']+)    # Capture an unquoted sheet name, taking the assumption that if there is a parenthesis, it adds quotes to the sheet name
-            )
-            !                              # Literal exclamation mark separator
-            (?P<cell>\$?[A-Za-z]{1,2}\$?\d+)    # Capture a cell reference (e.g. A1, $B$2, AA1)
+        return self.extract_references_from_tokens(self.tokenizer.tokenize(cleaned_formula, sheet_names), parent_file, parent_sheet, expand_range)
+
+    def extract_references_from_tokens(self, tokens: List[Token], parent_file: str, parent_sheet: str,
+                                       expand_range: Optional[RangeExpander] = None) -> Tuple[List[CellNode], str]:
+        """
+        Extracts references and the updated formula from an already tokenized formula.
+
+        Every reference token is replaced by its id in the updated formula, so the
+        rewrite is a single join over the tokens and never touches partial matches
+        (A1 inside AA1). References are returned grouped as external, other-sheet and
+        same-sheet references, each group in formula order. A range that is an
+        argument of SUM contributes its used cells (see range_cells); other ranges,
+        and ranges that cannot be expanded, only contribute their first cell.
         """
-        
-        # Pattern 3: simple cell reference
-        pattern3 = r"([A-Z]{1,2}\d{1,3})"
-        
-        updated_formula = cleaned_formula
         processed: Set[Tuple[str, str, str]] = set()
-        
-        # First, extract and remove all external references
-        external_refs: List[FormulaResult] = []
-        for match in re.findall(pattern1, cleaned_formula):
-            file, sheet, cell = match
-            if self._is_valid_cell(cell):
-                cell_key = (file, sheet, cell.upper())
-                if cell_key not in processed:
-                    external_refs.append(self._create_reference(file, sheet, cell.upper()))
-                    # Construct the original reference string to replace
-                    original_ref = f"'[{file}]{sheet}'!{cell}"
-                    updated_formula = updated_formula.replace(original_ref, f"{file}_{sheet}_{cell}".replace(" ", ""))
-                    processed.add(cell_key)
-                elif cell_key in processed:
-                    print(f"Duplicate external reference found: {cell_key}")
-
-        # Remove external references from the formula
-        formula_without_externals = re.sub(pattern1, "", cleaned_formula)
-        
-        # Then extract internal references with updated match handling
-        internal_refs: List[FormulaResult] = []
-        for match in re.finditer(pattern2, formula_without_externals):
-            # Extract values using named groups - use the first non-None group
-            sheet = match.group('quoted_sheet') or match.group('unquoted_sheet') or match.group('sum_sheet') or match.group('special')
-            cell = match.group('cell')
-            if self._is_valid_cell(cell):
-                cell_key = (parent_file, sheet, cell.upper())
-                if cell_key not in processed:
-                    internal_refs.append(self._create_reference(parent_file, sheet, cell.upper()))
-                    # Construct the original reference string to replace
-                    original_ref = match.group()
-                    updated_formula = updated_formula.replace(
-                        original_ref, 
-                        f"{parent_file}_{sheet}_{cell}".replace(" ", "")
-                    )
-                    processed.add(cell_key)
-                elif cell_key in processed:
-                    print(f"Duplicate internal reference found: {cell_key}")
-
-        # Remove internal references from the formula
-        formula_without_refs = re.sub(pattern2, "", formula_without_externals)
-        
-        # Finally, extract simple cell references
-        simple_refs: List[FormulaResult] = []
-        for match in re.findall(pattern3, formula_without_refs):
-            cell = match
-            if self._is_valid_cell(cell):
-                cell_key = (parent_file, parent_sheet, cell.upper())
-                if cell_key not in processed:
-                    simple_refs.append(self._create_reference(parent_file, parent_sheet, cell.upper()))
-                    # Try both formats: with and without parent sheet reference
-                    possible_refs = [
-                        f"'{parent_sheet}'!{cell}" if " " in parent_sheet else f"{parent_sheet}!{cell}",
-                        cell
-                    ]
-                    # Find which reference format actually exists in the formula
-                    for possible_ref in possible_refs:
-                        if possible_ref in updated_formula:
-                            updated_formula = updated_formula.replace(
-                                possible_ref, 
-                                f"{parent_file}_{parent_sheet}_{cell}".replace(" ", "")
-                            )
-                            break
-                    processed.add(cell_key)
-                elif cell_key in processed:
-                    print(f"Duplicate simple reference found: {cell_key}")
-
-        return external_refs + internal_refs + simple_refs, updated_formula
\ No newline at end of file
+        external_refs: List[CellNode] = []
+        internal_refs: List[CellNode] = []
+        simple_refs: List[CellNode] = []
+        parts: List[str] = []
+
+        summed = self.summed_ranges(tokens) if expand_range is not None else set()
+        for token in tokens:
+            members = self.range_cells(token, parent_file, parent_sheet, expand_range) if id(token) in summed else None
+            if members is None and (token.kind not in REFERENCE_KINDS or not self._is_valid_cell(token.cell or "")):
+                parts.append(token.text)
+                continue
+
+            file = token.file or parent_file
+            sheet = token.sheet or parent_sheet
+            cell = token.cell or ""
+            ref_id = f"{file}_{sheet}_{cell}".replace(" ", "")
+            parts.append(ref_id if token.end is None else f"{ref_id}:{file}_{sheet}_{token.end}".replace(" ", ""))
+
+            if token.file is not None or token.kind == EXTERNAL_REF:
+                group = external_refs
+            elif token.sheet is not None and token.kind != CELL:
+                group = internal_refs
+            else:
+                group = simple_refs
+            for cell_key in members if members is not None else [(file, sheet, cell.upper())]:
+                if cell_key in processed:
+                    continue
+                processed.add(cell_key)
+                group.append(self._create_reference(*cell_key))
+
+        return external_refs + internal_refs + simple_refs, "".join(parts)
@@ -0,0 +1,169 @@
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Protocol, Tuple
+from openpyxl.workbook.workbook import Workbook
+from utils.excel_utils import ExcelHelper, ExcelUtils
+from utils.parse_cache import ParseCache
+from utils.workbook_snapshot import SnapshotBackend
+from utils.xlsx_reader import XlsxReader, format_external_target, replace_external_links, split_cell_ref
+
+
+class WorkbookBackend(Protocol):
+    """Interface shared by every engine that can read formulas and values from a workbook."""
+
+    def open(self, file_path: Path) -> Any:
+        """Opens (or returns the cached) workbook. Raises FileNotFoundError if it does not exist."""
+        ...
+
+    def get_sheet_names(self, file_path: Path) -> List[str]:
+        """Returns the worksheet names of a workbook."""
+        ...
+
+    def get_cell_info(self, file_path: Path, sheet_name: str, cell_ref: str) -> Tuple[str, Any]:
+        """Returns (formula, value) for one cell, with the same messages as ExcelHelper."""
+        ...
+
+    def iter_cells(self, file_path: Path, sheet_name: str) -> Iterator[Tuple[int, int, Optional[str], Any]]:
+        """Yields (row, column, formula, value) for every non-empty cell of a sheet in one bulk read."""
+        ...
+
+    def get_cells(self, file_path: Path, sheet_name: str, cell_refs: Iterable[str]) -> Dict[str, Tuple[str, Any]]:
+        """Returns (formula, value) for several cells of the same sheet."""
+        ...
+
+    def cleanup(self) -> None:
+        """Releases every open workbook."""
+        ...
+
+
+class OpenpyxlBackend:
+    """Reads formulas and cached values with openpyxl (one formula and one value workbook per file)."""
+
+    def __init__(self):
+        self.logger = logging.getLogger("excel_processor")
+
+    def open(self, file_path: Path) -> Workbook:
+        """Get cached formula workbook or load it."""
+        return ExcelUtils.get_workbook(file_path, data_only=False)
+
+    def get_sheet_names(self, file_path: Path) -> List[str]:
+        """Returns the worksheet names of a workbook in tab order."""
+        return self.open(file_path).sheetnames
+
+    def _external_links(self, wb: Workbook) -> Dict[str, str]:
+        """Maps the [n] external workbook indexes to the prefix Excel shows in formulas."""
+        return {
+            str(index): format_external_target(link.file_link.Target)
+            for index, link in enumerate(wb._external_links, 1)
+            if link.file_link is not None
+        }
+
+    @staticmethod
+    def _formula_text(formula: Any) -> Any:
+        """Formula as the xml and COM backends spell it: array formulas as text, without _xlfn. prefixes."""
+        if hasattr(formula, "text"):  # Array formulas (their text already starts with "=")
+            formula = formula.text if formula.text.startswith("=") else f"={formula.text}"
+        if isinstance(formula, str) and formula.startswith("="):
+            formula = formula.replace("_xlfn.", "")
+        return formula
+
+    def iter_cells(self, file_path: Path, sheet_name: str) -> Iterator[Tuple[int, int, Optional[str], Any]]:
+        """Yields (row, column, formula, value) for every non-empty cell of a sheet."""
+        formula_wb = self.open(file_path)
+        external_links = self._external_links(formula_wb)
+        formula_ws = formula_wb[sheet_name]
+        value_ws = ExcelUtils.get_workbook(file_path)[sheet_name]
+        rows = zip(formula_ws.iter_rows(min_row=1, min_col=1, values_only=True), value_ws.iter_rows(min_row=1, min_col=1, values_only=True))
+        for row, (formula_row, value_row) in enumerate(rows, 1):
+            for col, (formula, value) in enumerate(zip(formula_row, value_row), 1):
+                formula = self._formula_text(formula)
+                has_formula = isinstance(formula, str) and formula.startswith("=")
+                if has_formula or value is not None:
+                    yield row, col, replace_external_links(formula, external_links) if has_formula else None, value
+
+    def _cell_info(self, formula: Any, value: Any, sheet_name: str, cell_ref: str, external_links: Dict[str, str]) -> Tuple[str, Any]:
+        """(formula, value) of a cell read from the sheet tables, with the same messages as ExcelHelper."""
+        formula = self._formula_text(formula)
+        if not isinstance(formula, str) or not formula.startswith("="):
+            self.logger.warning(f"Cell has no formula: {cell_ref} in {sheet_name}")
+            return "Cell has no formula in file", value
+        return replace_external_links(formula, external_links), value
+
+    def get_cell_info(self, file_path: Path, sheet_name: str, cell_ref: str) -> Tuple[str, Any]:
+        """Extracts formula and value from a specific cell."""
+        try:
+            if not file_path.exists():
+                self.logger.warning(f"File not found: {file_path}")
+                return "File not found", None
+
+            formula_wb = self.open(file_path)
+            if sheet_name not in formula_wb.sheetnames:
+                self.logger.warning(f"Sheet not found: {sheet_name} in {file_path}")
+                return "Sheet not found", None
+
+            formula = ExcelUtils.get_cell_value(file_path, sheet_name, cell_ref, data_only=False)
+            value = ExcelUtils.get_cell_value(file_path, sheet_name, cell_ref)
+            return self._cell_info(formula, value, sheet_name, cell_ref, self._external_links(formula_wb))
+        except Exception as e:
+            error_message = f"Error: {str(e)}"
+            self.logger.error(error_message)
+            return error_message, None
+
+    def get_cells(self, file_path: Path, sheet_name: str, cell_refs: Iterable[str]) -> Dict[str, Tuple[str, Any]]:
+        """
+        Extracts formula and value for several cells of the same sheet.
+
+        The file, the sheet and the external links are checked once and both sheet
+        tables are fetched once; each cell is then a lookup. Anything unusual (missing
+        file or sheet, invalid reference) is answered by get_cell_info, cell by cell.
+        """
+        cell_refs = list(cell_refs)
+        try:
+            formula_wb = self.open(file_path) if file_path.exists() else None
+            if formula_wb is None or sheet_name not in formula_wb.sheetnames:
+                return {cell_ref: self.get_cell_info(file_path, sheet_name, cell_ref) for cell_ref in cell_refs}
+            formulas = ExcelUtils.get_sheet_table(file_path, sheet_name, data_only=False)
+            values = ExcelUtils.get_sheet_table(file_path, sheet_name)
+            external_links = self._external_links(formula_wb)
+        except Exception:
+            return {cell_ref: self.get_cell_info(file_path, sheet_name, cell_ref) for cell_ref in cell_refs}
+
+        cells: Dict[str, Tuple[str, Any]] = {}
+        for cell_ref in cell_refs:
+            try:
+                key = split_cell_ref(cell_ref)
+            except ValueError:
+                cells[cell_ref] = self.get_cell_info(file_path, sheet_name, cell_ref)
+                continue
+            cells[cell_ref] = self._cell_info(formulas.get(key), values.get(key), sheet_name, cell_ref, external_links)
+        return cells
+
+    def cleanup(self) -> None:
+        """Close all cached openpyxl workbooks."""
+        ExcelUtils._WORKBOOK_CACHE.clear("openpyxl|")
+
+
+def create_backend(name: str, snapshots: bool = True, cache_dir: Optional[Path] = None) -> WorkbookBackend:
+    """
+    Creates the workbook backend selected in the configuration.
+
+    Args:
+        name (str): "com" (Excel over COM, Windows only), "openpyxl" or "xml" (streaming xlsx reader)
+        snapshots (bool): Read each sheet once into memory and answer lookups from there
+        cache_dir (Optional[Path]): Directory of the on-disk parse cache, reused across runs (needs snapshots)
+
+    Returns:
+        WorkbookBackend: The backend instance
+    """
+    backend: WorkbookBackend
+    if name == "com":
+        backend = ExcelHelper()
+    elif name == "openpyxl":
+        backend = OpenpyxlBackend()
+    elif name == "xml":
+        backend = XlsxReader()
+    else:
+        raise ValueError(f"Unknown workbook backend: {name}")
+    if not snapshots:
+        return backend
+    return SnapshotBackend(backend, ParseCache(cache_dir) if cache_dir is not None else None)
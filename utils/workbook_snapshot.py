@@ -0,0 +1,270 @@
+import logging
+import threading
+from array import array
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from utils.cache_manager import workbook_cache
+from utils.xlsx_reader import split_cell_ref
+
+if TYPE_CHECKING:
+    from utils.parse_cache import ParseCache
+
+# Type codes stored per cell
+TYPE_EMPTY = 0   # Formula without cached value
+TYPE_NUMBER = 1
+TYPE_BOOL = 2
+TYPE_OBJECT = 3  # Strings, errors, dates: kept in a side table
+
+COLUMN_BITS = 15  # Excel has at most 16384 columns
+
+
+def pack_cell(row: int, col: int) -> int:
+    """Packs a (row, column) pair into a single integer key."""
+    return (row << COLUMN_BITS) | col
+
+
+def unpack_cell(key: int) -> Tuple[int, int]:
+    """Reverses pack_cell."""
+    return key >> COLUMN_BITS, key & ((1 << COLUMN_BITS) - 1)
+
+
+class SheetSnapshot:
+    """Every non-empty cell of one worksheet, stored as compact parallel arrays."""
+
+    def __init__(self, formula_pool: "FormulaPool"):
+        self.formula_pool = formula_pool
+        self.index: Dict[int, int] = {}        # packed (row, col) -> position in the arrays
+        self.formula_ids = array('i')          # Formula pool id, -1 if the cell has no formula
+        self.numbers = array('d')              # Numeric (and boolean) values
+        self.types = array('b')                # One of the TYPE_* codes
+        self.objects: Dict[int, Any] = {}      # position -> non-numeric value
+
+    def add(self, row: int, col: int, formula: Optional[str], value: Any) -> None:
+        """Stores one cell."""
+        position = len(self.types)
+        self.index[pack_cell(row, col)] = position
+        self.formula_ids.append(self.formula_pool.intern(formula) if formula else -1)
+        if value is None:
+            self.types.append(TYPE_EMPTY)
+            self.numbers.append(0.0)
+        elif isinstance(value, bool):
+            self.types.append(TYPE_BOOL)
+            self.numbers.append(float(value))
+        elif isinstance(value, (int, float)):
+            self.types.append(TYPE_NUMBER)
+            self.numbers.append(float(value))
+        else:
+            self.types.append(TYPE_OBJECT)
+            self.numbers.append(0.0)
+            self.objects[position] = value
+
+    def get(self, row: int, col: int) -> Tuple[Optional[str], Any]:
+        """Returns (formula, value) of a cell, (None, None) when the cell is empty."""
+        position = self.index.get(pack_cell(row, col))
+        if position is None:
+            return None, None
+        formula_id = self.formula_ids[position]
+        formula = self.formula_pool.formulas[formula_id] if formula_id >= 0 else None
+        cell_type = self.types[position]
+        if cell_type == TYPE_NUMBER:
+            value: Any = self.numbers[position]
+        elif cell_type == TYPE_BOOL:
+            value = bool(self.numbers[position])
+        elif cell_type == TYPE_OBJECT:
+            value = self.objects[position]
+        else:
+            value = None
+        return formula, value
+
+    def cells(self) -> Iterator[Tuple[int, int, Optional[str], Any]]:
+        """Yields (row, column, formula, value) for every stored cell."""
+        for key in self.index:
+            row, col = unpack_cell(key)
+            yield (row, col) + self.get(row, col)
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory taken by the sheet (index entry plus the array slots per cell)."""
+        return len(self.types) * 120
+
+
+class FormulaPool:
+    """Interns formula strings so copies of the same formula share one string."""
+
+    def __init__(self):
+        self.formulas: List[str] = []
+        self.ids: Dict[str, int] = {}
+
+    def intern(self, formula: str) -> int:
+        formula_id = self.ids.get(formula)
+        if formula_id is None:
+            formula_id = len(self.formulas)
+            self.formulas.append(formula)
+            self.ids[formula] = formula_id
+        return formula_id
+
+
+class WorkbookSnapshot:
+    """In-memory copy of a workbook: sheet names plus lazily loaded sheet snapshots."""
+
+    def __init__(self, file_path: Path, sheet_names: List[str]):
+        self.file_path = file_path
+        self.sheet_names = sheet_names
+        self.formula_pool = FormulaPool()
+        self.sheets: Dict[str, SheetSnapshot] = {}
+        self.dirty = False  # True when sheets were added since the last save to the parse cache
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {**self.__dict__, "dirty": False}
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory taken by the snapshot."""
+        return sum(sheet.nbytes for sheet in self.sheets.values()) + sum(len(formula) + 50 for formula in self.formula_pool.formulas)
+
+    def build_sheet(self, sheet_name: str, cells: Iterable[Tuple[int, int, Optional[str], Any]]) -> SheetSnapshot:
+        """Builds and stores the snapshot of one sheet from (row, column, formula, value) tuples."""
+        sheet = SheetSnapshot(self.formula_pool)
+        for row, col, formula, value in cells:
+            sheet.add(row, col, formula, value)
+        self.sheets[sheet_name] = sheet
+        self.dirty = True
+        return sheet
+
+
+class SnapshotBackend:
+    """
+    Wraps another backend and answers cell lookups from per-sheet snapshots.
+
+    The first touch of a sheet reads all its cells in one bulk pass (iter_cells);
+    every further lookup in that sheet is a dictionary access. With a parse cache,
+    snapshots saved by a previous run are reused while the workbook is unchanged.
+    Each workbook has its own lock, so a sheet being built by a prefetch thread is
+    waited for rather than built twice.
+    """
+
+    def __init__(self, backend: Any, parse_cache: Optional["ParseCache"] = None):
+        self.backend = backend
+        self.parse_cache = parse_cache
+        self.cache = workbook_cache  # Shared, memory-bounded cache; evicted snapshots are saved first
+        self.logger = logging.getLogger("excel_processor")
+        self._lock = threading.Lock()
+        self._file_locks: Dict[Path, threading.RLock] = {}
+
+    def _file_lock(self, file_path: Path) -> threading.RLock:
+        """Returns the lock guarding the snapshot of a workbook."""
+        with self._lock:
+            lock = self._file_locks.get(file_path)
+            if lock is None:
+                lock = self._file_locks[file_path] = threading.RLock()
+            return lock
+
+    def _save(self, snapshot: WorkbookSnapshot) -> None:
+        """Saves a snapshot to the parse cache if it changed."""
+        if self.parse_cache is not None and snapshot.dirty:
+            self.parse_cache.store(snapshot)
+            snapshot.dirty = False
+
+    def _release(self, snapshot: WorkbookSnapshot) -> None:
+        """Saves an evicted snapshot, unless another thread is still building one of its sheets."""
+        # Not waiting for the lock: the evicting thread may hold the lock of another workbook
+        lock = self._file_lock(snapshot.file_path)
+        if not lock.acquire(blocking=False):
+            self.logger.debug(f"Snapshot evicted while loading, not saved: {snapshot.file_path.name}")
+            return
+        try:
+            self._save(snapshot)
+        finally:
+            lock.release()
+
+    def open(self, file_path: Path) -> WorkbookSnapshot:
+        """Get cached workbook snapshot, load it from the parse cache or create it from the wrapped backend."""
+        with self._file_lock(file_path):
+            snapshot = self.cache.get(f"snapshot|{file_path}")
+            if snapshot is None:
+                if not file_path.exists():
+                    raise FileNotFoundError(file_path)
+                if self.parse_cache is not None:
+                    snapshot = self.parse_cache.load(file_path)
+                if snapshot is None:
+                    snapshot = WorkbookSnapshot(file_path, self.backend.get_sheet_names(file_path))
+                    snapshot.dirty = True
+                self.cache.put(f"snapshot|{file_path}", snapshot, file_path, size=snapshot.nbytes, close=self._release)
+            return snapshot
+
+    def flush(self) -> None:
+        """Saves every snapshot that changed since it was loaded to the parse cache."""
+        for key in self.cache.keys("snapshot|"):
+            snapshot = self.cache.peek(key)
+            if snapshot is not None:
+                with self._file_lock(snapshot.file_path):
+                    self._save(snapshot)
+
+    def get_sheet_names(self, file_path: Path) -> List[str]:
+        """Returns the worksheet names of a workbook in tab order."""
+        return self.open(file_path).sheet_names
+
+    def get_sheet(self, file_path: Path, sheet_name: str) -> SheetSnapshot:
+        """Returns the snapshot of a sheet, loading all its cells on first touch."""
+        snapshot = self.open(file_path)
+        sheet = snapshot.sheets.get(sheet_name)
+        if sheet is None:
+            with self._file_lock(file_path):
+                # The snapshot may have been evicted since it was opened: build into the cached one
+                snapshot = self.open(file_path)
+                sheet = snapshot.sheets.get(sheet_name)
+                if sheet is None:
+                    if sheet_name not in snapshot.sheet_names:
+                        raise KeyError(sheet_name)
+                    # Opening the wrapped reader's workbook must not evict the snapshot being filled
+                    key = f"snapshot|{file_path}"
+                    with self.cache.hold(key):
+                        sheet = snapshot.build_sheet(sheet_name, self.backend.iter_cells(file_path, sheet_name))
+                        self.cache.resize(key, snapshot.nbytes)
+                    self.logger.debug(f"Loaded {len(sheet)} cells from {file_path.name} [{sheet_name}]")
+        return sheet
+
+    def iter_cells(self, file_path: Path, sheet_name: str) -> Iterator[Tuple[int, int, Optional[str], Any]]:
+        """Yields every non-empty cell of a sheet from its snapshot."""
+        return self.get_sheet(file_path, sheet_name).cells()
+
+    def get_cell_info(self, file_path: Path, sheet_name: str, cell_ref: str) -> Tuple[str, Any]:
+        """Extracts formula and value from a specific cell."""
+        try:
+            try:
+                sheet = self.get_sheet(file_path, sheet_name)
+            except FileNotFoundError:
+                self.logger.warning(f"File not found: {file_path}")
+                return "File not found", None
+            except KeyError:
+                self.logger.warning(f"Sheet not found: {sheet_name} in {file_path}")
+                return "Sheet not found", None
+
+            try:
+                row, col = split_cell_ref(cell_ref)
+            except ValueError:
+                self.logger.warning(f"Cell not found: {cell_ref} in {sheet_name}")
+                return "Cell not found", None
+
+            formula, value = sheet.get(row, col)
+            if not formula:
+                self.logger.warning(f"Cell has no formula: {cell_ref} in {sheet_name}")
+                return "Cell has no formula in file", value
+
+            return formula, value
+        except Exception as e:
+            error_message = f"Error: {str(e)}"
+            self.logger.error(error_message)
+            return error_message, None
+
+    def get_cells(self, file_path: Path, sheet_name: str, cell_refs: Iterable[str]) -> Dict[str, Tuple[str, Any]]:
+        """Extracts formula and value for several cells of the same sheet."""
+        return {cell_ref: self.get_cell_info(file_path, sheet_name, cell_ref) for cell_ref in cell_refs}
+
+    def cleanup(self) -> None:
+        """Saves changed snapshots, drops them and releases the wrapped backend."""
+        self.cache.clear("snapshot|")
+        self.backend.cleanup()
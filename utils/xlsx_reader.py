@@ -0,0 +1,321 @@
+import logging
+import posixpath
+import re
+import zipfile
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import unquote
+from xml.etree.ElementTree import iterparse, parse
+
+from openpyxl.formula.translate import Translator
+from utils.cache_manager import workbook_cache
+
+# Namespaces used inside the xlsx package
+MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+# [1]Sheet!A1 or '[1]Sheet name'!A1 as stored in the sheet XML
+_EXTERNAL_QUOTED = re.compile(r"'\[(\d+)\]([^']*)'!")
+_EXTERNAL_UNQUOTED = re.compile(r"\[(\d+)\]([A-Za-z0-9_.]+)!")
+_CELL_REF = re.compile(r"^([A-Z]{1,3})(\d+)$")
+
+
+def split_cell_ref(cell_ref: str) -> Tuple[int, int]:
+    """
+    Splits an A1-style reference into its 1-based row and column numbers.
+
+    Args:
+        cell_ref (str): Cell reference such as "D17" or "$D$17"
+
+    Returns:
+        Tuple[int, int]: (row, column)
+    """
+    match = _CELL_REF.match(cell_ref.replace("$", "").upper())
+    if not match:
+        raise ValueError(f"Invalid cell reference: {cell_ref}")
+    letters, digits = match.groups()
+    col = 0
+    for char in letters:
+        col = col * 26 + ord(char) - 64
+    return int(digits), col
+
+
+def column_letter(col: int) -> str:
+    """Converts a 1-based column number to its letters (1 -> A, 27 -> AA)."""
+    letters = ""
+    while col:
+        col, remainder = divmod(col - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def format_external_target(target: str) -> str:
+    """
+    Converts an external link target to the prefix Excel shows in formulas.
+
+    A target like ".../BASISMATERIALEN/calculatie%20cat%202022.xlsx" becomes
+    ".../BASISMATERIALEN/[calculatie cat 2022.xlsx]", matching the COM formula text.
+    """
+    target = unquote(target).replace("file:///", "")
+    separator = max(target.rfind("/"), target.rfind("\\"))
+    return f"{target[:separator + 1]}[{target[separator + 1:]}]"
+
+
+def replace_external_links(formula: str, external_links: Dict[str, str]) -> str:
+    """Rewrites [n]Sheet!A1 into the '<folder>/[file.xlsx]Sheet'!A1 form Excel displays."""
+    if "[" not in formula:
+        return formula
+
+    def replace(match: re.Match[str]) -> str:
+        prefix = external_links.get(match.group(1))
+        if prefix is None:
+            return match.group(0)
+        return f"'{prefix}{match.group(2)}'!"
+
+    formula = _EXTERNAL_QUOTED.sub(replace, formula)
+    return _EXTERNAL_UNQUOTED.sub(replace, formula)
+
+
+def read_sheet_names(file_path: Path) -> List[str]:
+    """
+    Reads the sheet names of an xlsx workbook in tab order, from xl/workbook.xml alone.
+
+    Only that small part of the package is decompressed, up to the end of its
+    <sheets> list: no sheet, relationship or shared string is read.
+    """
+    names: List[str] = []
+    with zipfile.ZipFile(file_path) as package, package.open("xl/workbook.xml") as f:
+        for _, elem in iterparse(f):
+            if elem.tag == f"{MAIN_NS}sheet":
+                names.append(elem.get("name", ""))
+            elif elem.tag == f"{MAIN_NS}sheets":
+                break
+    return names
+
+
+# (formula with leading "=" or None, cached value)
+CellData = Tuple[Optional[str], Any]
+
+
+class _XlsxPackage:
+    """Workbook-level metadata of one xlsx file: sheet parts, external links and shared strings."""
+
+    def __init__(self, file_path: Path):
+        self.file_path = file_path
+        self.zip = zipfile.ZipFile(file_path)
+        self.sheet_parts: Dict[str, str] = {}
+        self.external_links: Dict[str, str] = {}
+        self._shared_strings: Optional[List[str]] = None
+        # Sheets read by XlsxReader.read_sheet, released with the package when the cache evicts it
+        self.sheet_cells: Dict[str, Dict[Tuple[int, int], CellData]] = {}
+        self._read_workbook()
+
+    def _read_rels(self, part: str) -> Dict[str, str]:
+        """Maps relationship ids to targets for the given part."""
+        folder, name = posixpath.split(part)
+        rels_part = posixpath.join(folder, "_rels", f"{name}.rels")
+        if rels_part not in self.zip.namelist():
+            return {}
+        with self.zip.open(rels_part) as f:
+            root = parse(f).getroot()
+        targets: Dict[str, str] = {}
+        for rel in root.iter(f"{PKG_REL_NS}Relationship"):
+            target = rel.get("Target", "")
+            if rel.get("TargetMode") != "External":
+                target = posixpath.normpath(posixpath.join(folder, target)) if not target.startswith("/") else target.lstrip("/")
+            targets[rel.get("Id", "")] = target
+        return targets
+
+    def _read_workbook(self) -> None:
+        """Reads sheet names and external workbook links from xl/workbook.xml."""
+        rels = self._read_rels("xl/workbook.xml")
+        with self.zip.open("xl/workbook.xml") as f:
+            root = parse(f).getroot()
+
+        for sheet in root.iter(f"{MAIN_NS}sheet"):
+            self.sheet_parts[sheet.get("name", "")] = rels.get(sheet.get(f"{REL_NS}id", ""), "")
+
+        # External references are numbered [1], [2], ... in document order
+        for index, ref in enumerate(root.iter(f"{MAIN_NS}externalReference"), 1):
+            link_part = rels.get(ref.get(f"{REL_NS}id", ""))
+            if not link_part:
+                continue
+            target = next(iter(self._read_rels(link_part).values()), "")
+            self.external_links[str(index)] = format_external_target(target)
+
+    @property
+    def shared_strings(self) -> List[str]:
+        """Shared string table, loaded on first use."""
+        if self._shared_strings is None:
+            self._shared_strings = []
+            if "xl/sharedStrings.xml" in self.zip.namelist():
+                with self.zip.open("xl/sharedStrings.xml") as f:
+                    for _, elem in iterparse(f):
+                        if elem.tag == f"{MAIN_NS}si":
+                            self._shared_strings.append("".join(t.text or "" for t in elem.iter(f"{MAIN_NS}t")))
+                            elem.clear()
+        return self._shared_strings
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory taken by the package: its shared strings and the sheets kept by read_sheet."""
+        strings = sum(len(text) + 50 for text in self._shared_strings) if self._shared_strings is not None else 0
+        return 10_000 + strings + sum(len(cells) * 150 for cells in self.sheet_cells.values())
+
+    def close(self) -> None:
+        self.zip.close()
+
+
+class XlsxReader:
+    """Reads formulas and cached values straight from the xlsx XML, without Excel or COM."""
+
+    def __init__(self):
+        self.cache = workbook_cache  # Shared, memory-bounded cache of opened xlsx packages
+        self.logger = logging.getLogger("excel_processor")
+
+    def _get_package(self, file_path: Path) -> _XlsxPackage:
+        key = f"xml|{file_path}"
+        package = self.cache.get(key)
+        if package is None:
+            package = _XlsxPackage(file_path)
+            # Charged for what it holds, not as a loaded workbook: under a SnapshotBackend the
+            # cells are in the snapshot, so the file is not counted twice against the budget
+            self.cache.put(key, package, file_path, size=package.nbytes, close=_XlsxPackage.close)
+        return package
+
+    def _resize(self, file_path: Path, package: _XlsxPackage) -> None:
+        """Updates the cache size of a package after its shared strings or a sheet were read."""
+        self.cache.resize(f"xml|{file_path}", package.nbytes)
+
+    def _read_cell_value(self, cell_type: Optional[str], raw: Optional[str], package: _XlsxPackage) -> Any:
+        """Converts the raw <v> text to the Python value COM would return."""
+        if raw is None:
+            return None
+        if cell_type == "s":
+            return package.shared_strings[int(raw)]
+        if cell_type == "b":
+            return raw == "1"
+        if cell_type in ("str", "e", "inlineStr"):
+            return raw
+        try:
+            return float(raw)
+        except ValueError:
+            return raw
+
+    def iter_cells(self, file_path: Path, sheet_name: str) -> Iterator[Tuple[int, int, Optional[str], Any]]:
+        """
+        Streams a worksheet once and yields every non-empty cell in row order.
+
+        Args:
+            file_path (Path): Path to the xlsx file
+            sheet_name (str): Name of the worksheet
+
+        Yields:
+            Tuple[int, int, Optional[str], Any]: (row, column, formula with leading "=" or None, cached value)
+        """
+        package = self._get_package(file_path)
+        part = package.sheet_parts.get(sheet_name)
+        if part is None:
+            raise KeyError(sheet_name)
+
+        shared_formulas: Dict[str, Tuple[str, str]] = {}  # si -> (master cell, master formula)
+        row, col = 0, 0
+        with package.zip.open(part) as f:
+            for event, elem in iterparse(f, events=("start", "end")):
+                if event == "start":
+                    if elem.tag == f"{MAIN_NS}row":
+                        row, col = int(elem.get("r") or row + 1), 0
+                    continue
+                if elem.tag != f"{MAIN_NS}c":
+                    continue
+                # The r attribute is optional: without it the cell follows the previous one
+                cell_ref = elem.get("r")
+                if cell_ref:
+                    row, col = split_cell_ref(cell_ref)
+                else:
+                    col += 1
+                    cell_ref = f"{column_letter(col)}{row}"
+                cell_type = elem.get("t")
+                formula: Optional[str] = None
+                raw_value: Optional[str] = None
+                for child in elem:
+                    if child.tag == f"{MAIN_NS}f":
+                        formula = child.text
+                        shared_index = child.get("si")
+                        if child.get("t") == "shared" and shared_index is not None:
+                            if formula:
+                                shared_formulas[shared_index] = (cell_ref, formula)
+                            elif shared_index in shared_formulas:
+                                master_cell, master_formula = shared_formulas[shared_index]
+                                formula = Translator(f"={master_formula}", origin=master_cell).translate_formula(cell_ref)[1:]
+                    elif child.tag == f"{MAIN_NS}v":
+                        raw_value = child.text
+                    elif child.tag == f"{MAIN_NS}is":
+                        raw_value = "".join(t.text or "" for t in child.iter(f"{MAIN_NS}t"))
+                elem.clear()
+
+                if formula:
+                    formula = "=" + replace_external_links(formula.replace("_xlfn.", ""), package.external_links)
+                if formula or raw_value is not None:
+                    yield row, col, formula, self._read_cell_value(cell_type, raw_value, package)
+        self._resize(file_path, package)
+
+    def read_sheet(self, file_path: Path, sheet_name: str) -> Dict[Tuple[int, int], CellData]:
+        """
+        Returns every non-empty cell of a sheet by (row, column), streaming the sheet only once.
+
+        The cells are kept with the package, so lookups without a SnapshotBackend
+        (get_cell_info, get_cells) do not stream the sheet again for every cell.
+        """
+        package = self._get_package(file_path)
+        cells = package.sheet_cells.get(sheet_name)
+        if cells is None:
+            cells = {(row, col): (formula, value) for row, col, formula, value in self.iter_cells(file_path, sheet_name)}
+            package.sheet_cells[sheet_name] = cells
+            self._resize(file_path, package)
+        return cells
+
+    def open(self, file_path: Path) -> None:
+        """Opens the xlsx package and reads its workbook metadata."""
+        self._get_package(file_path)
+
+    def get_sheet_names(self, file_path: Path) -> List[str]:
+        """Returns the worksheet names of a workbook in tab order."""
+        return list(self._get_package(file_path).sheet_parts)
+
+    def get_cells(self, file_path: Path, sheet_name: str, cell_refs: Iterable[str]) -> Dict[str, Tuple[str, Any]]:
+        """Extracts formula and value for several cells of the same sheet, from one read of the sheet (read_sheet)."""
+        return {cell_ref: self.get_cell_info(file_path, sheet_name, cell_ref) for cell_ref in cell_refs}
+
+    def get_cell_info(self, file_path: Path, sheet_name: str, cell_ref: str) -> Tuple[str, Any]:
+        """Extracts formula and value from a specific cell, mirroring ExcelHelper.get_cell_info."""
+        try:
+            if f"xml|{file_path}" not in self.cache and not file_path.exists():
+                self.logger.warning(f"File not found: {file_path}")
+                return "File not found", None
+
+            if sheet_name not in self.get_sheet_names(file_path):
+                self.logger.warning(f"Sheet not found: {sheet_name} in {file_path}")
+                return "Sheet not found", None
+
+            try:
+                target = split_cell_ref(cell_ref)
+            except ValueError:
+                self.logger.warning(f"Cell not found: {cell_ref} in {sheet_name}")
+                return "Cell not found", None
+
+            formula, value = self.read_sheet(file_path, sheet_name).get(target, (None, None))
+            if not formula:
+                self.logger.warning(f"Cell has no formula: {cell_ref} in {sheet_name}")
+                return "Cell has no formula in file", value
+
+            return formula, value
+        except Exception as e:
+            error_message = f"Error: {str(e)}"
+            self.logger.error(error_message)
+            return error_message, None
+
+    def cleanup(self):
+        """Close all opened xlsx packages."""
+        self.cache.clear("xml|")